@@ -31,6 +31,8 @@ audio_queue = Queue()
 is_listening = True
 is_session_active = False
 session_result = None
+session_alert_id = None  # backend alert this session belongs to
+session_callback_url = None  # backend webhook for the session outcome
 
 # Conversation state
 conversation_state = "INITIAL"
@@ -471,11 +473,29 @@ async def run_emergency_check():
         is_session_active = False
         print("🛑 Session ended.")
 
+async def report_outcome():
+    """POST the session outcome to the backend's webhook (if it gave one)"""
+    global session_result
+    
+    if session_result is None:
+        session_result = {"action": "TIMEOUT", "message": "Session ended without a decision"}
+    session_result["alert_id"] = session_alert_id
+    
+    if not session_callback_url:
+        return
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+            async with session.post(session_callback_url, json=session_result) as response:
+                print(f"📨 Outcome reported to backend ({response.status})")
+    except Exception as e:
+        print(f"⚠️  Could not report outcome (backend will poll /api/status): {e}")
+
 def run_async_in_thread():
     """Run the async function in a new event loop in a thread"""
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     loop.run_until_complete(run_emergency_check())
+    loop.run_until_complete(report_outcome())
     loop.close()
 
 # ==================== FLASK ENDPOINTS ====================
@@ -496,7 +516,7 @@ def home():
 @app.route('/api/trigger-alert', methods=['POST'])
 def trigger_alert():
     """Trigger the emergency alert voice agent"""
-    global is_session_active, conversation_state, session_result
+    global is_session_active, conversation_state, session_result, session_alert_id, session_callback_url
     
     if is_session_active:
         return jsonify({
@@ -507,6 +527,8 @@ def trigger_alert():
     data = request.get_json() if request.is_json else {}
     patient_id = data.get('patient_id', 'unknown')
     vitals = data.get('vitals', {})
+    session_alert_id = data.get('alert_id')
+    session_callback_url = data.get('callback_url')
     
     print(f"\n{'='*60}")
     print(f"🚨 EMERGENCY ALERT TRIGGERED via API")
@@ -525,6 +547,7 @@ def trigger_alert():
         "success": True,
         "message": "Emergency alert triggered",
         "patient_id": patient_id,
+        "alert_id": session_alert_id,
         "session_started": True
     })
 
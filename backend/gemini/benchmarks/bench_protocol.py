@@ -0,0 +1,183 @@
+"""
+Protocol decoding micro-benchmark
+Compares the original str-based line loop in socket_server against the
+vitals_protocol fast path (bytearray/memoryview split, compiled schema,
+__slots__ records, lazy logging) and the binary wire format.
+
+Usage (from backend/gemini):
+    python benchmarks/bench_protocol.py [--samples 200000] [--chunk 4096]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from vitals_protocol import (
+    BinaryFrameDecoder, LineDecoder, ValidationError, decode_line, encode_binary_frame,
+    encode_binary_handshake, sample_from_message
+)
+
+
+def make_stream(samples: int) -> bytes:
+    """Build a newline-JSON stream shaped like FlaskClient::sendDetailedVitals output"""
+    rng = random.Random(42)
+    lines = []
+    for i in range(samples):
+        lines.append(json.dumps({
+            "pulse_rate": rng.randint(55, 130),
+            "pulse_confidence": round(rng.random(), 4),
+            "breathing_rate": rng.randint(8, 30),
+            "breathing_confidence": round(rng.random(), 4),
+            "talking": rng.random() < 0.1,
+            "timestamp": 1700000000000000 + i * 33333
+        }))
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def to_binary(stream: bytes) -> bytes:
+    """Re-encode a JSON stream in the binary wire format"""
+    frames = [encode_binary_handshake('bench')]
+    decoder = LineDecoder()
+    for line in decoder.feed(stream):
+        frames.append(encode_binary_frame(sample_from_message(decode_line(line))))
+    return b''.join(frames)
+
+
+def chunks(stream: bytes, size: int):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def make_logger() -> logging.Logger:
+    """Logger at INFO writing to /dev/null, so formatting cost is real but output is not"""
+    logger = logging.getLogger('bench_protocol')
+    logger.handlers.clear()
+    logger.propagate = False
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s [%(name)s] %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def legacy_validate(vitals, logger) -> bool:
+    """validate_vitals as it was before the vitals_protocol stage"""
+    for field in ['pulse_rate', 'breathing_rate', 'pulse_confidence', 'breathing_confidence']:
+        if field not in vitals:
+            logger.warning(f"Missing required field: {field}")
+            return False
+    try:
+        pulse = int(vitals['pulse_rate'])
+        breathing = int(vitals['breathing_rate'])
+        float(vitals['pulse_confidence'])
+        float(vitals['breathing_confidence'])
+        if not (0 <= pulse <= 300):
+            return False
+        if not (0 <= breathing <= 100):
+            return False
+        return True
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid data types: {e}")
+        return False
+
+
+def run_legacy(data_chunks, logger) -> int:
+    """Original recv loop: decode each chunk, str concat/split, f-string INFO per sample"""
+    latest = {}
+    count = 0
+    buffer = ""
+    for chunk in data_chunks:
+        data = chunk.decode('utf-8')
+        logger.debug(f"Raw data received: {data}")
+        buffer += data
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            logger.debug(f"Processing line: {line}")
+            try:
+                vitals = json.loads(line)
+                if not legacy_validate(vitals, logger):
+                    continue
+                latest.update(vitals)
+                latest['status'] = 'active'
+                logger.info(f"✓ Vitals - Pulse: {vitals.get('pulse_rate')} BPM "
+                            f"(conf: {vitals.get('pulse_confidence'):.2f}), "
+                            f"Breathing: {vitals.get('breathing_rate')} BPM "
+                            f"(conf: {vitals.get('breathing_confidence'):.2f}), "
+                            f"Talking: {vitals.get('talking')}")
+                count += 1
+            except json.JSONDecodeError:
+                pass
+    return count
+
+
+def run_fast(data_chunks, logger) -> int:
+    """vitals_protocol path as used by ProducerConnection"""
+    decoder = LineDecoder()
+    count = 0
+    for chunk in data_chunks:
+        for line in decoder.feed(chunk):
+            try:
+                sample = sample_from_message(decode_line(line))
+            except ValidationError:
+                continue
+            vitals = sample.as_dict()
+            logger.debug("Vitals - Pulse: %s BPM (conf: %.2f), Breathing: %s BPM (conf: %.2f), Talking: %s",
+                         sample.pulse_rate, sample.pulse_confidence,
+                         sample.breathing_rate, sample.breathing_confidence, sample.talking)
+            count += len(vitals) > 0
+    return count
+
+
+def run_binary(data_chunks, logger) -> int:
+    """Binary frames decoded with struct.unpack_from"""
+    decoder = BinaryFrameDecoder()
+    count = 0
+    for chunk in data_chunks:
+        for sample in decoder.feed(chunk):
+            vitals = sample.as_dict()
+            logger.debug("Vitals - Pulse: %s BPM (conf: %.2f), Breathing: %s BPM (conf: %.2f), Talking: %s",
+                         sample.pulse_rate, sample.pulse_confidence,
+                         sample.breathing_rate, sample.breathing_confidence, sample.talking)
+            count += len(vitals) > 0
+    return count
+
+
+def measure(fn, data_chunks, logger, repeats: int) -> dict:
+    best = float('inf')
+    count = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        count = fn(data_chunks, logger)
+        best = min(best, time.perf_counter() - start)
+    return {'samples': count, 'seconds': best, 'samples_per_sec': count / best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vitals protocol decoding')
+    parser.add_argument('--samples', type=int, default=200000, help='Samples in the stream')
+    parser.add_argument('--chunk', type=int, default=4096, help='Bytes per simulated recv')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per path (best is kept)')
+    args = parser.parse_args()
+
+    stream = make_stream(args.samples)
+    data_chunks = chunks(stream, args.chunk)
+    binary_chunks = chunks(to_binary(stream), args.chunk)
+    logger = make_logger()
+
+    legacy = measure(run_legacy, data_chunks, logger, args.repeats)
+    fast = measure(run_fast, data_chunks, logger, args.repeats)
+    binary = measure(run_binary, binary_chunks, logger, args.repeats)
+
+    print(f"{'path':<10}{'samples':>10}{'seconds':>10}{'samples/sec':>14}{'speedup':>10}")
+    for name, result in (('legacy', legacy), ('fast', fast), ('binary', binary)):
+        speedup = result['samples_per_sec'] / legacy['samples_per_sec']
+        print(f"{name:<10}{result['samples']:>10}{result['seconds']:>10.3f}"
+              f"{result['samples_per_sec']:>14,.0f}{speedup:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
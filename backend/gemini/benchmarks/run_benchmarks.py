@@ -0,0 +1,415 @@
+"""
+Backend hot-path benchmark suite
+Standalone timing harness (no pytest-benchmark needed) for:
+  - socket_server.validate_vitals and protocol line parsing
+  - VitalsMonitor.check_vitals / check_batch on normal, abnormal and low-confidence streams
+  - AlertManager.trigger_alert under many contending threads
+  - EmotionAnalyzer._calculate_medical_emotions
+  - AudioPreprocessor.process (elevenlabs/scribe_realtime.py)
+  - end-to-end socket -> VitalsMonitor -> AlertManager throughput
+
+External services are stubbed: the voice agent (ElevenLabs) HTTP call in
+AlertManager, the ElevenLabs SDK and audio device used by scribe_realtime,
+and Gemini/Twilio (not on the vitals path). Benchmarks whose local
+dependencies are missing (e.g. cv2/fer, scipy) are recorded as skipped.
+
+Results are written as JSON to benchmarks/results/ named by git commit,
+so runs from different commits can be compared with --compare.
+
+Usage (from backend/gemini):
+    python benchmarks/run_benchmarks.py [--quick] [--only monitor,alerts] [--compare results/<old>.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GEMINI_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, GEMINI_DIR)
+
+import config
+
+
+# ===== HARNESS =====
+
+def bench(fn: Callable[[], int], repeat: int) -> Dict:
+    """
+    Time `fn` `repeat` times; fn returns the number of operations it ran
+
+    Returns best/mean seconds per operation and operations per second
+    """
+    timings = []
+    ops = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    mean = sum(timings) / len(timings)
+    return {
+        'ops': ops,
+        'best_us_per_op': best / ops * 1e6,
+        'mean_us_per_op': mean / ops * 1e6,
+        'ops_per_sec': ops / best,
+    }
+
+
+def skipped(reason: str) -> Dict:
+    return {'skipped': reason}
+
+
+def make_samples(kind: str, count: int, seed: int = 7) -> List[Dict]:
+    """normal, abnormal (sustained high pulse) or low_confidence vitals streams"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        if kind == 'abnormal':
+            pulse, breathing, confidence = rng.randint(130, 160), rng.randint(26, 32), rng.uniform(0.5, 0.9)
+        elif kind == 'low_confidence':
+            pulse, breathing, confidence = rng.randint(60, 100), rng.randint(12, 20), rng.uniform(0.0, 0.15)
+        else:
+            pulse, breathing, confidence = rng.randint(60, 100), rng.randint(12, 20), rng.uniform(0.5, 0.9)
+        samples.append({
+            'pulse_rate': pulse,
+            'pulse_confidence': confidence,
+            'breathing_rate': breathing,
+            'breathing_confidence': confidence,
+            'talking': False,
+            'timestamp': 0,
+        })
+    return samples
+
+
+def redirect_outputs(directory: str) -> List:
+    """Point the alert history database and action journal at `directory` (never the real data/ or logs/)"""
+    from services.action_journal import action_journal
+    from services.alert_store import alert_store
+    alert_store.db_path = os.path.join(directory, 'alerts.db')
+    action_journal.path = os.path.join(directory, 'actions.jsonl')
+    alert_store.start()
+    return [alert_store, action_journal]
+
+
+def stub_voice_agent(alert_manager):
+    """Replace the ElevenLabs voice agent session with an instant "NEITHER" outcome"""
+    alert_manager._start_conversation = lambda alert: alert_manager.complete_alert(
+        alert['id'], "NEITHER", None, 'stub')
+
+
+# ===== BENCHMARKS =====
+
+def bench_parsing(scale: float, repeat: int) -> Dict:
+    from socket_server import validate_vitals
+    from vitals_protocol import LineDecoder, decode_line, sample_from_message
+
+    samples = make_samples('normal', int(20000 * scale))
+    lines = [json.dumps(s).encode('utf-8') for s in samples]
+    stream = b'\n'.join(lines) + b'\n'
+    chunk_size = config.SOCKET_READ_SIZE
+    chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+    def run_validate():
+        for s in samples:
+            validate_vitals(s)
+        return len(samples)
+
+    def run_parse_lines():
+        for line in lines:
+            sample_from_message(decode_line(line))
+        return len(lines)
+
+    def run_decode_stream():
+        decoder = LineDecoder()
+        count = 0
+        for chunk in chunks:
+            for line in decoder.feed(chunk):
+                sample_from_message(decode_line(line))
+                count += 1
+        return count
+
+    return {
+        'validate_vitals': bench(run_validate, repeat),
+        'parse_line': bench(run_parse_lines, repeat),
+        'decode_stream': bench(run_decode_stream, repeat),
+    }
+
+
+def bench_monitor(scale: float, repeat: int) -> Dict:
+    from services.vitals_monitor import VitalsMonitor
+
+    count = int(20000 * scale)
+    results = {}
+    for kind in ('normal', 'abnormal', 'low_confidence'):
+        samples = make_samples(kind, count)
+        times = [1000.0 + i * 0.01 for i in range(count)]
+
+        def run_single(samples=samples, times=times):
+            monitor = VitalsMonitor(alert_callback=None)
+            for sample, t in zip(samples, times):
+                monitor.check_vitals(sample, t)
+            return len(samples)
+
+        def run_batch(samples=samples, times=times, size=30):
+            monitor = VitalsMonitor(alert_callback=None)
+            for i in range(0, len(samples), size):
+                monitor.check_batch(samples[i:i + size], times[i:i + size])
+            return len(samples)
+
+        results[f'check_vitals_{kind}'] = bench(run_single, repeat)
+        results[f'check_batch30_{kind}'] = bench(run_batch, repeat)
+    return results
+
+
+def bench_alerts(scale: float, repeat: int) -> Dict:
+    from services.alert_manager import AlertManager
+
+    calls_per_thread = int(2000 * scale)
+    vitals = make_samples('abnormal', 1)[0]
+    results = {}
+    for threads in (1, 8, 32):
+        def run(threads=threads):
+            manager = AlertManager(patient_id='bench')
+            stub_voice_agent(manager)
+            barrier = threading.Barrier(threads)
+
+            def worker():
+                barrier.wait()
+                for _ in range(calls_per_thread):
+                    manager.trigger_alert(vitals)
+
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            return threads * calls_per_thread
+
+        results[f'trigger_alert_{threads}_threads'] = bench(run, repeat)
+    return results
+
+
+def bench_emotion(scale: float, repeat: int) -> Dict:
+    try:
+        from emotion_analyzer import EmotionAnalyzer
+    except ImportError as e:
+        return skipped(f"emotion_analyzer unavailable: {e}")
+
+    rng = random.Random(3)
+    names = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+    frames = []
+    for _ in range(int(20000 * scale)):
+        raw = [rng.random() for _ in names]
+        total = sum(raw)
+        frames.append({name: value / total for name, value in zip(names, raw)})
+    analyzer = EmotionAnalyzer.__new__(EmotionAnalyzer)  # skip loading the FER model
+
+    def run():
+        for base in frames:
+            analyzer._calculate_medical_emotions(base)
+        return len(frames)
+
+    return {'calculate_medical_emotions': bench(run, repeat)}
+
+
+def bench_audio(scale: float, repeat: int) -> Dict:
+    try:
+        import numpy as np
+    except ImportError as e:
+        return skipped(f"numpy unavailable: {e}")
+
+    # Stub the ElevenLabs SDK and the audio device; everything else is real
+    elevenlabs = types.ModuleType('elevenlabs')
+    client = types.ModuleType('elevenlabs.client')
+    client.ElevenLabs = lambda **kwargs: None
+    play = types.ModuleType('elevenlabs.play')
+    play.play = lambda *args, **kwargs: None
+    sounddevice = types.ModuleType('sounddevice')
+    stubs = {'elevenlabs': elevenlabs, 'elevenlabs.client': client,
+             'elevenlabs.play': play, 'sounddevice': sounddevice}
+    saved = {name: sys.modules.get(name) for name in stubs}
+    sys.modules.update(stubs)
+    sys.path.insert(0, os.path.join(GEMINI_DIR, '..', 'elevenlabs'))
+    try:
+        import scribe_realtime
+    except ImportError as e:
+        return skipped(f"scribe_realtime unavailable: {e}")
+    finally:
+        sys.path.pop(0)
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+    rng = np.random.default_rng(5)
+    # 100 ms blocks at 16 kHz, like the live InputStream (blocksize=1600)
+    blocks = [rng.normal(0, 0.05, size=(1600, 1)).astype(np.float32) for _ in range(int(2000 * scale))]
+    preprocessor = scribe_realtime.AudioPreprocessor()
+
+    def run():
+        for block in blocks:
+            preprocessor.process(block)
+        return len(blocks)
+
+    return {'audio_preprocessor_process': bench(run, repeat)}
+
+
+def bench_end_to_end(scale: float, repeat: int) -> Dict:
+    import socket_server
+    from services.alert_manager import AlertManager
+    from services.ingest_pipeline import IngestPipeline
+    from services.vitals_store import VitalsStore
+    sys.path.insert(0, os.path.join(GEMINI_DIR, 'tools'))
+    from replay_vitals import run_producer, synthetic_trace
+
+    def alert_manager_factory(patient_id):
+        manager = AlertManager(patient_id=patient_id)
+        stub_voice_agent(manager)
+        return manager
+
+    store = VitalsStore(alert_manager_factory=alert_manager_factory)
+    pipeline = IngestPipeline(store)
+    pipeline.start()
+
+    import socket
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    config.SOCKET_HOST, config.SOCKET_PORT = '127.0.0.1', port
+    socket_server.set_vitals_store(store)
+    socket_server.set_ingest_pipeline(pipeline)
+    socket_server.start_socket_server()
+    time.sleep(0.3)
+
+    connections = 20
+    traces = [synthetic_trace(int(300 * scale), 0.1, seed, 20.0, 5.0) for seed in range(connections)]
+    results = {}
+    for wire, batch in (('json', 1), ('json', 30), ('binary', 30)):
+        def run(wire=wire, batch=batch):
+            before = pipeline.get_stats()['processed']
+            stats = {'sent': 0}
+
+            async def load():
+                await asyncio.gather(*(
+                    run_producer('127.0.0.1', port, f"bench-{i}", trace, None, batch, wire, stats)
+                    for i, trace in enumerate(traces)
+                ))
+
+            asyncio.run(load())
+            deadline = time.time() + 60
+            while pipeline.get_stats()['processed'] - before < stats['sent'] and time.time() < deadline:
+                time.sleep(0.005)
+            return pipeline.get_stats()['processed'] - before
+
+        results[f'socket_to_monitor_{wire}_batch{batch}'] = bench(run, repeat)
+    pipeline.stop()
+    return results
+
+
+BENCHMARKS = {
+    'parsing': bench_parsing,
+    'monitor': bench_monitor,
+    'alerts': bench_alerts,
+    'emotion': bench_emotion,
+    'audio': bench_audio,
+    'end_to_end': bench_end_to_end,
+}
+
+
+# ===== RESULTS =====
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=GEMINI_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict, previous: Dict):
+    """Print ops/sec change per benchmark against an earlier results file"""
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for group, cases in current['results'].items():
+        for name, result in cases.items():
+            old = previous.get('results', {}).get(group, {}).get(name)
+            if not isinstance(result, dict) or 'ops_per_sec' not in result or not old or 'ops_per_sec' not in old:
+                continue
+            change = (result['ops_per_sec'] / old['ops_per_sec'] - 1) * 100
+            flag = '  <-- regression' if change < -10 else ''
+            print(f"  {group + '.' + name:<50}{change:+8.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the backend hot paths')
+    parser.add_argument('--only', help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--quick', action='store_true', help='Smaller inputs, fewer repeats')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (best is reported)')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<commit>-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    scale = 0.1 if args.quick else 1.0
+    repeat = 2 if args.quick else args.repeat
+    selected = args.only.split(',') if args.only else list(BENCHMARKS)
+
+    for name in selected:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark: {name}")
+
+    results = {}
+    # Alerts fired by the benchmarks are recorded and journaled in a scratch directory
+    with tempfile.TemporaryDirectory(prefix='pulseai-bench-') as scratch:
+        outputs = redirect_outputs(scratch)
+        for name in selected:
+            print(f"Running {name}...", flush=True)
+            try:
+                results[name] = BENCHMARKS[name](scale, repeat)
+            except Exception as e:
+                results[name] = skipped(f"{type(e).__name__}: {e}")
+        for output in outputs:
+            output.stop()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': results,
+    }
+
+    print()
+    for group, cases in results.items():
+        if 'skipped' in cases:
+            print(f"{group:<52}skipped ({cases['skipped']})")
+            continue
+        for name, result in cases.items():
+            print(f"{group + '.' + name:<52}{result['ops_per_sec']:>14,.0f} ops/s"
+                  f"{result['best_us_per_op']:>12.2f} us/op")
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f"{report['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,37 @@ BREATHING_MIN = 10
 BREATHING_MAX = 25
 CONFIDENCE_THRESHOLD = 0.2
 
+# Anomaly Rules (compiled once by services/anomaly_rules.py; vitals are abnormal while any rule is on)
+ANOMALY_RULES = [
+    {"name": "pulse_range", "type": "range", "field": "pulse_rate", "min": PULSE_MIN, "max": PULSE_MAX},
+    {"name": "breathing_range", "type": "range", "field": "breathing_rate", "min": BREATHING_MIN, "max": BREATHING_MAX},
+    # Sudden jumps between consecutive samples (BPM per second)
+    {"name": "pulse_jump", "type": "rate_of_change", "field": "pulse_rate", "max_per_second": 20.0,
+     "enabled": False},
+    # Deviation from the patient's own EWMA baseline, with confidence-weighted hysteresis
+    {"name": "pulse_deviation", "type": "zscore", "field": "pulse_rate", "alpha": 0.02, "threshold": 4.0,
+     "warmup": 60, "min_std": 2.0, "hysteresis": {"alpha": 0.3, "enter": 0.5, "exit": 0.2}, "enabled": False},
+    # Steady climb in breathing rate (BPM per second over the last 60 samples)
+    {"name": "breathing_trend", "type": "trend", "field": "breathing_rate", "window": 60, "max_slope": 0.5,
+     "direction": "up", "enabled": False},
+    # Patient-specific ranges learned by services/baselines.py (min/max apply until the baseline is ready)
+    {"name": "pulse_adaptive", "type": "adaptive_range", "field": "pulse_rate", "min": PULSE_MIN, "max": PULSE_MAX,
+     "enabled": False},
+    {"name": "breathing_adaptive", "type": "adaptive_range", "field": "breathing_rate", "min": BREATHING_MIN,
+     "max": BREATHING_MAX, "enabled": False},
+]
+
+# Patient Baselines (streaming per-patient statistics behind the adaptive_range rules)
+BASELINE_PATH = "data/baselines.json"  # saved baselines (relative to backend/gemini)
+BASELINE_UPDATE_INTERVAL = 1.0  # seconds between confident samples folded into a patient's baseline
+BASELINE_SAVE_INTERVAL = 60.0  # seconds between baseline saves
+BASELINE_EWMA_ALPHA = 0.01  # weight of each new sample in the EWMA mean/variance
+BASELINE_QUANTILES = (0.05, 0.5, 0.95)  # quantiles tracked with P² estimators (lowest/highest bound the thresholds)
+BASELINE_MIN_SAMPLES = 600  # samples (~10 minutes) before a patient's thresholds are used
+BASELINE_MARGIN = 0.5  # thresholds = [p5 - margin * spread, p95 + margin * spread], spread = p95 - p5
+BASELINE_MIN_SPREAD = {"pulse_rate": 10.0, "breathing_rate": 4.0}  # floor on the spread so a very steady patient isn't flagged for small changes
+BASELINE_LIMITS = {"pulse_rate": (40, 150), "breathing_rate": (6, 35)}  # adaptive thresholds never go past these
+
 # Alert Settings
 ABNORMAL_DURATION_THRESHOLD = 3.0  # seconds - must be abnormal for this long to trigger
 ALERT_COOLDOWN_PERIOD = 300  # 5 minutes - prevent duplicate alerts
@@ -14,3 +45,96 @@ SOCKET_HOST = "0.0.0.0"
 SOCKET_PORT = 5555
 FLASK_HOST = "0.0.0.0"
 FLASK_PORT = 5000
+SOCKET_BACKLOG = 64  # pending producer connections the listener will queue
+SOCKET_READ_SIZE = 4096  # bytes read per recv on each producer connection
+MAX_LINE_BYTES = 1 << 20  # longest protocol line (incl. batches) accepted before the buffer is discarded
+DEFAULT_PATIENT_ID = "default"  # used when a producer does not identify itself
+
+# State Store
+STORE_SHARDS = 16  # lock shards for the per-patient state store
+
+# Vitals History
+HISTORY_CAPACITY = 3600  # samples kept per patient (fixed memory ceiling)
+HISTORY_PERCENTILES = (5, 50, 95)  # percentiles reported by /api/vitals/stats
+
+# Vitals Push Stream
+STREAM_CLIENT_QUEUE_SIZE = 32  # events buffered per subscriber before dropping oldest
+STREAM_KEEPALIVE_INTERVAL = 15.0  # seconds between SSE keepalive comments
+
+# Ingestion Pipeline
+INGEST_WORKERS = 4  # evaluation worker threads (each owns a subset of patients)
+INGEST_QUEUE_SIZE = 1024  # pending batches per worker before the overflow policy applies
+INGEST_OVERFLOW_POLICY = "coalesce"  # "coalesce" (merge into the patient's pending batch) or "drop_oldest"
+INGEST_MAX_COALESCED_SAMPLES = 3600  # cap on a coalesced batch; its oldest samples are dropped beyond this
+
+# Alert Executor
+ALERT_EXECUTOR_WORKERS = 8  # shared worker threads for alert callbacks and conversation dispatch
+ALERT_EXECUTOR_QUEUE_SIZE = 256  # waiting tasks (all patients) before the overflow policy applies
+ALERT_EXECUTOR_OVERFLOW_POLICY = "reject"  # "reject" (refuse new task) or "drop_oldest" (same patient's oldest waiting task)
+
+# Voice Agent (ElevenLabs conversation server)
+VOICE_AGENT_URL = "http://localhost:7000"
+VOICE_AGENT_CONNECT_TIMEOUT = 0.5  # seconds to establish a connection (agent is local)
+VOICE_AGENT_READ_TIMEOUT = 3.0  # seconds to wait for a reply (/api/trigger-alert returns immediately)
+VOICE_AGENT_POOL_SIZE = 4  # keep-alive connections held open to the agent
+VOICE_AGENT_RETRIES = 2  # connection retries (only errors before the request is sent)
+VOICE_AGENT_BACKOFF = 0.1  # retry backoff factor in seconds
+VOICE_AGENT_BREAKER_THRESHOLD = 3  # consecutive failures before calls are short-circuited
+VOICE_AGENT_BREAKER_RESET = 30.0  # seconds before a short-circuited agent is tried again
+
+# Alert Outcomes
+ALERT_OUTCOME_CALLBACK_URL = f"http://localhost:{FLASK_PORT}"  # base URL the voice agent posts outcomes to
+ALERT_OUTCOME_POLL_INTERVAL = 2.0  # seconds between voice agent status polls while an alert is pending
+ALERT_OUTCOME_TIMEOUT = 120.0  # seconds before a pending alert resolves as TIMEOUT
+
+# Alert History
+ALERT_DB_PATH = "data/alerts.db"  # SQLite alert history (relative to backend/gemini)
+ALERT_CACHE_SIZE = 500  # most recent alerts (all patients) kept in memory
+ALERT_WRITE_BATCH_SIZE = 100  # most alerts inserted per transaction
+ALERT_WRITE_INTERVAL = 0.5  # seconds the history writer waits to gather a batch
+
+# Action Journal
+ACTION_JOURNAL_PATH = "logs/actions.jsonl"  # JSON Lines journal of post-conversation actions
+ACTION_JOURNAL_MAX_BYTES = 10 * 1024 * 1024  # rotate (and gzip) the journal past this size
+ACTION_JOURNAL_BACKUPS = 10  # compressed archives kept
+ACTION_JOURNAL_FSYNC = "always"  # "always" (every batch), "interval" or "never"
+ACTION_JOURNAL_FSYNC_INTERVAL = 1.0  # seconds between fsyncs with the "interval" policy
+ACTION_JOURNAL_FLUSH_INTERVAL = 0.2  # seconds the journal writer waits to gather a batch
+
+# Logging
+LOG_LEVEL = "DEBUG"  # level for every setup_logger() logger
+LOG_ASYNC = True  # enqueue records and format/write them on one listener thread
+LOG_FORMAT = "text"  # "text" ([time] LEVEL [logger] message) or "json" (one object per line)
+LOG_QUEUE_SIZE = 10000  # records buffered for the listener before new ones are dropped
+LOG_RATE_LIMITS = {  # max DEBUG records/sec for loggers on the per-sample path
+    "socket_server": 5.0,
+    "services.vitals_monitor": 5.0,
+    "services.ingest_pipeline": 5.0,
+}
+
+# Tracing
+TRACE_ENABLED = False  # per-stage latency tracing of vitals samples (toggle at runtime via /api/trace)
+TRACE_SAMPLE_EVERY = 1  # trace one in N received chunks
+TRACE_BUFFER_SIZE = 20000  # most recent stage spans kept for the Chrome trace export
+
+# Emotion Analysis
+FER_TARGET_FPS = 10.0  # most webcam frames analyzed per second
+FER_CPU_BUDGET = 0.5  # share of one core FER inference may use (analysis slows below the target FPS if needed)
+
+# Emotion Worker Pool (multi-camera FER in worker processes, enabled by main.py --cameras)
+FER_POOL_WORKERS = 2  # FER worker processes shared by all cameras (one detector each)
+FER_POOL_FRAME_SIZE = (320, 240)  # (width, height) frames are resized to in shared memory before inference
+FER_POOL_WORKER_THREADS = 1  # TensorFlow threads per worker (workers, not threads, provide the parallelism)
+FER_DETECT_EVERY = 10  # full-frame face detection every N analyzed frames; the face box is tracked in between
+FER_TRACK_MIN_SCORE = 0.6  # template-match score below which the tracked face counts as lost (forces a detection)
+FER_TRACK_SEARCH_MARGIN = 0.5  # tracker search window padding around the last face box (share of box size)
+FER_CHANGE_THRESHOLD = 3.0  # mean gray-level change (0-255) of the face region below which FER is skipped (0 disables)
+FER_MAX_SKIP_SECONDS = 2.0  # reuse a result for unchanged frames at most this long before analyzing again
+
+# Emotion History (per-camera ring buffer behind the smoothed emotion served by the API)
+FER_HISTORY_SIZE = 600  # analyzed frames kept per camera (60 s at 10 FPS; memory is fixed)
+FER_SMOOTHING = 'ewma'  # smoothing of the current emotion: 'ewma', 'median' or 'none'
+FER_SMOOTHING_SECONDS = 1.0  # EWMA time constant
+FER_MEDIAN_WINDOW = 5  # most recent face frames the 'median' smoothing uses
+FER_DROPOUT_SECONDS = 1.5  # keep reporting the last face this long when frames miss it (then None)
+FER_HISTORY_DEFAULT_SECONDS = 30  # window of /api/emotion/history when ?seconds= is not given
@@ -8,35 +8,100 @@ import cv2
 import threading
 import time
 from fer.fer import FER
+from emotion_history import EmotionHistory
+from emotion_mapping import build_emotion, calculate_medical_emotions
+from face_tracking import ChangeGate, FaceTracker
+from utils.metrics import Counter, Gauge, Histogram
+import config
+
+FER_INFERENCE_SECONDS = Histogram('fer_inference_seconds', 'FER detect_emotions latency per frame',
+                                  buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+FER_FRAMES = Counter('fer_frames_total', 'Camera frames analyzed by FER')
+FER_FPS = Gauge('fer_fps', 'Frames analyzed per second (smoothed)')
+FER_FRAMES_CAPTURED = Counter('fer_frames_captured_total', 'Camera frames grabbed (most are skipped without decoding)')
+FER_FRAME_AGE_SECONDS = Histogram('fer_frame_age_seconds', 'Age of a frame when inference starts',
+                                  buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+FER_FACE_LOOKUPS = Counter('fer_face_lookups_total', 'How the face box was found for an analyzed frame', ['mode'])
+FER_DETECTED = FER_FACE_LOOKUPS.labels('detect')
+FER_TRACKED = FER_FACE_LOOKUPS.labels('track')
+FER_TRACK_LOST = FER_FACE_LOOKUPS.labels('lost')
+FER_FRAMES_SKIPPED = Counter('fer_frames_skipped_total', 'Frames not sent to FER because the face region had not changed')
+FER_SKIPPED_SECONDS = Counter('fer_skipped_inference_seconds_total',
+                              'Estimated FER inference time saved by skipping unchanged frames')
+
+class LatestFrame:
+    """
+    Single-slot frame handoff between the capture and inference threads
+
+    The inference thread asks for a frame with take(); the capture thread
+    only decodes a frame while one is wanted, so frames nobody will analyze
+    are grabbed (to keep the driver buffer drained) but never decoded, and
+    the frame handed over is always the newest one.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.captured_at = 0.0
+        self.wanted = False
+        self.closed = False
+
+    def put(self, frame, captured_at):
+        """Hand over a decoded frame (replaces one that was not taken yet)"""
+        with self.condition:
+            self.frame = frame
+            self.captured_at = captured_at
+            self.wanted = False
+            self.condition.notify()
+
+    def take(self, timeout=None):
+        """
+        Wait for the next frame
+
+        Returns:
+            (frame, captured_at), or (None, 0.0) on timeout or close
+        """
+        with self.condition:
+            self.wanted = True
+            self.condition.wait_for(lambda: self.frame is not None or self.closed, timeout)
+            frame, captured_at = self.frame, self.captured_at
+            self.frame = None
+            return (frame, captured_at) if frame is not None else (None, 0.0)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
 
-# Medical emotion mapping rules
-# These map FER's basic emotions to medical states
-MEDICAL_EMOTION_RULES = {
-    'pain': {
-        'primary': ['angry', 'disgust', 'fear'],
-        'weights': {'angry': 0.6, 'disgust': 0.3, 'fear': 0.2}
-    },
-    'nausea': {
-        'primary': ['disgust', 'sad'],
-        'weights': {'disgust': 0.7, 'sad': 0.4}
-    },
-    'discomfort': {
-        'primary': ['fear', 'sad', 'angry'],
-        'weights': {'fear': 0.5, 'sad': 0.3, 'angry': 0.3}
-    },
-    'distress': {
-        'primary': ['fear', 'angry', 'sad'],
-        'weights': {'fear': 0.5, 'angry': 0.4, 'sad': 0.3}
-    }
-}
 
 class EmotionAnalyzer:
-    def __init__(self, camera_index=0):
+    def __init__(self, camera_index=0, target_fps=config.FER_TARGET_FPS, cpu_budget=config.FER_CPU_BUDGET):
+        """
+        Args:
+            camera_index: OpenCV camera index
+            target_fps: Most frames analyzed per second
+            cpu_budget: Share of one core inference may use (lowers the rate below target_fps when inference is slow)
+        """
         self.detector = None
         self.latest_emotion = None
         self.running = False
         self.camera_index = camera_index
         self.capture = None
+        self.target_fps = target_fps
+        self.cpu_budget = cpu_budget
+        self.slot = None
+        self.stop_event = threading.Event()
+        self.capture_thread = None
+        self.analysis_thread = None
+        self.frames_captured = 0
+        self.frames_analyzed = 0
+        self.interval = 1.0 / target_fps
+        self.grab_interval = 0.05  # time between camera frames (measured)
+        self.last_frame_age = None
+        self.tracker = FaceTracker(lost_counter=FER_TRACK_LOST)
+        self.gate = ChangeGate()
+        self.history = EmotionHistory()
+        self.frames_skipped = 0
         
         try:
             # Initialize FER detector
@@ -46,110 +111,163 @@ class EmotionAnalyzer:
             print(f"✗ Failed to initialize FER: {e}")
     
     def start_camera_analysis(self):
-        """Start analyzing emotions from webcam in background thread"""
+        """Start the capture and inference threads"""
         if not self.detector:
             print("⚠ Cannot start camera analysis - FER not available")
             return False
         
         self.running = True
-        self.analysis_thread = threading.Thread(target=self._camera_loop, daemon=True)
+        self.stop_event.clear()
+        self.slot = LatestFrame()
+        self.capture_thread = threading.Thread(target=self._capture_loop, name="fer-capture", daemon=True)
+        self.analysis_thread = threading.Thread(target=self._inference_loop, name="fer-inference", daemon=True)
+        self.capture_thread.start()
         self.analysis_thread.start()
-        print(f"✓ Started emotion analysis from camera {self.camera_index}")
+        print(f"✓ Started emotion analysis from camera {self.camera_index} "
+              f"(target {self.target_fps:g} FPS, CPU budget {self.cpu_budget:.0%})")
         return True
     
-    def _camera_loop(self):
-        """Background thread that continuously analyzes webcam frames"""
+    def _capture_loop(self):
+        """Background thread that keeps the camera drained and decodes a frame whenever one is wanted"""
         try:
             # Open webcam
             self.capture = cv2.VideoCapture(self.camera_index)
             
             if not self.capture.isOpened():
                 print(f"✗ Failed to open camera {self.camera_index}")
+                self.running = False
                 return
             
             # Set camera resolution - lower for better performance
             self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 320)
             self.capture.set(cv2.CAP_PROP_FPS, 20)
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # keep as few stale frames as the driver allows
             
             print(f"✓ Camera {self.camera_index} opened successfully")
             
+            last_grab = time.monotonic()
             while self.running:
-                ret, frame = self.capture.read()
-                
-                if not ret:
+                # grab() paces this loop at the camera's frame rate without decoding
+                if not self.capture.grab():
                     print("⚠ Failed to read frame from camera")
-                    time.sleep(0.1)
+                    self.stop_event.wait(0.1)
                     continue
-                
-                # Detect emotions in frame
-                try:
-                    # Resize frame for faster processing
-                    small_frame = cv2.resize(frame, (320, 240))
-                    result = self.detector.detect_emotions(small_frame)
-                    
-                    if result and len(result) > 0:
-                        # Get the first (most prominent) face
-                        face = result[0]
-                        base_emotions = face['emotions']
-                        
-                        # Calculate medical emotions from base emotions
-                        medical_emotions = self._calculate_medical_emotions(base_emotions)
-                        
-                        # Combine all emotions
-                        all_emotions = {**base_emotions, **medical_emotions}
-                        
-                        # Store latest emotion data
-                        self.latest_emotion = {
-                            'expressions': all_emotions,
-                            'base_emotions': base_emotions,
-                            'medical_emotions': medical_emotions,
-                            'dominant': max(all_emotions.items(), key=lambda x: x[1])[0],
-                            'confidence': max(all_emotions.values()),
-                            'timestamp': time.time()
-                        }
-                    else:
-                        # No face detected
-                        self.latest_emotion = None
-                        
-                except Exception as e:
-                    print(f"⚠ Emotion detection error: {e}")
-                
-                # Analyze at ~10 FPS to reduce CPU usage
-                time.sleep(0.1)
+                now = time.monotonic()
+                self.grab_interval = 0.9 * self.grab_interval + 0.1 * (now - last_grab)
+                last_grab = now
+                self.frames_captured += 1
+                FER_FRAMES_CAPTURED.inc()
+
+                if self.slot.wanted:
+                    ret, frame = self.capture.retrieve()
+                    if ret:
+                        self.slot.put(frame, time.time())
                 
         except Exception as e:
             print(f"✗ Camera loop error: {e}")
         finally:
+            self.slot.close()
             if self.capture:
                 self.capture.release()
             print("Camera released")
-    
-    def _calculate_medical_emotions(self, base_emotions):
+
+    def _inference_loop(self):
         """
-        Calculate medical emotions (pain, nausea, etc.) from base emotions
-        
-        Args:
-            base_emotions: Dict of FER's 7 basic emotions
-            
-        Returns:
-            Dict of medical emotion scores
+        Background thread that analyzes the newest frame, paced by target FPS and CPU budget
+
+        After each frame the next one is due after max(1 / target_fps,
+        inference time / cpu_budget), so slow inference lowers the rate
+        instead of queueing frames.
         """
-        medical_emotions = {}
-        
-        for medical_emotion, rule in MEDICAL_EMOTION_RULES.items():
-            score = 0.0
-            for emotion, weight in rule['weights'].items():
-                score += base_emotions.get(emotion, 0.0) * weight
-            # Clamp to [0, 1] range
-            medical_emotions[medical_emotion] = min(1.0, max(0.0, score))
-            score = score ** 2
-        
-        return medical_emotions
+        next_at = 0.0
+        last_frame_at = None
+        while self.running:
+            # Ask for a frame one camera frame early so it arrives when the next analysis is due
+            delay = next_at - time.monotonic() - self.grab_interval
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+
+            frame, captured_at = self.slot.take(timeout=1.0)
+            if frame is None:
+                if self.slot.closed:
+                    break
+                continue
+            delay = next_at - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+
+            started = time.monotonic()
+            self.last_frame_age = max(0.0, time.time() - captured_at)
+            FER_FRAME_AGE_SECONDS.observe(self.last_frame_age)
+            self._analyze_frame(frame)
+            finished = time.monotonic()
+
+            busy = finished - started
+            self.interval = max(1.0 / self.target_fps, busy / self.cpu_budget)
+            next_at = started + self.interval
+            if last_frame_at is not None:
+                fps = 1.0 / max(finished - last_frame_at, 1e-6)
+                FER_FPS.set(fps if FER_FPS.value == 0 else 0.9 * FER_FPS.value + 0.1 * fps)
+            last_frame_at = finished
+
+    def _analyze_frame(self, frame):
+        """Run FER on one frame and update latest_emotion"""
+        try:
+            # Resize frame for faster processing
+            small_frame = cv2.resize(frame, (320, 240))
+            started = time.perf_counter()
+            gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
+            box = self.tracker.track(gray)
+
+            # Static scene: keep the previous result instead of running FER on a near-identical face
+            now = time.monotonic()
+            face_box = self.tracker.box
+            if self.gate.threshold > 0 and self.gate.unchanged(self.gate.signature(gray, face_box), face_box is not None, now):
+                self.frames_skipped += 1
+                FER_FRAMES_SKIPPED.inc()
+                FER_SKIPPED_SECONDS.inc(FER_INFERENCE_SECONDS.snapshot()['mean'])
+                if self.latest_emotion:
+                    self.latest_emotion = dict(self.latest_emotion, timestamp=time.time())
+                self.history.append(self.latest_emotion)
+                return
+
+            if box is not None:
+                # Classify only the tracked face ROI (skips the cascade's full-frame scan)
+                result = self.detector.detect_emotions(small_frame, face_rectangles=[box])
+                FER_TRACKED.inc()
+            else:
+                result = self.detector.detect_emotions(small_frame)
+                self.tracker.reset(gray, result[0]['box'] if result else None)
+                FER_DETECTED.inc()
+            FER_INFERENCE_SECONDS.observe(time.perf_counter() - started)
+            face_box = self.tracker.box
+            self.gate.mark(self.gate.signature(gray, face_box), face_box is not None, now)
+            FER_FRAMES.inc()
+            self.frames_analyzed += 1
+            
+            if result and len(result) > 0:
+                # Get the first (most prominent) face and store its emotion data
+                self.latest_emotion = build_emotion(result[0]['emotions'])
+            else:
+                # No face detected
+                self.latest_emotion = None
+            self.history.append(self.latest_emotion)
+                
+        except Exception as e:
+            print(f"⚠ Emotion detection error: {e}")
+    
+    def _calculate_medical_emotions(self, base_emotions):
+        """Calculate medical emotions (pain, nausea, etc.) from base emotions"""
+        return calculate_medical_emotions(base_emotions)
     
     def get_latest_emotion(self):
-        """Get the most recent emotion analysis"""
+        """Get the most recent emotion analysis (raw, last frame only)"""
         return self.latest_emotion
+
+    def get_smoothed_emotion(self):
+        """Get the smoothed emotion (None once no face was seen for FER_DROPOUT_SECONDS)"""
+        return self.history.current()
     
     def analyze_landmarks(self, landmarks):
         """
@@ -165,11 +283,50 @@ class EmotionAnalyzer:
         
         return emotion_data.get('dominant', 'unknown')
     
-    def stop(self):
-        """Stop camera analysis"""
+    def stop(self, timeout=2.0):
+        """Stop camera analysis (the capture thread releases the camera)"""
         self.running = False
-        if self.capture:
-            self.capture.release()
+        self.stop_event.set()
+        if self.slot:
+            self.slot.close()
+        for thread in (self.capture_thread, self.analysis_thread):
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def get_stats(self):
+        """Get capture/analysis counts, pacing and frame freshness"""
+        inference = FER_INFERENCE_SECONDS.snapshot()
+        score = self.tracker.last_score
+        return {
+            'camera_index': self.camera_index,
+            'running': self.running,
+            'frames_captured': self.frames_captured,
+            'frames_analyzed': self.frames_analyzed,
+            'fps': round(FER_FPS.value, 2),
+            'target_fps': self.target_fps,
+            'cpu_budget': self.cpu_budget,
+            'interval_ms': round(self.interval * 1000, 1),
+            'last_frame_age_ms': None if self.last_frame_age is None else round(self.last_frame_age * 1000, 1),
+            'inference_ms': {
+                'p50': round(inference['p50'] * 1000, 1),
+                'p95': round(inference['p95'] * 1000, 1),
+            },
+            'change_gating': {
+                'threshold': self.gate.threshold,
+                'frames_skipped': self.frames_skipped,
+                'skip_ratio': round(self.frames_skipped / max(1, self.frames_skipped + self.frames_analyzed), 3),
+                'inference_saved_s': round(FER_SKIPPED_SECONDS.value, 2),
+                'last_change': None if self.gate.last_change is None else round(self.gate.last_change, 2),
+            },
+            'face_tracking': {
+                'detect_every': self.tracker.detect_every,
+                'detections': FER_DETECTED.value,
+                'tracked': FER_TRACKED.value,
+                'lost': FER_TRACK_LOST.value,
+                'tracking': self.tracker.box is not None,
+                'last_score': None if score is None else round(score, 3),
+            },
+        }
     
     def is_available(self):
         """Check if FER is properly initialized"""
@@ -186,12 +343,22 @@ def start_emotion_analysis(camera_index=0):
 
 def get_current_emotion():
     """
-    Get current emotion from webcam analysis
+    Get current emotion from webcam analysis, smoothed over recent frames
     
     Returns:
         dict with emotion analysis or None
     """
-    return emotion_analyzer.get_latest_emotion()
+    return emotion_analyzer.get_smoothed_emotion()
+
+
+def get_emotion_history(seconds=config.FER_HISTORY_DEFAULT_SECONDS):
+    """Get the webcam's smoothed emotion, window aggregates and per-frame scores for the last `seconds`"""
+    return emotion_analyzer.history.snapshot(seconds)
+
+
+def get_emotion_stats():
+    """Get the emotion analyzer's capture/inference statistics"""
+    return emotion_analyzer.get_stats()
 
 
 def get_emotion_summary():
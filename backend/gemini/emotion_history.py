@@ -0,0 +1,196 @@
+"""
+Emotion history
+Fixed-size, array-backed history of per-frame emotion scores with
+temporal smoothing, so the served emotion does not flicker frame to
+frame or vanish the moment a single frame misses the face
+
+Kept free of OpenCV/FER imports (like emotion_mapping) so both the
+webcam analyzer and the multi-camera pool can keep one per camera.
+"""
+import math
+import threading
+import time
+from typing import Dict, Optional
+import numpy as np
+from emotion_mapping import MEDICAL_EMOTION_RULES
+import config
+
+BASE_EMOTIONS = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
+MEDICAL_EMOTIONS = tuple(MEDICAL_EMOTION_RULES)
+CHANNELS = BASE_EMOTIONS + MEDICAL_EMOTIONS
+SMOOTHING_MODES = ('ewma', 'median', 'none')
+
+
+def _record(vector: np.ndarray, timestamp: float, mode: str) -> Dict:
+    """Build an emotion record (same shape as emotion_mapping.build_emotion) from a channel vector"""
+    base_emotions = {name: round(float(v), 4) for name, v in zip(BASE_EMOTIONS, vector[:len(BASE_EMOTIONS)])}
+    medical_emotions = {name: round(float(v), 4) for name, v in zip(MEDICAL_EMOTIONS, vector[len(BASE_EMOTIONS):])}
+    all_emotions = {**base_emotions, **medical_emotions}
+    dominant = int(np.argmax(vector))
+    return {
+        'expressions': all_emotions,
+        'base_emotions': base_emotions,
+        'medical_emotions': medical_emotions,
+        'dominant': CHANNELS[dominant],
+        'confidence': round(float(vector[dominant]), 4),
+        'timestamp': timestamp,
+        'smoothing': mode
+    }
+
+
+class EmotionHistory:
+    """
+    Ring buffer of the last `capacity` analyzed frames (one row of 7 base +
+    4 medical scores per frame, NaN while no face was found)
+
+    The EWMA is updated incrementally on append (one vector operation,
+    with a time-constant based weight because frames arrive irregularly),
+    medians and windowed aggregates are computed over the buffer on read.
+    Frames without a face leave the smoothed value alone; only after
+    dropout_seconds without a face is the current emotion reported as
+    None, and the EWMA restarts from the next face instead of blending
+    with stale scores.
+    """
+
+    def __init__(self, capacity: int = config.FER_HISTORY_SIZE,
+                 mode: str = config.FER_SMOOTHING,
+                 smoothing_seconds: float = config.FER_SMOOTHING_SECONDS,
+                 median_window: int = config.FER_MEDIAN_WINDOW,
+                 dropout_seconds: float = config.FER_DROPOUT_SECONDS):
+        """
+        Args:
+            capacity: Frames kept (memory is fixed at capacity x 11 scores)
+            mode: Smoothing of the current emotion: 'ewma', 'median' or 'none'
+            smoothing_seconds: EWMA time constant
+            median_window: Most recent face frames the median is taken over
+            dropout_seconds: How long the last face is still reported when frames miss it
+        """
+        if mode not in SMOOTHING_MODES:
+            raise ValueError(f"Unknown smoothing mode '{mode}' (expected one of {', '.join(SMOOTHING_MODES)})")
+        self.capacity = max(1, capacity)
+        self.mode = mode
+        self.smoothing_seconds = smoothing_seconds
+        self.median_window = max(1, median_window)
+        self.dropout_seconds = dropout_seconds
+        self.values = np.full((self.capacity, len(CHANNELS)), np.nan, dtype=np.float32)
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.head = 0  # next row to write
+        self.count = 0
+        self.ewma = np.zeros(len(CHANNELS), dtype=np.float64)
+        self.last_face_at = None
+        self.lock = threading.Lock()
+
+    def append(self, emotion: Optional[Dict], timestamp: Optional[float] = None):
+        """
+        Record one analyzed frame
+
+        Args:
+            emotion: Emotion record from build_emotion, or None if no face was found
+            timestamp: Frame time (defaults to now)
+        """
+        t = time.time() if timestamp is None else timestamp
+        row = None
+        if emotion is not None:
+            scores = emotion['expressions']
+            row = np.fromiter((scores.get(name, 0.0) for name in CHANNELS), dtype=np.float64, count=len(CHANNELS))
+        with self.lock:
+            self.times[self.head] = t
+            if row is None:
+                self.values[self.head] = np.nan
+            else:
+                self.values[self.head] = row
+                if self.last_face_at is None or t - self.last_face_at > self.dropout_seconds:
+                    self.ewma[:] = row  # first face, or back after a dropout: restart
+                else:
+                    alpha = 1.0 - math.exp(-max(0.0, t - self.last_face_at) / self.smoothing_seconds)
+                    self.ewma += alpha * (row - self.ewma)
+                self.last_face_at = t
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def _ordered(self):
+        """Copy of (times, values) in chronological order (call with the lock held)"""
+        order = (self.head - self.count + np.arange(self.count)) % self.capacity
+        return self.times[order], self.values[order]
+
+    def current(self, now: Optional[float] = None) -> Optional[Dict]:
+        """
+        Get the smoothed current emotion
+
+        Returns:
+            Emotion record, or None if no face was seen within dropout_seconds
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.last_face_at is None or now - self.last_face_at > self.dropout_seconds:
+                return None
+            last_face_at = self.last_face_at
+            if self.mode == 'ewma':
+                vector = self.ewma.copy()
+            else:
+                _, values = self._ordered()
+                faces = values[~np.isnan(values[:, 0])]
+                window = 1 if self.mode == 'none' else self.median_window
+                vector = np.median(faces[-window:], axis=0)
+        return _record(vector, last_face_at, self.mode)
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Dict:
+        """
+        Aggregate the frames of the last `seconds`
+
+        Returns:
+            {"frames", "face_ratio", "mean", "max", "dominant_share"} (per-channel dicts; empty without faces)
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            times, values = self._ordered()
+        values = values[times >= now - seconds]
+        faces = values[~np.isnan(values[:, 0])]
+        summary = {
+            'seconds': seconds,
+            'frames': int(len(values)),
+            'face_ratio': round(len(faces) / len(values), 3) if len(values) else 0.0,
+            'mean': {},
+            'max': {},
+            'dominant_share': {},
+        }
+        if len(faces):
+            means, maxima = faces.mean(axis=0), faces.max(axis=0)
+            shares = np.bincount(faces.argmax(axis=1), minlength=len(CHANNELS)) / len(faces)
+            for i, name in enumerate(CHANNELS):
+                summary['mean'][name] = round(float(means[i]), 4)
+                summary['max'][name] = round(float(maxima[i]), 4)
+                if shares[i]:
+                    summary['dominant_share'][name] = round(float(shares[i]), 3)
+        return summary
+
+    def series(self, seconds: float, now: Optional[float] = None) -> Dict:
+        """
+        Get the raw per-frame scores of the last `seconds`
+
+        Returns:
+            {"timestamps": [...], "channels": {name: [score or None, ...]}}
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            times, values = self._ordered()
+        keep = times >= now - seconds
+        times, values = times[keep], values[keep]
+        rounded = np.round(values.astype(np.float64), 4)
+        return {
+            'timestamps': [round(float(t), 3) for t in times],
+            'channels': {
+                name: [None if v != v else v for v in rounded[:, i].tolist()]
+                for i, name in enumerate(CHANNELS)
+            },
+        }
+
+    def snapshot(self, seconds: float, now: Optional[float] = None) -> Dict:
+        """Get the current smoothed emotion, window aggregates and per-frame series for the history route"""
+        now = time.time() if now is None else now
+        return {
+            'current': self.current(now),
+            'window': self.window(seconds, now),
+            'series': self.series(seconds, now),
+            'capacity': self.capacity,
+        }
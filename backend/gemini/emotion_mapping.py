@@ -0,0 +1,74 @@
+"""
+Medical emotion mapping
+Maps FER's 7 basic emotions to medical states (pain, nausea, ...) and
+builds the emotion record served by the API
+
+Kept free of OpenCV/FER imports so the multi-camera pool can use it
+without loading a detector in the main process.
+"""
+import time
+from typing import Dict, Optional
+
+# Medical emotion mapping rules
+# These map FER's basic emotions to medical states
+MEDICAL_EMOTION_RULES = {
+    'pain': {
+        'primary': ['angry', 'disgust', 'fear'],
+        'weights': {'angry': 0.6, 'disgust': 0.3, 'fear': 0.2}
+    },
+    'nausea': {
+        'primary': ['disgust', 'sad'],
+        'weights': {'disgust': 0.7, 'sad': 0.4}
+    },
+    'discomfort': {
+        'primary': ['fear', 'sad', 'angry'],
+        'weights': {'fear': 0.5, 'sad': 0.3, 'angry': 0.3}
+    },
+    'distress': {
+        'primary': ['fear', 'angry', 'sad'],
+        'weights': {'fear': 0.5, 'angry': 0.4, 'sad': 0.3}
+    }
+}
+
+
+def calculate_medical_emotions(base_emotions: Dict[str, float]) -> Dict[str, float]:
+    """
+    Calculate medical emotions (pain, nausea, etc.) from base emotions
+
+    Args:
+        base_emotions: Dict of FER's 7 basic emotions
+
+    Returns:
+        Dict of medical emotion scores
+    """
+    medical_emotions = {}
+
+    for medical_emotion, rule in MEDICAL_EMOTION_RULES.items():
+        score = 0.0
+        for emotion, weight in rule['weights'].items():
+            score += base_emotions.get(emotion, 0.0) * weight
+        # Clamp to [0, 1] range
+        medical_emotions[medical_emotion] = min(1.0, max(0.0, score))
+
+    return medical_emotions
+
+
+def build_emotion(base_emotions: Dict[str, float], timestamp: Optional[float] = None) -> Dict:
+    """
+    Build the emotion record for one detected face
+
+    Returns:
+        {"expressions", "base_emotions", "medical_emotions", "dominant", "confidence", "timestamp"}
+    """
+    medical_emotions = calculate_medical_emotions(base_emotions)
+
+    # Combine all emotions
+    all_emotions = {**base_emotions, **medical_emotions}
+    return {
+        'expressions': all_emotions,
+        'base_emotions': base_emotions,
+        'medical_emotions': medical_emotions,
+        'dominant': max(all_emotions.items(), key=lambda x: x[1])[0],
+        'confidence': max(all_emotions.values()),
+        'timestamp': time.time() if timestamp is None else timestamp
+    }
@@ -0,0 +1,135 @@
+"""
+Face tracking and change gating
+Cheap per-frame checks that decide how much FER work a frame needs: follow
+the last detected face between full detections, and skip frames whose face
+region has not changed
+
+Kept free of FER imports (like emotion_history) so the multi-camera pool
+can run them in the main process without loading TensorFlow.
+"""
+import cv2
+import numpy as np
+import config
+
+
+class FaceTracker:
+    """
+    Follows the last detected face box between full detections
+
+    Template matching of the face (at half resolution, in a window around
+    the previous box) costs a fraction of the cascade's full-frame scan.
+    A full detection is due every detect_every frames, or as soon as the
+    match score drops below min_score (face turned away, left the frame,
+    occluded).
+    """
+
+    def __init__(self, detect_every=config.FER_DETECT_EVERY, min_score=config.FER_TRACK_MIN_SCORE,
+                 search_margin=config.FER_TRACK_SEARCH_MARGIN, lost_counter=None):
+        """
+        Args:
+            detect_every: Frames between full detections (1 disables tracking)
+            min_score: Lowest normalized match score that still counts as the same face
+            search_margin: Search window padding around the last box, as a share of the box size
+            lost_counter: Metric counter incremented whenever the tracked face is lost
+        """
+        self.detect_every = max(1, detect_every)
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.box = None
+        self.template = None
+        self.since_detect = 0
+        self.last_score = None
+        self.lost_counter = lost_counter
+
+    def reset(self, gray, box):
+        """Start following a freshly detected box (None when no face was found)"""
+        self.since_detect = 0
+        self.box = self.template = None
+        if box is None:
+            return
+        x, y, w, h = (int(v) for v in box)
+        half = cv2.pyrDown(gray)
+        template = half[y // 2:(y + h) // 2, x // 2:(x + w) // 2]
+        if template.shape[0] >= 4 and template.shape[1] >= 4:
+            self.box = (x, y, w, h)
+            self.template = template
+
+    def track(self, gray):
+        """
+        Find the face in a new frame
+
+        Returns:
+            (x, y, w, h) in frame coordinates, or None when a full detection is due
+        """
+        if self.box is None or self.since_detect + 1 >= self.detect_every:
+            return None
+        x, y, w, h = self.box
+        half = cv2.pyrDown(gray)
+        th, tw = self.template.shape
+        pad_x, pad_y = int(tw * self.search_margin) + 1, int(th * self.search_margin) + 1
+        x0, y0 = max(0, x // 2 - pad_x), max(0, y // 2 - pad_y)
+        x1, y1 = min(half.shape[1], x // 2 + tw + pad_x), min(half.shape[0], y // 2 + th + pad_y)
+        window = half[y0:y1, x0:x1]
+        if window.shape[0] < th or window.shape[1] < tw:
+            self.reset(gray, None)
+            return None
+        _, score, _, (dx, dy) = cv2.minMaxLoc(cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED))
+        self.last_score = score
+        if score < self.min_score:
+            self.reset(gray, None)
+            if self.lost_counter is not None:
+                self.lost_counter.inc()
+            return None
+        self.since_detect += 1
+        self.box = ((x0 + dx) * 2, (y0 + dy) * 2, w, h)
+        return self.box
+
+
+class ChangeGate:
+    """
+    Decides whether a frame changed enough since the last analyzed one to run FER again
+
+    The face region (or the whole frame while no face is tracked) is
+    area-averaged down to a 16x16 signature, which also averages out
+    sensor noise; the frame counts as unchanged while the mean absolute
+    difference to the last analyzed signature stays below threshold.
+    Comparing against the last *analyzed* frame (not the previous one)
+    lets slow drift add up, and max_skip forces a fresh analysis anyway.
+    """
+
+    SIZE = (16, 16)
+
+    def __init__(self, threshold=config.FER_CHANGE_THRESHOLD, max_skip=config.FER_MAX_SKIP_SECONDS):
+        """
+        Args:
+            threshold: Mean absolute gray-level difference (0-255) below which a frame is skipped (0 disables gating)
+            max_skip: Longest time (seconds) a result is reused without running FER
+        """
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.reference = None
+        self.reference_is_face = False
+        self.analyzed_at = 0.0
+        self.last_change = None
+
+    def signature(self, gray, box):
+        """Downsampled face region (whole frame when box is None)"""
+        if box is not None:
+            x, y, w, h = box
+            region = gray[max(0, y):y + h, max(0, x):x + w]
+            if region.size:
+                gray = region
+        return cv2.resize(gray, self.SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def unchanged(self, signature, is_face, now):
+        """True if the last result can be reused for this frame"""
+        if self.reference is None or is_face != self.reference_is_face or now - self.analyzed_at >= self.max_skip:
+            return False
+        self.last_change = float(np.abs(signature - self.reference).mean())
+        return self.last_change < self.threshold
+
+    def mark(self, signature, is_face, now):
+        """Remember the frame FER just analyzed"""
+        self.reference = signature
+        self.reference_is_face = is_face
+        self.analyzed_at = now
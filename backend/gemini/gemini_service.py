@@ -1,6 +1,9 @@
 import os
 from dotenv import load_dotenv
 from google import genai
+from utils.metrics import Histogram
+
+GEMINI_SECONDS = Histogram('gemini_request_seconds', 'Gemini API call latency', ['operation'])
 
 load_dotenv()
 
@@ -16,19 +19,21 @@ def analyze_vitals(pulse, breathing):
 
 Provide a brief health assessment and any recommendations."""
     
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=prompt
-    )
+    with GEMINI_SECONDS.labels('analyze_vitals').time():
+        response = client.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=prompt
+        )
     
     return response.text
 
 def chat_with_gemini(message):
     """General chat with Gemini"""
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=message
-    )
+    with GEMINI_SECONDS.labels('chat').time():
+        response = client.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=message
+        )
     
     return response.text
 
@@ -46,7 +51,8 @@ def generate_ai_message_emergency(name, address, incident, heartrate, breathing,
         f"Speak clearly, calmly, and professionally as an AI assistant."
     )
     try:
-        response = client.generate_content(prompt)
+        with GEMINI_SECONDS.labels('emergency_message').time():
+            response = client.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
         print(f"Error generating AI message: {e}")
@@ -69,7 +75,8 @@ def generate_ai_message_family(name, address, incident, heartrate, breathing, em
         f"Speak clearly, calmly, and professionally as an AI assistant."
     )
     try:
-        response = client.generate_content(prompt)
+        with GEMINI_SECONDS.labels('family_message').time():
+            response = client.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
         print(f"Error generating AI message: {e}")
@@ -1,11 +1,12 @@
 from flask import Flask
 from flask_cors import CORS
-from socket_server import start_socket_server, set_vitals_monitor
-from routes import register_routes
-from visualizer_gui import start_gui
-from emotion_analyzer import start_emotion_analysis
-from services.vitals_monitor import VitalsMonitor
-from services.alert_manager import AlertManager
+from socket_server import start_socket_server, set_vitals_store, set_ingest_pipeline
+from services.vitals_store import VitalsStore
+from services.ingest_pipeline import IngestPipeline
+from services.task_executor import alert_executor
+from services.alert_store import alert_store
+from services.baselines import baseline_store
+from services.emotion_pool import emotion_pool
 from utils.logger import setup_logger
 import config
 import sys
@@ -15,64 +16,107 @@ import argparse
 # Setup logging
 logger = setup_logger(__name__)
 
-# Force unbuffered output
+# Force unbuffered output for print() (log records are written by the
+# logging listener thread, not the threads that emit them)
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description='PulseAI - Vital Signs Monitoring with Alert System')
-parser.add_argument('--gui', action='store_true', help='Launch GUI visualizer')
-parser.add_argument('--camera', type=int, default=0, help='Camera index (default: 0)')
-parser.add_argument('--no-fer', action='store_true', help='Disable FER emotion detection')
-args = parser.parse_args()
-
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
-
-logger.info("=" * 60)
-logger.info("PulseAI - Vital Signs Alert System")
-logger.info("=" * 60)
-
-# Initialize Alert Manager
-alert_manager = AlertManager()
-logger.info("✓ AlertManager initialized")
-
-# Initialize Vitals Monitor with alert callback
-vitals_monitor = VitalsMonitor(alert_callback=alert_manager.trigger_alert)
-logger.info("✓ VitalsMonitor initialized")
-
-# Start socket server in background
-logger.info("Starting socket server...")
-start_socket_server()
-time.sleep(0.5)  # Give socket server time to bind
-
-# Connect vitals monitor to socket server
-set_vitals_monitor(vitals_monitor)
-logger.info("✓ Socket server started and connected to VitalsMonitor")
-
-# Start emotion analysis from webcam
-if not args.no_fer:
-    logger.info(f"Starting emotion analysis from camera {args.camera}...")
-    if start_emotion_analysis(camera_index=args.camera):
-        logger.info("✓ Emotion analysis running")
+
+def parse_cameras(value):
+    """Parse --cameras "patientA=0,patientB=1" into {patient_id: camera_index}"""
+    cameras = {}
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        patient_id, sep, index = entry.partition('=')
+        if not sep or not patient_id.strip() or not index.strip().isdigit():
+            raise argparse.ArgumentTypeError(f"expected patient=camera_index, got '{entry}'")
+        cameras[patient_id.strip()] = int(index)
+    return cameras
+
+
+def main():
+    # Server modules (and the FER model they load) are imported here: FER pool
+    # workers are spawned processes that re-import this file as __mp_main__
+    from routes import register_routes
+    from visualizer_gui import start_gui
+    from emotion_analyzer import start_emotion_analysis
+
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='PulseAI - Vital Signs Monitoring with Alert System')
+    parser.add_argument('--gui', action='store_true', help='Launch GUI visualizer')
+    parser.add_argument('--camera', type=int, default=0, help='Camera index (default: 0)')
+    parser.add_argument('--no-fer', action='store_true', help='Disable FER emotion detection')
+    parser.add_argument('--cameras', type=parse_cameras, default=None,
+                        help='Analyze one camera per patient in the FER worker pool, e.g. "patientA=0,patientB=1"')
+    args = parser.parse_args()
+
+    # Initialize Flask app
+    app = Flask(__name__)
+    CORS(app)
+
+    logger.info("=" * 60)
+    logger.info("PulseAI - Vital Signs Alert System")
+    logger.info("=" * 60)
+
+    # Load learned patient baselines before any monitor is created
+    baseline_store.start()
+    logger.info("✓ Patient baselines loaded")
+
+    # Initialize per-patient state store (each patient gets its own
+    # VitalsMonitor and AlertManager on first sample)
+    vitals_store = VitalsStore()
+    vitals_store.get_or_create(config.DEFAULT_PATIENT_ID)
+    logger.info("✓ VitalsStore initialized")
+
+    # Start the shared alert executor (alert callbacks and conversations
+    # run on its fixed worker pool instead of a new thread per alert)
+    alert_executor.start()
+    logger.info("✓ Alert executor started")
+
+    # Open the alert history database (warms the recent-alerts cache)
+    alert_store.start()
+    logger.info("✓ Alert history store opened")
+
+    # Start evaluation workers (socket server only parses and enqueues)
+    ingest_pipeline = IngestPipeline(vitals_store)
+    ingest_pipeline.start()
+    logger.info("✓ IngestPipeline started")
+
+    # Connect state store and pipeline to socket server
+    set_vitals_store(vitals_store)
+    set_ingest_pipeline(ingest_pipeline)
+
+    # Start socket server in background
+    logger.info("Starting socket server...")
+    start_socket_server()
+    time.sleep(0.5)  # Give socket server time to bind
+    logger.info("✓ Socket server started and connected to VitalsStore")
+
+    # Start emotion analysis from webcam
+    if not args.no_fer and args.cameras:
+        logger.info(f"Starting pooled emotion analysis for {len(args.cameras)} cameras...")
+        for patient_id, camera_index in args.cameras.items():
+            emotion_pool.add_camera(patient_id, camera_index)
+        logger.info(f"✓ Emotion pool running ({emotion_pool.num_workers} FER workers)")
+    elif not args.no_fer:
+        logger.info(f"Starting emotion analysis from camera {args.camera}...")
+        if start_emotion_analysis(camera_index=args.camera):
+            logger.info("✓ Emotion analysis running")
+        else:
+            logger.warning("⚠ Emotion analysis not available")
     else:
-        logger.warning("⚠ Emotion analysis not available")
-else:
-    logger.warning("⚠ FER emotion detection disabled (--no-fer flag)")
+        logger.warning("⚠ FER emotion detection disabled (--no-fer flag)")
 
-# Register routes (pass alert_manager for API access)
-register_routes(app, alert_manager, vitals_monitor)
-logger.info("✓ API routes registered")
+    # Register routes (pass state store for per-patient API access)
+    register_routes(app, vitals_store, ingest_pipeline)
+    logger.info("✓ API routes registered")
 
-# Start GUI if requested
-if args.gui:
-    logger.info("Starting GUI visualizer...")
-    start_gui()
-    time.sleep(0.5)
-    logger.info("✓ GUI visualizer started")
+    # Start GUI if requested
+    if args.gui:
+        logger.info("Starting GUI visualizer...")
+        start_gui()
+        time.sleep(0.5)
+        logger.info("✓ GUI visualizer started")
 
-if __name__ == '__main__':
     logger.info("=" * 60)
     logger.info(f"Flask API running on http://{config.FLASK_HOST}:{config.FLASK_PORT}")
     logger.info(f"SmartSpectra connects to port {config.SOCKET_PORT}")
@@ -82,5 +126,9 @@ if __name__ == '__main__':
         logger.info("GUI visualizer is running")
     logger.info("=" * 60)
     logger.info("System ready! Monitoring vitals...")
-    
-    app.run(host=config.FLASK_HOST, port=config.FLASK_PORT, debug=True, use_reloader=False)
\ No newline at end of file
+
+    app.run(host=config.FLASK_HOST, port=config.FLASK_PORT, debug=True, use_reloader=False)
+
+
+if __name__ == '__main__':
+    main()
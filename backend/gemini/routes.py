@@ -1,41 +1,162 @@
-from flask import jsonify, request
-from socket_server import get_latest_vitals
+from flask import jsonify, request, Response, stream_with_context
+from socket_server import get_latest_vitals, get_connections
 from gemini_service import analyze_vitals, chat_with_gemini
-from emotion_analyzer import get_current_emotion, get_emotion_summary
-from utils.logger import setup_logger
+from emotion_analyzer import get_current_emotion, get_emotion_summary, get_emotion_stats, get_emotion_history
+from services.vitals_stream import vitals_broadcaster, format_event, ALL_PATIENTS
+from services.action_journal import action_journal
+from services.emotion_pool import emotion_pool
+from services.anomaly_rules import anomaly_engine
+from services.alert_outcomes import alert_outcomes
+from services.alert_store import alert_store
+from services.task_executor import alert_executor
+from services.voice_agent_client import voice_agent_client
+from utils.logger import setup_logger, get_dropped_count
+from utils.metrics import Gauge, Histogram, registry
+from utils.tracing import tracer
+import config
 from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse
 from dotenv import load_dotenv
 from gemini_service import generate_ai_message_emergency, generate_ai_message_family
+import json
 import os
+import time
 
 logger = setup_logger(__name__)
 
-def register_routes(app, alert_manager, vitals_monitor):
+TWILIO_SECONDS = Histogram('twilio_call_create_seconds', 'Twilio calls.create latency')
+
+def register_routes(app, vitals_store, ingest_pipeline=None):
     """Register all Flask routes"""
+    def requested_patient_id():
+        """Patient selected by the ?patient_id= query parameter"""
+        return request.args.get('patient_id', config.DEFAULT_PATIENT_ID)
+
+    def unknown_patient(patient_id):
+        return jsonify({"error": f"Unknown patient: {patient_id}"}), 404
+
     # ===== VITALS ENDPOINTS =====
     @app.route('/api/vitals/current', methods=['GET'])
     def get_current_vitals():
         """Get latest vitals data with emotion analysis and alert status"""
-        vitals = get_latest_vitals()
-        emotion_data = get_current_emotion()
+        patient_id = requested_patient_id()
+        state = vitals_store.get(patient_id)
+        if state is None:
+            return unknown_patient(patient_id)
+        vitals = dict(state.vitals)
+        # Patients with their own camera in the FER pool; everyone else shares the webcam analyzer
+        if emotion_pool.has_camera(patient_id):
+            emotion_data = emotion_pool.get_emotion(patient_id)
+        else:
+            emotion_data = get_current_emotion()
         if emotion_data:
             vitals['emotion'] = emotion_data
             vitals['emotion_summary'] = emotion_data.get('dominant', 'unknown')
-        active_alert = alert_manager.get_active_alert()
+        active_alert = state.alert_manager.get_active_alert()
         vitals['alert_active'] = active_alert is not None
         if active_alert:
             vitals['alert_id'] = active_alert['id']
-        monitor_status = vitals_monitor.get_status()
+        monitor_status = state.monitor.get_status()
         vitals['is_abnormal'] = monitor_status['is_abnormal']
         vitals['abnormal_duration'] = monitor_status['abnormal_duration']
+        vitals['active_rules'] = monitor_status['active_rules']
         return jsonify(vitals)
 
+    @app.route('/api/vitals/stream', methods=['GET'])
+    def stream_vitals():
+        """Push vitals samples as Server-Sent Events (?patient_id=* for all patients)"""
+        patient_id = requested_patient_id()
+        if patient_id != ALL_PATIENTS and vitals_store.get(patient_id) is None:
+            return unknown_patient(patient_id)
+        subscription = vitals_broadcaster.subscribe(patient_id)
+
+        def events():
+            try:
+                if patient_id != ALL_PATIENTS:
+                    yield format_event(vitals_store.get_latest_vitals(patient_id))
+                while True:
+                    event = subscription.get(timeout=config.STREAM_KEEPALIVE_INTERVAL)
+                    yield event if event is not None else ": keepalive\n\n"
+            finally:
+                vitals_broadcaster.unsubscribe(subscription)
+
+        return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    @app.route('/api/vitals/history', methods=['GET'])
+    def get_vitals_history():
+        """Get recent vitals samples (?seconds= window, ?limit= newest N), columnar"""
+        patient_id = requested_patient_id()
+        state = vitals_store.get(patient_id)
+        if state is None:
+            return unknown_patient(patient_id)
+        seconds = request.args.get('seconds', type=float)
+        limit = request.args.get('limit', type=int)
+        window = state.history.window(seconds=seconds, limit=limit)
+        return jsonify({
+            "patient_id": patient_id,
+            "count": len(window['timestamp']),
+            "samples": {name: values.tolist() for name, values in window.items()}
+        })
+
+    @app.route('/api/vitals/stats', methods=['GET'])
+    def get_vitals_stats():
+        """Get min/max/mean/percentiles over a ?seconds= window of history"""
+        patient_id = requested_patient_id()
+        state = vitals_store.get(patient_id)
+        if state is None:
+            return unknown_patient(patient_id)
+        seconds = request.args.get('seconds', default=300.0, type=float)
+        return jsonify({
+            "patient_id": patient_id,
+            "window_seconds": seconds,
+            **state.history.stats(seconds=seconds)
+        })
+
+    @app.route('/api/vitals/baseline', methods=['GET'])
+    def get_vitals_baseline():
+        """Get a patient's learned baseline statistics and adaptive thresholds"""
+        patient_id = requested_patient_id()
+        state = vitals_store.get(patient_id)
+        if state is None:
+            return unknown_patient(patient_id)
+        return jsonify(state.monitor.baseline.snapshot())
+
+    @app.route('/api/vitals/rules', methods=['GET'])
+    def get_anomaly_rules():
+        """List the compiled anomaly rules that decide whether vitals are abnormal"""
+        return jsonify({"rules": anomaly_engine.describe()})
+
+    @app.route('/api/patients', methods=['GET'])
+    def get_patients():
+        """List monitored patients with their current status"""
+        patients = []
+        for state in vitals_store.states():
+            monitor_status = state.monitor.get_status()
+            patients.append({
+                "patient_id": state.patient_id,
+                "vitals_status": state.vitals['status'],
+                "updated_at": state.updated_at,
+                "is_abnormal": monitor_status['is_abnormal'],
+                "active_rules": monitor_status['active_rules'],
+                "alert_active": state.alert_manager.get_active_alert() is not None
+            })
+        return jsonify({
+            "count": len(patients),
+            "patients": patients
+        })
+
     # ===== ALERT ENDPOINTS =====
     @app.route('/api/alerts/active', methods=['GET'])
     def get_active_alert():
         """Get currently active alert (if any)"""
-        active_alert = alert_manager.get_active_alert()
+        patient_id = requested_patient_id()
+        state = vitals_store.get(patient_id)
+        if state is None:
+            return unknown_patient(patient_id)
+        active_alert = state.alert_manager.get_active_alert()
         if not active_alert:
             return jsonify({
                 "alert_active": False,
@@ -46,11 +167,69 @@ def register_routes(app, alert_manager, vitals_monitor):
             "alert": active_alert
         })
 
+    @app.route('/api/alerts/history', methods=['GET'])
+    def get_alerts_history():
+        """
+        Page through alert history, newest first
+        Query params: patient_id, status, since, until (epoch seconds),
+        before (cursor from the previous page's next_before), limit (default 50, max 500)
+        """
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        page = alert_store.query(
+            patient_id=request.args.get('patient_id'),
+            status=request.args.get('status'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float),
+            before=request.args.get('before', type=int),
+            limit=limit
+        )
+        return jsonify({
+            "count": len(page['alerts']),
+            "alerts": page['alerts'],
+            "next_before": page['next_before']
+        })
+
+    @app.route('/api/actions/journal', methods=['GET'])
+    def get_action_journal():
+        """
+        Stream action journal entries (oldest first) as JSON Lines
+        Query params: type, action, patient_id, since, until (epoch seconds)
+        """
+        entries = action_journal.read(
+            log_type=request.args.get('type'),
+            action=request.args.get('action'),
+            patient_id=request.args.get('patient_id'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float)
+        )
+        return Response(
+            stream_with_context(json.dumps(entry) + '\n' for entry in entries),
+            mimetype='application/x-ndjson'
+        )
+
+    @app.route('/api/alerts/<int:alert_id>/outcome', methods=['POST'])
+    def post_alert_outcome(alert_id):
+        """Receive a conversation outcome from the voice agent (webhook)"""
+        data = request.get_json(silent=True) or {}
+        action = data.get('action')
+        if not action:
+            return jsonify({"success": False, "message": "Missing 'action'"}), 400
+        if not alert_outcomes.resolve(alert_id, action, data.get('message'), source='webhook'):
+            return jsonify({"success": False, "message": f"Alert #{alert_id} is not awaiting an outcome"}), 404
+        return jsonify({"success": True, "alert_id": alert_id, "action": action})
+
+    @app.route('/api/alerts/outcomes', methods=['GET'])
+    def get_alert_outcome_stats():
+        """Get pending alert count and outcomes delivered per source"""
+        return jsonify(alert_outcomes.get_stats())
+
     @app.route('/api/emergency/test-trigger', methods=['POST'])
     def test_trigger_alert():
         """Manually trigger an alert for testing"""
-        logger.warning("Manual alert trigger requested via API")
-        vitals = get_latest_vitals()
+        patient_id = requested_patient_id()
+        logger.warning(f"Manual alert trigger requested via API for patient {patient_id}")
+        state = vitals_store.get_or_create(patient_id)
+        vitals = dict(state.vitals)
         if vitals.get('status') != 'active':
             vitals = {
                 'pulse_rate': 150,
@@ -62,7 +241,7 @@ def register_routes(app, alert_manager, vitals_monitor):
                 'status': 'test'
             }
             logger.info("Using test vitals data for manual trigger")
-        success = alert_manager.trigger_alert(vitals)
+        success = state.alert_manager.trigger_alert(vitals)
         if success:
             return jsonify({
                 "success": True,
@@ -76,15 +255,112 @@ def register_routes(app, alert_manager, vitals_monitor):
                 "vitals": vitals
             }), 400
 
+    # ===== INGESTION ENDPOINTS =====
+    @app.route('/api/ingest/connections', methods=['GET'])
+    def get_ingest_connections():
+        """List connected SmartSpectra producers"""
+        producers = get_connections()
+        return jsonify({
+            "count": len(producers),
+            "connections": producers
+        })
+
+    @app.route('/api/ingest/stats', methods=['GET'])
+    def get_ingest_stats():
+        """Get ingestion queue depth and processed/dropped/coalesced counters"""
+        if ingest_pipeline is None:
+            return jsonify({"error": "Ingestion pipeline not running"}), 503
+        return jsonify(ingest_pipeline.get_stats())
+
+    @app.route('/api/alerts/executor', methods=['GET'])
+    def get_alert_executor_stats():
+        """Get queued/running alert tasks and rejected/dropped counters"""
+        return jsonify(alert_executor.get_stats())
+
+    @app.route('/api/voice-agent/stats', methods=['GET'])
+    def get_voice_agent_stats():
+        """Get voice agent request latency, error counts and circuit breaker state"""
+        return jsonify(voice_agent_client.get_stats())
+
+    @app.route('/api/emotion/stats', methods=['GET'])
+    def get_emotion_analyzer_stats():
+        """Get webcam capture/FER inference rates, pacing and frame freshness"""
+        return jsonify(get_emotion_stats())
+
+    @app.route('/api/emotion/history', methods=['GET'])
+    def get_emotion_history_window():
+        """Get the smoothed emotion, ?seconds= window aggregates and per-frame scores (?patient_id= for a pooled camera)"""
+        seconds = request.args.get('seconds', default=config.FER_HISTORY_DEFAULT_SECONDS, type=float)
+        patient_id = request.args.get('patient_id')
+        if patient_id is not None and emotion_pool.has_camera(patient_id):
+            return jsonify(emotion_pool.get_history(patient_id, seconds))
+        return jsonify(get_emotion_history(seconds))
+
+    @app.route('/api/emotion/cameras', methods=['GET'])
+    def get_emotion_cameras():
+        """Get FER worker pool status and per-camera analysis rates (main.py --cameras)"""
+        return jsonify(emotion_pool.get_stats())
+
+    # ===== TRACING =====
+    @app.route('/api/trace', methods=['GET'])
+    def get_trace_stats():
+        """Get per-stage latency percentiles of traced vitals samples"""
+        return jsonify(tracer.get_stats())
+
+    @app.route('/api/trace', methods=['POST'])
+    def configure_trace():
+        """Turn tracing on/off, change the sampling rate or clear buffered spans"""
+        data = request.get_json(silent=True) or {}
+        tracer.configure(enabled=data.get('enabled'), sample_every=data.get('sample_every'))
+        if data.get('clear'):
+            tracer.clear()
+        logger.info(f"Tracing {'enabled' if tracer.enabled else 'disabled'} (1 in {tracer.sample_every})")
+        return jsonify(tracer.get_stats())
+
+    @app.route('/api/trace/export', methods=['GET'])
+    def export_trace():
+        """Download buffered spans as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+        return Response(json.dumps(tracer.export_chrome()), mimetype='application/json', headers={
+            'Content-Disposition': f"attachment; filename=pulseai-trace-{int(time.time())}.json"
+        })
+
+    # ===== METRICS =====
+    # Gauges read component state at scrape time (nothing runs on the hot paths)
+    Gauge('ingest_connections', 'Connected SmartSpectra producers', fn=lambda: len(get_connections()))
+    Gauge('patients_monitored', 'Patients in the vitals store', fn=lambda: len(vitals_store))
+    if ingest_pipeline is not None:
+        Gauge('ingest_queue_depth', 'Batches waiting for evaluation',
+              fn=lambda: ingest_pipeline.get_stats()['depth'])
+        Gauge('ingest_dropped_samples', 'Samples dropped by the ingest overflow policy',
+              fn=lambda: ingest_pipeline.get_stats()['dropped'])
+    Gauge('alert_executor_queued', 'Alert tasks waiting for a worker', fn=lambda: alert_executor.get_stats()['queued'])
+    Gauge('alert_executor_running', 'Alert tasks running', fn=lambda: alert_executor.get_stats()['running'])
+    Gauge('alerts_awaiting_outcome', 'Alerts waiting for a conversation outcome',
+          fn=lambda: alert_outcomes.get_stats()['pending'])
+    Gauge('alerts_active', 'Patients with an active alert',
+          fn=lambda: sum(1 for state in vitals_store.states() if state.alert_manager.active_alert is not None))
+    Gauge('voice_agent_circuit_open', '1 while voice agent calls are short-circuited',
+          fn=lambda: 0 if voice_agent_client.breaker.state == 'closed' else 1)
+    Gauge('log_records_dropped', 'Log records dropped because the log queue was full', fn=get_dropped_count)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus text-format metrics"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/health', methods=['GET'])
     def health():
         """Health check endpoint"""
         vitals = get_latest_vitals()
-        active_alert = alert_manager.get_active_alert()
+        alerts_active = sum(
+            1 for state in vitals_store.states()
+            if state.alert_manager.get_active_alert() is not None
+        )
         return jsonify({
             "status": "ok",
             "vitals_status": vitals['status'],
-            "alert_active": active_alert is not None,
+            "alert_active": alerts_active > 0,
+            "patients_monitored": len(vitals_store),
             "monitoring": "active"
         })
 
@@ -137,12 +413,13 @@ def register_routes(app, alert_manager, vitals_monitor):
             )
         webhook_url = data.get('webhook_url', request.url_root.rstrip('/') + '/voice')
         print(f"Initiating call to {to_number}...")
-        call = client.calls.create(
-            to=to_number,
-            from_=TWILIO_PHONE_NUMBER,
-            url=webhook_url,
-            method='POST'
-        )
+        with TWILIO_SECONDS.time():
+            call = client.calls.create(
+                to=to_number,
+                from_=TWILIO_PHONE_NUMBER,
+                url=webhook_url,
+                method='POST'
+            )
         greetings[call.sid] = greeting
         return jsonify({
             "success": True,
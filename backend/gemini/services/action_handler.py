@@ -4,10 +4,14 @@ Handles post-conversation actions (911, family, breathing exercise)
 """
 import time
 from typing import Dict
+from services.action_journal import action_journal
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Conversation outcomes handle_action knows how to act on
+ACTIONS = ("CALL_911", "CALL_FAMILY", "NEITHER", "TIMEOUT")
+
 
 def handle_action(action: str, vitals: Dict):
     """
@@ -29,7 +33,7 @@ def handle_action(action: str, vitals: Dict):
         
         # TODO: Integrate with Twilio or emergency calling API
         # For now, just log
-        _log_action_to_file("911_CALLS", action, vitals, timestamp)
+        _record_action("911_CALLS", action, vitals, timestamp)
     
     elif action == "CALL_FAMILY":
         logger.warning("=" * 60)
@@ -41,7 +45,7 @@ def handle_action(action: str, vitals: Dict):
         
         # TODO: Call emergency contact from patient profile
         # For now, just log
-        _log_action_to_file("FAMILY_CALLS", action, vitals, timestamp)
+        _record_action("FAMILY_CALLS", action, vitals, timestamp)
     
     elif action == "NEITHER":
         logger.info("=" * 60)
@@ -52,7 +56,7 @@ def handle_action(action: str, vitals: Dict):
         logger.info("Continuing to monitor vitals...")
         logger.info("=" * 60)
         
-        _log_action_to_file("BREATHING_EXERCISES", action, vitals, timestamp)
+        _record_action("BREATHING_EXERCISES", action, vitals, timestamp)
     
     elif action == "TIMEOUT":
         logger.error("=" * 60)
@@ -63,39 +67,30 @@ def handle_action(action: str, vitals: Dict):
         logger.error("Consider automatic emergency call")
         logger.error("=" * 60)
         
-        _log_action_to_file("TIMEOUTS", action, vitals, timestamp)
+        _record_action("TIMEOUTS", action, vitals, timestamp)
     
     else:
         logger.error(f"Unknown action: {action}")
 
 
-def _log_action_to_file(log_type: str, action: str, vitals: Dict, timestamp: str):
+def _record_action(log_type: str, action: str, vitals: Dict, timestamp: str):
     """
-    Log action to a file for record keeping
+    Record the action in the action journal (written in the background)
     
     Args:
-        log_type: Type of log file (911_CALLS, FAMILY_CALLS, etc.)
+        log_type: Type of action (911_CALLS, FAMILY_CALLS, etc.)
         action: Action taken
         vitals: Vital signs data
         timestamp: Timestamp string
     """
-    try:
-        import os
-        log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-        
-        log_file = os.path.join(log_dir, f'{log_type}.log')
-        
-        with open(log_file, 'a') as f:
-            f.write(f"\n{'='*60}\n")
-            f.write(f"Timestamp: {timestamp}\n")
-            f.write(f"Action: {action}\n")
-            f.write(f"Pulse: {vitals.get('pulse_rate')} BPM (confidence: {vitals.get('pulse_confidence', 0):.2f})\n")
-            f.write(f"Breathing: {vitals.get('breathing_rate')} BPM (confidence: {vitals.get('breathing_confidence', 0):.2f})\n")
-            f.write(f"Talking: {vitals.get('talking', False)}\n")
-            f.write(f"{'='*60}\n")
-        
-        logger.debug(f"Logged to {log_file}")
-    
-    except Exception as e:
-        logger.error(f"Failed to log action to file: {e}")
+    action_journal.append({
+        'time': timestamp,
+        'type': log_type,
+        'action': action,
+        'patient_id': vitals.get('patient_id'),
+        'pulse_rate': vitals.get('pulse_rate'),
+        'pulse_confidence': vitals.get('pulse_confidence'),
+        'breathing_rate': vitals.get('breathing_rate'),
+        'breathing_confidence': vitals.get('breathing_confidence'),
+        'talking': vitals.get('talking', False),
+    })
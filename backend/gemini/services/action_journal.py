@@ -0,0 +1,254 @@
+"""
+Action Journal Service
+Structured JSON Lines journal of post-conversation actions with a
+background writer, configurable fsync policy and size-based rotation
+"""
+import atexit
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class ActionJournal:
+    """
+    Append-only JSONL journal (one JSON object per line)
+
+    append() only queues the entry; a writer thread writes queued entries
+    in batches and syncs them to disk according to the fsync policy:
+      - always: fsync after every batch
+      - interval: fsync at most every `fsync_interval` seconds
+      - never: leave it to the OS
+    When the file passes `max_bytes` it is renamed with a timestamp and
+    gzip-compressed, keeping the newest `backups` archives.
+    """
+
+    def __init__(self, path: str = config.ACTION_JOURNAL_PATH,
+                 max_bytes: int = config.ACTION_JOURNAL_MAX_BYTES,
+                 backups: int = config.ACTION_JOURNAL_BACKUPS,
+                 fsync_policy: str = config.ACTION_JOURNAL_FSYNC,
+                 fsync_interval: float = config.ACTION_JOURNAL_FSYNC_INTERVAL,
+                 flush_interval: float = config.ACTION_JOURNAL_FLUSH_INTERVAL):
+        """
+        Args:
+            path: Journal file (relative paths are under backend/gemini)
+            max_bytes: Size at which the journal is rotated
+            backups: Compressed archives kept after rotation
+            fsync_policy: "always", "interval" or "never"
+            fsync_interval: Seconds between fsyncs with the "interval" policy
+            flush_interval: Seconds the writer waits to gather a batch
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(__file__), '..', path)
+        self.path = os.path.normpath(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval
+
+        self.queue: deque = deque()
+        self.condition = threading.Condition()
+        self.enqueued = 0
+        self.written = 0
+        self.rotations = 0
+        self.write_errors = 0
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+
+    def start(self):
+        """Start the writer thread"""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.thread = threading.Thread(target=self._writer_loop, name="action-journal", daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Write any queued entries and stop the writer"""
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def append(self, entry: Dict):
+        """
+        Queue an entry for the journal (never blocks on disk)
+
+        Args:
+            entry: JSON-serializable dictionary; "ts" (epoch seconds) is added if missing
+        """
+        if not self.running:
+            self.start()
+        entry.setdefault('ts', time.time())
+        with self.condition:
+            self.queue.append(entry)
+            self.enqueued += 1
+            self.condition.notify()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every entry appended so far is written"""
+        with self.condition:
+            target = self.enqueued
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.written >= target or not self.running, timeout)
+
+    def read(self, log_type: Optional[str] = None, action: Optional[str] = None,
+             patient_id: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Stream journal entries, oldest first, including rotated archives
+
+        Files are read line by line, so memory use does not grow with the
+        journal size.
+
+        Args:
+            log_type: Only entries of this type (911_CALLS, FAMILY_CALLS, ...)
+            action: Only entries with this action
+            patient_id: Only this patient's entries
+            since: Only entries at or after this epoch time
+            until: Only entries before this epoch time
+        """
+        if self.running:
+            self.flush()
+        for path in self._files():
+            opener = gzip.open if path.endswith('.gz') else open
+            try:
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # torn last line after a crash
+                        ts = entry.get('ts', 0)
+                        if since is not None and ts < since:
+                            continue
+                        if until is not None and ts >= until:
+                            continue
+                        if log_type is not None and entry.get('type') != log_type:
+                            continue
+                        if action is not None and entry.get('action') != action:
+                            continue
+                        if patient_id is not None and entry.get('patient_id') != patient_id:
+                            continue
+                        yield entry
+            except FileNotFoundError:
+                continue  # rotated away while listing
+
+    def _files(self) -> List[str]:
+        """Archives (oldest first) followed by the live journal"""
+        base, ext = os.path.splitext(self.path)
+        # Uncompressed archives are left behind when compressing one failed
+        archives = sorted(glob.glob(f"{base}.*{ext}.gz") + glob.glob(f"{base}.*{ext}"))
+        return archives + ([self.path] if os.path.exists(self.path) else [])
+
+    def _writer_loop(self):
+        """Write queued entries in batches until stopped"""
+        f = self._open()
+        last_fsync = time.monotonic()
+        while True:
+            with self.condition:
+                if self.running and not self.queue:
+                    self.condition.wait(self.flush_interval)
+                batch = list(self.queue)
+                self.queue.clear()
+                stopping = not self.running
+
+            if batch:
+                try:
+                    if f is None or f.closed:
+                        f = self._open()
+                    if f is None:
+                        raise OSError(f"cannot open {self.path}")
+                    f.write(''.join(json.dumps(entry, default=str) + '\n' for entry in batch))
+                    f.flush()
+                    now = time.monotonic()
+                    if self.fsync_policy == 'always' or (
+                            self.fsync_policy == 'interval' and now - last_fsync >= self.fsync_interval):
+                        os.fsync(f.fileno())
+                        last_fsync = now
+                    if f.tell() >= self.max_bytes:
+                        f = self._rotate(f)
+                except (OSError, ValueError) as e:
+                    self.write_errors += 1
+                    logger.error(f"Failed to write {len(batch)} entries to action journal: {e}")
+
+            with self.condition:
+                self.written += len(batch)
+                self.condition.notify_all()
+            if stopping:
+                if f is not None and not f.closed:
+                    try:
+                        if self.fsync_policy != 'never':
+                            os.fsync(f.fileno())
+                    except OSError as e:
+                        logger.error(f"Failed to sync action journal: {e}")
+                    f.close()
+                return
+
+    def _open(self):
+        """Open the live journal for appending (None if it cannot be opened; retried on the next batch)"""
+        try:
+            return open(self.path, 'a', encoding='utf-8')
+        except OSError as e:
+            logger.error(f"Failed to open action journal {self.path}: {e}")
+            return None
+
+    def _rotate(self, f):
+        """Archive the full journal as a gzip file and start a new one (always returns a reopened journal)"""
+        try:
+            if self.fsync_policy != 'never':
+                os.fsync(f.fileno())
+            f.close()
+            base, ext = os.path.splitext(self.path)
+            archive = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}-{self.rotations:04d}{ext}"
+            os.replace(self.path, archive)
+            self.rotations += 1  # the archive name is taken even if compressing it fails below
+            with open(archive, 'rb') as src, gzip.open(archive + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(archive)
+            logger.info(f"Action journal rotated to {os.path.basename(archive)}.gz")
+
+            for old in sorted(glob.glob(f"{base}.*{ext}.gz"))[:-self.backups or None]:
+                os.remove(old)
+        except OSError as e:
+            self.write_errors += 1
+            logger.error(f"Action journal rotation failed: {e}")
+        finally:
+            f.close()
+        return self._open()
+
+    def get_stats(self) -> Dict:
+        """Get queued/written counts and rotation info"""
+        with self.condition:
+            return {
+                'path': self.path,
+                'queued': len(self.queue),
+                'written': self.written,
+                'rotations': self.rotations,
+                'write_errors': self.write_errors,
+                'fsync_policy': self.fsync_policy,
+            }
+
+
+# Shared journal for every patient's actions
+action_journal = ActionJournal()
@@ -5,25 +5,52 @@ Manages alert lifecycle, prevents duplicates, and triggers ElevenLabs conversati
 import time
 import threading
 from typing import Optional, Dict
+from services.action_handler import ACTIONS, handle_action
+from services.alert_outcomes import alert_outcomes
+from services.alert_store import alert_store
+from services.task_executor import alert_executor
+from services.voice_agent_client import voice_agent_client
 from utils.logger import setup_logger
+from utils.metrics import Counter
 import config
-import requests
 
 logger = setup_logger(__name__)
 
+ALERTS_TRIGGERED = Counter('alerts_triggered_total', 'Alerts triggered (conversation dispatched)')
+ALERTS_BLOCKED = Counter('alerts_blocked_total', 'Alert triggers that were blocked', ['reason'])
+BLOCKED_ACTIVE = ALERTS_BLOCKED.labels('active')
+BLOCKED_COOLDOWN = ALERTS_BLOCKED.labels('cooldown')
+BLOCKED_EXECUTOR = ALERTS_BLOCKED.labels('executor_full')
+
+# Alert ids are shared across all patients' AlertManagers
+_alert_id_lock = threading.Lock()
+_last_alert_id = 0
+
+
+def _next_alert_id() -> int:
+    """Get a unique alert id (epoch seconds, bumped past ids already taken here or in history)"""
+    global _last_alert_id
+    with _alert_id_lock:
+        _last_alert_id = max(int(time.time()), _last_alert_id + 1, alert_store.last_id + 1)
+        return _last_alert_id
+
 
 class AlertManager:
     """
     Manages emergency alerts and prevents duplicate triggers
     """
     
-    def __init__(self):
+    def __init__(self, patient_id: str = config.DEFAULT_PATIENT_ID):
+        """
+        Args:
+            patient_id: Patient whose alerts this manager handles
+        """
+        self.patient_id = patient_id
         self.active_alert: Optional[Dict] = None
         self.last_alert_time: Optional[float] = None
-        self.alert_history = []
         self.lock = threading.Lock()
         
-        logger.info("AlertManager initialized")
+        logger.info(f"AlertManager initialized for patient {patient_id}")
         logger.info(f"Cooldown period: {config.ALERT_COOLDOWN_PERIOD}s")
     
     def trigger_alert(self, vitals_data: Dict) -> bool:
@@ -40,6 +67,7 @@ class AlertManager:
             # Check if alert already active
             if self.active_alert:
                 logger.warning("Alert already active - ignoring trigger")
+                BLOCKED_ACTIVE.inc()
                 return False
             
             # Check cooldown period
@@ -48,103 +76,144 @@ class AlertManager:
                 if time_since_last < config.ALERT_COOLDOWN_PERIOD:
                     remaining = config.ALERT_COOLDOWN_PERIOD - time_since_last
                     logger.warning(f"Alert in cooldown - {remaining:.0f}s remaining")
+                    BLOCKED_COOLDOWN.inc()
                     return False
             
             # Create alert
             alert = {
-                'id': int(time.time()),
+                'id': _next_alert_id(),
+                'patient_id': self.patient_id,
                 'vitals': vitals_data.copy(),
                 'triggered_at': time.time(),
                 'status': 'active',
                 'patient_response': None
             }
             
+            previous_alert_time = self.last_alert_time
             self.active_alert = alert
             self.last_alert_time = time.time()
             
-            logger.error(f"🚨 ALERT #{alert['id']} TRIGGERED")
+            logger.error(f"🚨 ALERT #{alert['id']} TRIGGERED for patient {self.patient_id}")
             logger.error(f"   Pulse: {vitals_data.get('pulse_rate')} BPM")
             logger.error(f"   Breathing: {vitals_data.get('breathing_rate')} BPM")
             
             # Start ElevenLabs conversation in background
-            threading.Thread(
-                target=self._start_conversation,
-                args=(alert,),
-                daemon=True
-            ).start()
+            if not alert_executor.submit(self.patient_id, self._start_conversation, alert):
+                logger.error(f"Could not dispatch conversation for alert #{alert['id']} - alert executor is full")
+                alert['status'] = 'error'
+                alert['error'] = 'alert executor full'
+                alert_store.record(alert)
+                self.active_alert = None
+                self.last_alert_time = previous_alert_time  # no cooldown, let the next trigger retry
+                BLOCKED_EXECUTOR.inc()
+                return False
             
+            ALERTS_TRIGGERED.inc()
             return True
         
-    def trigger_external_conversation(self, vitals):
-        url = "http://localhost:7000/api/trigger-alert"
-        
-        payload = {
-            "patient_id": "12345",    # adjust if dynamic
-            "vitals": {
-                "heart_rate": vitals.get("pulse_rate"),
-                "breathing_rate": vitals.get("breathing_rate"),
-                "pulse_confidence": vitals.get("pulse_confidence"),
-                "breathing_confidence": vitals.get("breathing_confidence")
-            }
-        }
+    def trigger_external_conversation(self, vitals, alert_id: Optional[int] = None):
+        """
+        Ask the voice agent to start a conversation (returns once the session has started)
 
-        try:
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Error contacting emergency conversation server: {e}")
-            return {"error": str(e)}
+        Args:
+            vitals: Vitals that triggered the alert
+            alert_id: Alert id echoed back with the outcome; the agent is also
+                given this alert's outcome webhook URL
+        """
+        callback_url = None
+        if alert_id is not None:
+            callback_url = f"{config.ALERT_OUTCOME_CALLBACK_URL}/api/alerts/{alert_id}/outcome"
+        return voice_agent_client.trigger_alert(self.patient_id, vitals, alert_id, callback_url)
     
     def _start_conversation(self, alert: Dict):
         """
-        Start ElevenLabs conversation (runs in separate thread)
+        Start ElevenLabs conversation (runs on the alert executor)
+
+        Only starts the session; the patient's decision arrives later through
+        the alert outcome tracker, which calls complete_alert.
         """
         try:
             logger.info(f"Starting ElevenLabs conversation for alert #{alert['id']}")
+            # Track the alert first so a fast webhook outcome is not lost
+            alert_outcomes.register(self, alert['id'])
+            response = self.trigger_external_conversation(alert['vitals'], alert['id'])
+            if response.get('error'):
+                raise RuntimeError(response['error'])
             
-            # Start conversation and get patient response
-            response = self.trigger_external_conversation(alert['vitals'])
-            
-            logger.info(f"Patient response: {response}")
-            
-            # Update alert with response
             with self.lock:
-                if self.active_alert and self.active_alert['id'] == alert['id']:
-                    self.active_alert['patient_response'] = response
-                    self.active_alert['status'] = 'resolved'
-                    
-                    # Move to history
-                    self.alert_history.append(self.active_alert.copy())
-                    self.active_alert = None
+                if not (self.active_alert and self.active_alert['id'] == alert['id']):
+                    return  # already resolved (early webhook) or cleared
+                self.active_alert['status'] = 'awaiting_response'
+                self.active_alert['session_started_at'] = time.time()
             
-            # Handle the action
-            from services.action_handler import handle_action
-            handle_action(response, alert['vitals'])
+            alert_outcomes.session_started(alert['id'])
+            logger.info(f"Conversation started for alert #{alert['id']} - awaiting patient response")
             
         except Exception as e:
             logger.error(f"Error in conversation: {e}", exc_info=True)
+            alert_outcomes.cancel(alert['id'])
             with self.lock:
-                if self.active_alert:
+                if self.active_alert and self.active_alert['id'] == alert['id']:
                     self.active_alert['status'] = 'error'
                     self.active_alert['error'] = str(e)
-                    self.alert_history.append(self.active_alert.copy())
+                    alert_store.record(self.active_alert)
                     self.active_alert = None
     
+    def complete_alert(self, alert_id: int, action: str, message: Optional[str] = None,
+                       source: str = 'webhook') -> bool:
+        """
+        Record the conversation outcome and run the follow-up action
+        
+        Args:
+            alert_id: Alert the outcome belongs to
+            action: Patient decision ("CALL_911", "CALL_FAMILY", "NEITHER", "TIMEOUT"),
+                or "ERROR"/"STOPPED" if the session failed or was stopped
+            message: Voice agent's reply text, if any
+            source: How the outcome arrived ("webhook", "poll" or "timeout")
+        
+        Returns:
+            True if the alert was active and is now resolved, False otherwise
+        """
+        with self.lock:
+            if not (self.active_alert and self.active_alert['id'] == alert_id):
+                logger.warning(f"Outcome for alert #{alert_id} ignored - alert is no longer active")
+                return False
+            alert = self.active_alert
+            alert['patient_response'] = action
+            alert['response_message'] = message
+            alert['outcome_source'] = source
+            alert['resolved_at'] = time.time()
+            if action in ACTIONS:
+                alert['status'] = 'resolved'
+            else:
+                alert['status'] = 'error'
+                alert['error'] = message or action
+            
+            # Move to history
+            alert_store.record(alert)
+            self.active_alert = None
+        
+        logger.info(f"Patient response for alert #{alert_id}: {action}")
+        
+        # Handle the action off the caller's thread (webhook request / outcome poller)
+        if action in ACTIONS:
+            alert_executor.submit(self.patient_id, handle_action, action, alert['vitals'])
+        return True
+    
     def get_active_alert(self) -> Optional[Dict]:
         """Get currently active alert"""
         with self.lock:
             return self.active_alert.copy() if self.active_alert else None
     
     def get_alert_history(self, limit: int = 10) -> list:
-        """Get recent alert history"""
-        with self.lock:
-            return self.alert_history[-limit:]
+        """Get this patient's recent alert history, oldest first"""
+        return alert_store.recent(self.patient_id, limit)
     
     def clear_active_alert(self):
         """Manually clear active alert (for testing)"""
         with self.lock:
             if self.active_alert:
                 logger.info(f"Manually clearing alert #{self.active_alert['id']}")
-                self.alert_history.append(self.active_alert.copy())
+                alert_outcomes.cancel(self.active_alert['id'])
+                alert_store.record(self.active_alert)
                 self.active_alert = None
@@ -0,0 +1,158 @@
+"""
+Alert Outcome Tracker
+Follows alerts whose voice conversation is in progress and delivers the
+patient's decision back to the owning AlertManager
+"""
+import threading
+import time
+from typing import Dict, Optional
+from services.voice_agent_client import voice_agent_client
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+
+class _PendingAlert:
+    """An alert waiting for its conversation outcome"""
+
+    __slots__ = ('alert_manager', 'alert_id', 'started_at', 'deadline', 'session_started')
+
+    def __init__(self, alert_manager, alert_id: int, timeout: float):
+        self.alert_manager = alert_manager
+        self.alert_id = alert_id
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout
+        self.session_started = False  # polled only once the voice agent accepted the session
+
+
+class AlertOutcomeTracker:
+    """
+    Delivers voice conversation outcomes without parking a thread per alert
+
+    Outcomes arrive three ways, whichever comes first:
+      - webhook: the voice agent POSTs to /api/alerts/<id>/outcome
+      - poll: one shared thread reads the agent's /api/status while any
+        alert is pending (fallback for agents that cannot call back)
+      - timeout: alerts still pending after `timeout` seconds resolve as TIMEOUT
+    """
+
+    def __init__(self, poll_interval: float = config.ALERT_OUTCOME_POLL_INTERVAL,
+                 timeout: float = config.ALERT_OUTCOME_TIMEOUT):
+        """
+        Args:
+            poll_interval: Seconds between /api/status polls while alerts are pending
+            timeout: Seconds before a pending alert resolves as TIMEOUT
+        """
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.pending: Dict[int, _PendingAlert] = {}
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.resolved = {'webhook': 0, 'poll': 0, 'timeout': 0}
+        self.total_wait = 0.0
+
+    def register(self, alert_manager, alert_id: int):
+        """
+        Start tracking an alert before its conversation is started
+
+        Registering first means a webhook that arrives while the trigger
+        request is still returning finds the alert instead of being lost.
+        Call session_started() once the voice agent accepted the session
+        (or cancel() if it failed).
+
+        Args:
+            alert_manager: AlertManager that owns the alert
+            alert_id: Alert id (sent to the voice agent with the trigger)
+        """
+        with self.condition:
+            self.pending[alert_id] = _PendingAlert(alert_manager, alert_id, self.timeout)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._poll_loop, name="alert-outcomes", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def session_started(self, alert_id: int):
+        """Include a registered alert in /api/status polling (its session is now running)"""
+        with self.condition:
+            pending = self.pending.get(alert_id)
+            if pending is not None:
+                pending.session_started = True
+                self.condition.notify()
+
+    def cancel(self, alert_id: int):
+        """Stop tracking an alert (e.g. it was cleared manually)"""
+        with self.condition:
+            self.pending.pop(alert_id, None)
+
+    def resolve(self, alert_id: int, action: str, message: Optional[str] = None,
+                source: str = 'webhook') -> bool:
+        """
+        Deliver an alert's outcome to its AlertManager
+
+        Args:
+            alert_id: Alert id
+            action: Patient decision, e.g. "CALL_911", "CALL_FAMILY", "NEITHER", "TIMEOUT"
+            message: Voice agent's reply text, if any
+            source: "webhook", "poll" or "timeout"
+
+        Returns:
+            True if the alert was pending, False if unknown or already resolved
+        """
+        with self.condition:
+            pending = self.pending.pop(alert_id, None)
+            if pending is None:
+                return False
+            self.resolved[source] += 1
+            self.total_wait += time.monotonic() - pending.started_at
+
+        logger.info(f"Outcome for alert #{alert_id} via {source}: {action}")
+        return pending.alert_manager.complete_alert(alert_id, action, message, source)
+
+    def _poll_loop(self):
+        """Expire overdue alerts and poll the voice agent while any are pending"""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                next_deadline = min(p.deadline for p in self.pending.values())
+                self.condition.wait(max(0.0, min(self.poll_interval, next_deadline - time.monotonic())))
+                now = time.monotonic()
+                expired = [p.alert_id for p in self.pending.values() if p.deadline <= now]
+                waiting = sorted(self.pending.values(), key=lambda p: p.started_at)
+
+            for alert_id in expired:
+                logger.warning(f"⏱️  No conversation outcome for alert #{alert_id} after {self.timeout:.0f}s")
+                self.resolve(alert_id, "TIMEOUT", source='timeout')
+
+            # Alerts still starting their session are not polled: the status would be the previous session's
+            waiting = [p for p in waiting if p.session_started and p.alert_id not in expired]
+            if waiting:
+                self._poll_status(waiting)
+
+    def _poll_status(self, waiting):
+        """Resolve the alert the voice agent reports a finished session for"""
+        status = voice_agent_client.get_status()
+        result = status.get('result')
+        if status.get('error') or status.get('session_active') or not isinstance(result, dict):
+            return
+        action = result.get('action')
+        if not action:
+            return
+        # Agents that do not echo the alert id run one session at a time: the oldest pending alert
+        alert_id = result.get('alert_id') or waiting[0].alert_id
+        self.resolve(alert_id, action, result.get('message'), source='poll')
+
+    def get_stats(self) -> Dict:
+        """Get pending count and outcomes delivered per source"""
+        with self.condition:
+            resolved = sum(self.resolved.values())
+            return {
+                'pending': len(self.pending),
+                'resolved': dict(self.resolved),
+                'avg_outcome_wait_s': round(self.total_wait / resolved, 3) if resolved else 0.0,
+            }
+
+
+# Shared tracker (one poll thread for every patient's alerts)
+alert_outcomes = AlertOutcomeTracker()
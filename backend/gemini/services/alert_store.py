@@ -0,0 +1,303 @@
+"""
+Alert Store Service
+Persistent alert history (SQLite, WAL mode) with a batched background
+writer and a bounded cache of recent alerts
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    triggered_at REAL NOT NULL,
+    resolved_at REAL,
+    status TEXT NOT NULL,
+    patient_response TEXT,
+    pulse_rate REAL,
+    breathing_rate REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_patient_time ON alerts (patient_id, triggered_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts (triggered_at);
+CREATE INDEX IF NOT EXISTS idx_alerts_status_time ON alerts (status, triggered_at);
+"""
+
+INSERT = """
+INSERT INTO alerts
+    (id, patient_id, triggered_at, resolved_at, status, patient_response, pulse_rate, breathing_rate, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _row(alert: Dict) -> tuple:
+    vitals = alert.get('vitals') or {}
+    return (
+        alert['id'],
+        alert.get('patient_id', config.DEFAULT_PATIENT_ID),
+        alert.get('triggered_at', 0.0),
+        alert.get('resolved_at'),
+        alert.get('status', 'unknown'),
+        alert.get('patient_response'),
+        vitals.get('pulse_rate'),
+        vitals.get('breathing_rate'),
+        json.dumps(alert, default=str),
+    )
+
+
+class AlertStore:
+    """
+    Append-only alert history shared by every patient's AlertManager
+
+    record() only appends to an in-memory queue and the recent-alerts cache,
+    so it is safe to call while holding AlertManager's lock. A writer thread
+    inserts queued alerts in batches, one transaction per batch. Queries
+    first wait for queued alerts to be written so results are complete.
+    """
+
+    def __init__(self, db_path: str = config.ALERT_DB_PATH,
+                 cache_size: int = config.ALERT_CACHE_SIZE,
+                 batch_size: int = config.ALERT_WRITE_BATCH_SIZE,
+                 flush_interval: float = config.ALERT_WRITE_INTERVAL):
+        """
+        Args:
+            db_path: SQLite file (relative paths are under backend/gemini)
+            cache_size: Most recent alerts kept in memory (all patients)
+            batch_size: Most alerts inserted per transaction
+            flush_interval: Seconds the writer waits to gather a batch
+        """
+        if not os.path.isabs(db_path):
+            db_path = os.path.join(os.path.dirname(__file__), '..', db_path)
+        self.db_path = os.path.normpath(db_path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+
+        self.cache = deque(maxlen=max(1, cache_size))
+        self.queue: deque = deque()
+        self.condition = threading.Condition()
+        self.enqueued = 0
+        self.written = 0
+        self.write_errors = 0
+        self.dropped = 0
+        self.last_id = 0  # highest alert id in history (seeds new alert ids after a restart)
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        self.local = threading.local()
+
+    def start(self):
+        """Create the database and start the writer thread"""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True  # claimed now so concurrent start() calls return; reset below on failure
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            connection = self._connect()
+            connection.executescript(SCHEMA)
+            connection.commit()
+
+            # Warm the cache with the most recent alerts from earlier runs (alerts
+            # recorded before start are still queued and stay the newest entries)
+            rows = connection.execute("SELECT data FROM alerts ORDER BY id DESC LIMIT ?",
+                                      (self.cache.maxlen,)).fetchall()
+            max_id = connection.execute("SELECT MAX(id) FROM alerts").fetchone()[0] or 0
+        except (OSError, sqlite3.Error):
+            with self.condition:
+                self.running = False  # not started: a later start() retries
+            raise
+        with self.condition:
+            self.last_id = max(self.last_id, max_id)
+            self.cache.clear()
+            self.cache.extendleft(json.loads(row[0]) for row in rows)
+            self.cache.extend(self.queue)
+
+        self.thread = threading.Thread(target=self._writer_loop, args=(connection,),
+                                       name="alert-store-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+        logger.info(f"AlertStore ready - {self.db_path} (WAL), cache {self.cache.maxlen} alerts")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Write any queued alerts and stop the writer"""
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def record(self, alert: Dict):
+        """
+        Queue a finished alert for writing (never blocks on disk)
+
+        Until the owner (main.py) starts the store, alerts are only cached
+        and queued; start() writes them. While stopped the queue keeps at
+        most cache_size alerts.
+
+        Args:
+            alert: Alert dictionary (id, patient_id, triggered_at, status, vitals, ...)
+        """
+        alert = alert.copy()
+        with self.condition:
+            self.cache.append(alert)
+            if not self.running and len(self.queue) >= self.cache.maxlen:
+                self.queue.popleft()
+                self.dropped += 1
+                self.written += 1  # settled: flush() must not wait for an alert that will never be written
+            self.queue.append(alert)
+            self.enqueued += 1
+            self.last_id = max(self.last_id, alert['id'])
+            if len(self.queue) >= self.batch_size:
+                self.condition.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every alert recorded so far is written"""
+        with self.condition:
+            target = self.enqueued
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.written >= target or not self.running, timeout)
+
+    def recent(self, patient_id: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """
+        Get the most recent alerts, oldest first (served from cache when it holds enough)
+
+        Args:
+            patient_id: Only this patient's alerts (all patients if None)
+            limit: Most alerts to return
+        """
+        if limit <= 0:
+            return []
+        if not self.running:
+            self.start()
+        with self.condition:
+            cached = [a for a in self.cache if patient_id is None or a.get('patient_id') == patient_id]
+            complete = len(self.cache) < self.cache.maxlen  # nothing evicted yet - cache holds everything
+        if len(cached) >= limit or complete:
+            return [a.copy() for a in cached[-limit:]]
+        return list(reversed(self.query(patient_id=patient_id, limit=limit)['alerts']))
+
+    def query(self, patient_id: Optional[str] = None, status: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              before: Optional[int] = None, limit: int = 50) -> Dict:
+        """
+        Page through alert history, newest first
+
+        Args:
+            patient_id: Only this patient's alerts
+            status: Only alerts with this final status (resolved, error, ...)
+            since: Only alerts triggered at or after this epoch time
+            until: Only alerts triggered before this epoch time
+            before: Cursor - only alerts with a smaller id (use the previous page's next_before)
+            limit: Page size
+
+        Returns:
+            {"alerts": [...], "next_before": id of the last alert, or None on the last page}
+        """
+        if not self.running:
+            self.start()
+        self.flush()
+
+        clauses, params = [], []
+        if patient_id is not None:
+            clauses.append("patient_id = ?")
+            params.append(patient_id)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("triggered_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("triggered_at < ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit + 1)
+
+        # Alert ids increase with trigger time, so ordering by id pages by time
+        rows = self._reader().execute(
+            f"SELECT data FROM alerts {where} ORDER BY id DESC LIMIT ?", params
+        ).fetchall()
+        alerts = [json.loads(row[0]) for row in rows[:limit]]
+        next_before = alerts[-1]['id'] if len(rows) > limit and alerts else None
+        return {'alerts': alerts, 'next_before': next_before}
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        """Per-thread read connection (WAL readers never block the writer)"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self._connect()
+        return connection
+
+    def _writer_loop(self, connection: sqlite3.Connection):
+        """Insert queued alerts in batches until stopped"""
+        while True:
+            with self.condition:
+                if self.running and len(self.queue) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+                batch = [self.queue.popleft() for _ in range(min(len(self.queue), self.batch_size))]
+                stopping = not self.running and not self.queue
+
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(INSERT, [_row(alert) for alert in batch])
+                except sqlite3.IntegrityError:
+                    self._insert_each(connection, batch)
+                except sqlite3.Error as e:
+                    self.write_errors += 1
+                    logger.error(f"Failed to write {len(batch)} alerts to history: {e}")
+
+            with self.condition:
+                self.written += len(batch)
+                self.condition.notify_all()
+            if stopping:
+                connection.close()
+                return
+
+    def _insert_each(self, connection: sqlite3.Connection, batch: List[Dict]):
+        """Insert a batch row by row so one duplicate id does not lose the others"""
+        for alert in batch:
+            try:
+                with connection:
+                    connection.execute(INSERT, _row(alert))
+            except sqlite3.IntegrityError as e:
+                self.write_errors += 1
+                logger.error(f"Alert #{alert['id']} not written - id already in history ({e})")
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                logger.error(f"Failed to write alert #{alert['id']} to history: {e}")
+
+    def get_stats(self) -> Dict:
+        """Get queued/written counts and cache fill"""
+        with self.condition:
+            return {
+                'db_path': self.db_path,
+                'queued': len(self.queue),
+                'written': self.written,
+                'write_errors': self.write_errors,
+                'dropped': self.dropped,
+                'cached': len(self.cache),
+            }
+
+
+# Shared store (one writer thread and database for every patient)
+alert_store = AlertStore()
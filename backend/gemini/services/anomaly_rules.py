@@ -0,0 +1,469 @@
+"""
+Anomaly Rules
+Configurable detectors that decide whether a patient's vitals are abnormal,
+compiled once from config.ANOMALY_RULES
+
+Every rule keeps a small fixed-size state per patient and is evaluated
+incrementally: check() updates it with one sample in O(1), check_batch()
+updates it with a whole batch using NumPy and gives the same results as
+calling check() on each sample in order.
+
+Rule types:
+  - range: value outside [min, max]
+  - adaptive_range: value outside the patient's learned range (see
+    services/baselines.py), falling back to [min, max] until it is ready
+  - rate_of_change: |Δvalue| / Δt above max_per_second
+  - zscore: deviation from the patient's own EWMA mean, in EWMA standard deviations
+  - trend: least-squares slope over the last `window` samples above max_slope (per second)
+
+Any rule can add confidence-weighted hysteresis: its hits (weighted by the
+field's confidence) are smoothed into a score, and the rule turns on when
+the score reaches `enter` and off when it falls to `exit`.
+"""
+import math
+from collections import deque
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+# Confidence that goes with each field rules can watch
+FIELD_CONFIDENCE = {
+    'pulse_rate': 'pulse_confidence',
+    'breathing_rate': 'breathing_confidence',
+}
+
+# Longest run the closed-form EWMA handles at once (keeps decay**-k well inside float range)
+_EWMA_BLOCK = 32
+
+
+def _ewma(values: np.ndarray, alpha: float, initial: float) -> np.ndarray:
+    """
+    Vectorized recurrence out[k] = (1 - alpha) * out[k-1] + alpha * values[k], starting from `initial`
+
+    Uses out[k] = d^k * (initial + alpha * sum(values[j] / d^j, j <= k)) in short blocks.
+    """
+    decay = 1.0 - alpha
+    out = np.empty(len(values))
+    if decay <= 0.0:
+        out[:] = alpha * values
+        return out
+    for start in range(0, len(values), _EWMA_BLOCK):
+        block = values[start:start + _EWMA_BLOCK]
+        powers = decay ** np.arange(1, len(block) + 1)
+        out[start:start + len(block)] = powers * (initial + alpha * np.cumsum(block / powers))
+        initial = out[start + len(block) - 1]
+    return out
+
+
+def _latch(enter: np.ndarray, leave: np.ndarray, initial: bool) -> np.ndarray:
+    """Vectorized on/off state: turns on where `enter`, off where `leave`, otherwise keeps the last state"""
+    indices = np.arange(len(enter))
+    events = np.where(enter | leave, indices, -1)
+    last = np.maximum.accumulate(events)
+    return np.where(last >= 0, enter[np.maximum(last, 0)], initial)
+
+
+class _State:
+    """Per-patient state of one rule (detector fields are added by each rule)"""
+
+    def __init__(self, **fields):
+        self.score = 0.0  # hysteresis score
+        self.on = False
+        self.__dict__.update(fields)
+
+
+class Rule:
+    """
+    Base class for anomaly rules
+
+    Subclasses implement _hit() (one sample) and _hits() (a batch) and may
+    override new_state(). Hysteresis and on/off state are handled here.
+    """
+
+    type = None
+
+    def __init__(self, spec: Dict):
+        """
+        Args:
+            spec: Rule declaration from config.ANOMALY_RULES
+        """
+        self.name = spec.get('name') or f"{spec.get('field')}_{self.type}"
+        self.field = spec.get('field')
+        if self.field not in FIELD_CONFIDENCE:
+            raise ValueError(f"Rule {self.name}: unknown field {self.field!r}")
+        self.confidence_field = FIELD_CONFIDENCE[self.field]
+
+        hysteresis = spec.get('hysteresis')
+        self.hysteresis = hysteresis is not None
+        if hysteresis is not None:
+            self.hysteresis_alpha = float(hysteresis.get('alpha', 0.3))
+            self.enter = float(hysteresis.get('enter', 0.5))
+            self.exit = float(hysteresis.get('exit', 0.2))
+            if not 0.0 < self.hysteresis_alpha <= 1.0 or self.exit >= self.enter:
+                raise ValueError(f"Rule {self.name}: hysteresis needs 0 < alpha <= 1 and exit < enter")
+
+    def new_state(self) -> _State:
+        return _State()
+
+    def check(self, state: _State, value: float, t: float, confidence: float) -> bool:
+        """Update the rule with one sample; returns whether the rule is on"""
+        hit = self._hit(state, value, t)
+        if not self.hysteresis:
+            state.on = hit
+            return hit
+        decay = 1.0 - self.hysteresis_alpha
+        state.score = decay * state.score + self.hysteresis_alpha * (confidence if hit else 0.0)
+        if state.score >= self.enter:
+            state.on = True
+        elif state.score <= self.exit:
+            state.on = False
+        return state.on
+
+    def check_batch(self, state: _State, values: np.ndarray, times: np.ndarray,
+                    confidence: np.ndarray) -> np.ndarray:
+        """Update the rule with a batch (oldest first); returns whether the rule is on after each sample"""
+        hits = self._hits(state, values, times)
+        if not self.hysteresis:
+            state.on = bool(hits[-1])
+            return hits
+        scores = _ewma(np.where(hits, confidence, 0.0), self.hysteresis_alpha, state.score)
+        on = _latch(scores >= self.enter, scores <= self.exit, state.on)
+        state.score = float(scores[-1])
+        state.on = bool(on[-1])
+        return on
+
+    def _hit(self, state: _State, value: float, t: float) -> bool:
+        raise NotImplementedError
+
+    def _hits(self, state: _State, values: np.ndarray, times: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class RangeRule(Rule):
+    """Value outside [min, max] (either bound may be omitted)"""
+
+    type = 'range'
+
+    def __init__(self, spec: Dict):
+        super().__init__(spec)
+        self.min = spec.get('min', -math.inf)
+        self.max = spec.get('max', math.inf)
+
+    def _hit(self, state, value, t):
+        return value < self.min or value > self.max
+
+    def _hits(self, state, values, times):
+        return (values < self.min) | (values > self.max)
+
+
+class AdaptiveRangeRule(RangeRule):
+    """Value outside the patient's learned range (set through AnomalyEngine.set_limits)"""
+
+    type = 'adaptive_range'
+
+    def new_state(self):
+        return _State(low=self.min, high=self.max)
+
+    def _hit(self, state, value, t):
+        return value < state.low or value > state.high
+
+    def _hits(self, state, values, times):
+        return (values < state.low) | (values > state.high)
+
+
+class RateOfChangeRule(Rule):
+    """Change between consecutive samples faster than max_per_second"""
+
+    type = 'rate_of_change'
+
+    def __init__(self, spec: Dict):
+        super().__init__(spec)
+        self.max_per_second = float(spec['max_per_second'])
+        # Samples from one batch can share an arrival time; treat them as this far apart
+        self.min_interval = float(spec.get('min_interval', 0.1))
+
+    def new_state(self):
+        return _State(last_value=None, last_time=0.0)
+
+    def _hit(self, state, value, t):
+        last_value, last_time = state.last_value, state.last_time
+        state.last_value, state.last_time = value, t
+        if last_value is None:
+            return False
+        return abs(value - last_value) / max(t - last_time, self.min_interval) > self.max_per_second
+
+    def _hits(self, state, values, times):
+        previous = np.empty(len(values))
+        previous_times = np.empty(len(values))
+        previous[1:], previous_times[1:] = values[:-1], times[:-1]
+        previous[0] = values[0] if state.last_value is None else state.last_value
+        previous_times[0] = state.last_time
+        state.last_value, state.last_time = float(values[-1]), float(times[-1])
+        rates = np.abs(values - previous) / np.maximum(times - previous_times, self.min_interval)
+        return rates > self.max_per_second
+
+
+class ZScoreRule(Rule):
+    """
+    Deviation from the patient's own EWMA baseline, in EWMA standard deviations
+
+    Each sample is scored against the mean/variance of the samples before
+    it, then folded into them; the first `warmup` samples only learn.
+    """
+
+    type = 'zscore'
+
+    def __init__(self, spec: Dict):
+        super().__init__(spec)
+        self.alpha = float(spec.get('alpha', 0.02))
+        self.threshold = float(spec.get('threshold', 4.0))
+        self.warmup = int(spec.get('warmup', 60))
+        self.min_std = float(spec.get('min_std', 1.0))  # floor so a flat baseline doesn't flag tiny changes
+        if not 0.0 < self.alpha < 1.0:
+            raise ValueError(f"Rule {self.name}: alpha must be between 0 and 1")
+
+    def new_state(self):
+        return _State(count=0, mean=0.0, var=0.0)
+
+    def _hit(self, state, value, t):
+        if state.count == 0:
+            state.count, state.mean, state.var = 1, float(value), 0.0
+            return False
+        diff = value - state.mean
+        hit = state.count >= self.warmup and abs(diff) > self.threshold * max(math.sqrt(state.var), self.min_std)
+        state.mean += self.alpha * diff
+        state.var = (1.0 - self.alpha) * (state.var + self.alpha * diff * diff)
+        state.count += 1
+        return hit
+
+    def _hits(self, state, values, times):
+        hits = np.zeros(len(values), dtype=bool)
+        if state.count == 0:
+            state.count, state.mean, state.var = 1, float(values[0]), 0.0
+            values = values[1:]
+            if not len(values):
+                return hits
+        decay = 1.0 - self.alpha
+        means = _ewma(values, self.alpha, state.mean)
+        previous_means = np.concatenate(([state.mean], means[:-1]))
+        diff = values - previous_means
+        variances = _ewma(decay * diff * diff, self.alpha, state.var)
+        previous_vars = np.concatenate(([state.var], variances[:-1]))
+        counts = state.count + np.arange(len(values))
+        std = np.maximum(np.sqrt(np.maximum(previous_vars, 0.0)), self.min_std)
+        hits[len(hits) - len(values):] = (counts >= self.warmup) & (np.abs(diff) > self.threshold * std)
+        state.count += len(values)
+        state.mean, state.var = float(means[-1]), float(variances[-1])
+        return hits
+
+
+class TrendRule(Rule):
+    """
+    Least-squares slope (units per second) over the last `window` samples
+
+    Running sums are kept relative to a recent time origin and rebuilt from
+    the window every `window` samples, so each update is O(1) amortized.
+    """
+
+    type = 'trend'
+
+    def __init__(self, spec: Dict):
+        super().__init__(spec)
+        self.window = max(2, int(spec.get('window', 30)))
+        self.max_slope = float(spec['max_slope'])
+        self.direction = spec.get('direction', 'both')
+        if self.direction not in ('up', 'down', 'both'):
+            raise ValueError(f"Rule {self.name}: direction must be 'up', 'down' or 'both'")
+
+    def new_state(self):
+        return _State(points=deque(maxlen=self.window), origin=0.0, sums=[0.0, 0.0, 0.0, 0.0], updates=0)
+
+    def _rebase(self, state: _State):
+        """Move the time origin to the oldest point and recompute the sums"""
+        state.origin = state.points[0][0] if state.points else 0.0
+        sums = [0.0, 0.0, 0.0, 0.0]
+        for t, value in state.points:
+            t -= state.origin
+            sums[0] += t
+            sums[1] += value
+            sums[2] += t * t
+            sums[3] += t * value
+        state.sums = sums
+        state.updates = 0
+
+    def _exceeds(self, slope):
+        if self.direction == 'up':
+            return slope > self.max_slope
+        if self.direction == 'down':
+            return slope < -self.max_slope
+        return abs(slope) > self.max_slope
+
+    def _hit(self, state, value, t):
+        points, sums = state.points, state.sums
+        if len(points) == self.window:
+            old_t, old_value = points[0]
+            old_t -= state.origin
+            sums[0] -= old_t
+            sums[1] -= old_value
+            sums[2] -= old_t * old_t
+            sums[3] -= old_t * old_value
+        points.append((t, value))
+        rel = t - state.origin
+        sums[0] += rel
+        sums[1] += value
+        sums[2] += rel * rel
+        sums[3] += rel * value
+        state.updates += 1
+        if state.updates >= self.window:
+            self._rebase(state)
+            sums = state.sums
+
+        n = len(points)
+        if n < self.window:
+            return False
+        denominator = n * sums[2] - sums[0] * sums[0]
+        if denominator <= 1e-12:
+            return False
+        return self._exceeds((n * sums[3] - sums[0] * sums[1]) / denominator)
+
+    def _hits(self, state, values, times):
+        window = self.window
+        held = list(state.points)
+        all_times = np.concatenate((np.fromiter((p[0] for p in held), np.float64, len(held)), times))
+        all_values = np.concatenate((np.fromiter((p[1] for p in held), np.float64, len(held)), values))
+        rel = all_times - all_times[0]
+
+        def window_sums(x):
+            cumulative = np.concatenate(([0.0], np.cumsum(x)))
+            end = np.arange(len(held) + 1, len(x) + 1)
+            return cumulative[end] - cumulative[np.maximum(end - window, 0)]
+
+        n = np.minimum(np.arange(len(held) + 1, len(all_times) + 1), window).astype(np.float64)
+        st, sv = window_sums(rel), window_sums(all_values)
+        stt, stv = window_sums(rel * rel), window_sums(rel * all_values)
+        denominator = n * stt - st * st
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = np.where(denominator > 1e-12, (n * stv - st * sv) / denominator, 0.0)
+        if self.direction == 'up':
+            exceeds = slopes > self.max_slope
+        elif self.direction == 'down':
+            exceeds = slopes < -self.max_slope
+        else:
+            exceeds = np.abs(slopes) > self.max_slope
+
+        state.points.extend(zip(times.tolist(), values.tolist()))
+        self._rebase(state)
+        return (n >= window) & (denominator > 1e-12) & exceeds
+
+
+RULE_TYPES = {rule.type: rule for rule in (RangeRule, AdaptiveRangeRule, RateOfChangeRule, ZScoreRule, TrendRule)}
+
+
+def compile_rules(specs: Sequence[Dict]) -> List[Rule]:
+    """
+    Build rules from their config declarations (disabled rules are skipped)
+
+    Raises:
+        ValueError: If a rule has an unknown type or field, or invalid parameters
+    """
+    rules = []
+    for spec in specs:
+        if not spec.get('enabled', True):
+            continue
+        rule_type = RULE_TYPES.get(spec.get('type'))
+        if rule_type is None:
+            raise ValueError(f"Unknown anomaly rule type: {spec.get('type')!r}")
+        rules.append(rule_type(spec))
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate anomaly rule names: {names}")
+    return rules
+
+
+class AnomalyEngine:
+    """
+    Compiled rule set shared by every patient's VitalsMonitor
+
+    The engine itself is stateless; each monitor keeps the list returned by
+    new_state() and passes it back in (callers serialize access per patient).
+    """
+
+    def __init__(self, specs: Sequence[Dict] = config.ANOMALY_RULES):
+        """
+        Args:
+            specs: Rule declarations (see config.ANOMALY_RULES)
+        """
+        self.rules = compile_rules(specs)
+        logger.info(f"AnomalyEngine compiled {len(self.rules)} rules: "
+                    f"{', '.join(f'{rule.name} ({rule.type})' for rule in self.rules)}")
+
+    def new_state(self) -> List[_State]:
+        """Fresh per-patient state for every rule"""
+        return [rule.new_state() for rule in self.rules]
+
+    def check(self, states: List[_State], vitals: Dict, t: float) -> List[str]:
+        """
+        Evaluate one confident sample
+
+        Args:
+            states: Patient state from new_state()
+            vitals: Vitals dictionary
+            t: Sample time in epoch seconds
+
+        Returns:
+            Names of the rules that are on (empty when vitals are normal)
+        """
+        active = []
+        for rule, state in zip(self.rules, states):
+            if rule.check(state, vitals.get(rule.field, 0), t, vitals.get(rule.confidence_field, 0.0)):
+                active.append(rule.name)
+        return active
+
+    def check_batch(self, states: List[_State], values: Dict[str, np.ndarray], times: np.ndarray,
+                    confidence: Dict[str, np.ndarray]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Evaluate a batch of confident samples, oldest first
+
+        Args:
+            states: Patient state from new_state()
+            values: Field name -> values
+            times: Sample times in epoch seconds
+            confidence: Confidence field name -> confidences
+
+        Returns:
+            (abnormal mask per sample, names of the rules on after the last sample)
+        """
+        abnormal = np.zeros(len(times), dtype=bool)
+        active = []
+        if not len(times):
+            return abnormal, active
+        for rule, state in zip(self.rules, states):
+            on = rule.check_batch(state, values[rule.field], times, confidence[rule.confidence_field])
+            abnormal |= on
+            if state.on:
+                active.append(rule.name)
+        return abnormal, active
+
+    def set_limits(self, states: List[_State], limits: Dict[str, Tuple[float, float]]):
+        """
+        Apply a patient's learned (low, high) limits to its adaptive_range rules
+
+        Args:
+            states: Patient state from new_state()
+            limits: Field name -> (low, high); fields without limits keep their current range
+        """
+        for rule, state in zip(self.rules, states):
+            if rule.type == AdaptiveRangeRule.type and rule.field in limits:
+                state.low, state.high = limits[rule.field]
+
+    def describe(self) -> List[Dict]:
+        """Compiled rules (name, type, field, hysteresis) for status endpoints"""
+        return [{'name': rule.name, 'type': rule.type, 'field': rule.field, 'hysteresis': rule.hysteresis}
+                for rule in self.rules]
+
+
+# Rules compiled once from config and shared by every monitor
+anomaly_engine = AnomalyEngine()
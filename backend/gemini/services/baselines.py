@@ -0,0 +1,388 @@
+"""
+Patient Baselines Service
+Streaming per-patient statistics for pulse and breathing (Welford, EWMA and
+P² quantile estimates) with periodic persistence, used to derive
+patient-specific thresholds
+
+Every accumulator is O(1) per sample with constant memory, so baselines
+never store or rescan raw history.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+BASELINE_FIELDS = ('pulse_rate', 'breathing_rate')
+
+
+class P2Quantile:
+    """
+    P² streaming quantile estimate (Jain & Chlamtac, 1985)
+
+    Five markers track the minimum, q/2, q, (1+q)/2 quantiles and the
+    maximum; their heights are adjusted with piecewise-parabolic
+    interpolation as values arrive.
+    """
+
+    def __init__(self, q: float):
+        """
+        Args:
+            q: Quantile to estimate (0-1)
+        """
+        self.q = q
+        self.heights: List[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 2 * q, 4 * q, 2 + 2 * q, 4.0]
+        self.increments = (0.0, q / 2, q, (1 + q) / 2, 1.0)
+
+    def add(self, x: float):
+        heights, positions, desired = self.heights, self.positions, self.desired
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self.heights, self.positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> Optional[float]:
+        """Current estimate (exact nearest-rank while fewer than 5 values were seen)"""
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            return self.heights[min(len(self.heights) - 1, int(self.q * len(self.heights)))]
+        return self.heights[2]
+
+    def to_dict(self) -> Dict:
+        return {'q': self.q, 'heights': self.heights, 'positions': self.positions, 'desired': self.desired}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'P2Quantile':
+        estimator = cls(data['q'])
+        estimator.heights = [float(h) for h in data['heights']]
+        estimator.positions = [int(n) for n in data['positions']]
+        estimator.desired = [float(n) for n in data['desired']]
+        return estimator
+
+
+class StreamStats:
+    """Welford mean/variance, EWMA mean/variance and P² quantiles of one field"""
+
+    def __init__(self, alpha: float = config.BASELINE_EWMA_ALPHA,
+                 quantiles: Iterable[float] = config.BASELINE_QUANTILES):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma_mean = 0.0
+        self.ewma_var = 0.0
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if self.count == 1:
+            self.ewma_mean = x
+        else:
+            diff = x - self.ewma_mean
+            self.ewma_mean += self.alpha * diff
+            self.ewma_var = (1.0 - self.alpha) * (self.ewma_var + self.alpha * diff * diff)
+        for estimator in self.quantiles.values():
+            estimator.add(x)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        estimator = self.quantiles.get(q)
+        return estimator.value if estimator else None
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 3),
+            'std': round(self.std, 3),
+            'ewma_mean': round(self.ewma_mean, 3),
+            'ewma_std': round(math.sqrt(self.ewma_var), 3),
+            'quantiles': {str(q): None if e.value is None else round(e.value, 3) for q, e in self.quantiles.items()},
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count, 'mean': self.mean, 'm2': self.m2,
+            'ewma_mean': self.ewma_mean, 'ewma_var': self.ewma_var,
+            'quantiles': [e.to_dict() for e in self.quantiles.values()],
+        }
+
+    def restore(self, data: Dict):
+        self.count = int(data['count'])
+        self.mean = float(data['mean'])
+        self.m2 = float(data['m2'])
+        self.ewma_mean = float(data['ewma_mean'])
+        self.ewma_var = float(data['ewma_var'])
+        for item in data.get('quantiles', []):
+            estimator = P2Quantile.from_dict(item)
+            if estimator.q in self.quantiles:
+                self.quantiles[estimator.q] = estimator
+
+
+class PatientBaseline:
+    """
+    One patient's learned baseline for pulse and breathing
+
+    At most one sample per `update_interval` seconds is folded in, which
+    keeps the cost off the per-sample path while still covering the whole
+    monitoring session.
+    """
+
+    def __init__(self, patient_id: str, update_interval: float = config.BASELINE_UPDATE_INTERVAL):
+        """
+        Args:
+            patient_id: Patient the baseline belongs to
+            update_interval: Seconds between samples folded into the baseline
+        """
+        self.patient_id = patient_id
+        self.update_interval = update_interval
+        self.fields = {field: StreamStats() for field in BASELINE_FIELDS}
+        self.last_update = float('-inf')
+        self.updated_at: Optional[float] = None
+        self.dirty = False
+        self.version = 0  # bumped on every change; lets save() clear dirty only for what it wrote
+        self.lock = threading.Lock()
+
+    def due(self, now: float) -> bool:
+        """Whether a sample at `now` would be folded in"""
+        return now - self.last_update >= self.update_interval
+
+    def update(self, vitals: Dict, now: float) -> bool:
+        """
+        Fold in one confident sample if the update interval has passed
+
+        Returns:
+            True if the baseline changed
+        """
+        if not self.due(now):
+            return False
+        with self.lock:
+            for field, stats in self.fields.items():
+                value = vitals.get(field)
+                if value is not None:
+                    stats.add(float(value))
+            self.last_update = now
+            self.updated_at = time.time()
+            self.dirty = True
+            self.version += 1
+        return True
+
+    def thresholds(self) -> Dict[str, Tuple[float, float]]:
+        """
+        Patient-specific (low, high) limits per field, once enough samples were seen
+
+        low/high = lowest/highest tracked quantile -/+ BASELINE_MARGIN times
+        their spread, clamped to config.BASELINE_LIMITS.
+        """
+        low_q, high_q = min(config.BASELINE_QUANTILES), max(config.BASELINE_QUANTILES)
+        limits = {}
+        with self.lock:
+            for field, stats in self.fields.items():
+                if stats.count < config.BASELINE_MIN_SAMPLES:
+                    continue
+                low, high = stats.quantile(low_q), stats.quantile(high_q)
+                spread = max(high - low, config.BASELINE_MIN_SPREAD.get(field, 0.0))
+                floor, ceiling = config.BASELINE_LIMITS[field]
+                limits[field] = (max(floor, low - config.BASELINE_MARGIN * spread),
+                                 min(ceiling, high + config.BASELINE_MARGIN * spread))
+        return limits
+
+    def snapshot(self) -> Dict:
+        """Get per-field statistics and the derived thresholds"""
+        with self.lock:
+            fields = {field: stats.snapshot() for field, stats in self.fields.items()}
+        return {
+            'patient_id': self.patient_id,
+            'updated_at': self.updated_at,
+            'fields': fields,
+            'thresholds': {field: [round(low, 2), round(high, 2)] for field, (low, high) in self.thresholds().items()},
+        }
+
+    def to_dict(self) -> Tuple[Dict, int]:
+        """
+        Serialize the baseline
+
+        Returns:
+            (data, version) - pass version to mark_saved() once the data is on disk
+        """
+        with self.lock:
+            return {
+                'updated_at': self.updated_at,
+                'fields': {field: stats.to_dict() for field, stats in self.fields.items()},
+            }, self.version
+
+    def mark_saved(self, version: int):
+        """Clear dirty if nothing changed since the saved version"""
+        with self.lock:
+            if self.version == version:
+                self.dirty = False
+
+    def restore(self, data: Dict):
+        with self.lock:
+            for field, stats_data in data.get('fields', {}).items():
+                if field in self.fields:
+                    self.fields[field].restore(stats_data)
+            self.updated_at = data.get('updated_at')
+
+
+class BaselineStore:
+    """
+    Per-patient baselines with warm start and periodic saving
+
+    start() loads baselines saved by earlier runs; a saver thread rewrites
+    the file (atomically) every `save_interval` seconds when any baseline
+    changed, and once more at shutdown.
+    """
+
+    def __init__(self, path: str = config.BASELINE_PATH,
+                 save_interval: float = config.BASELINE_SAVE_INTERVAL):
+        """
+        Args:
+            path: JSON file (relative paths are under backend/gemini)
+            save_interval: Seconds between saves
+        """
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(__file__), '..', path)
+        self.path = os.path.normpath(path)
+        self.save_interval = save_interval
+        self.baselines: Dict[str, PatientBaseline] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.saves = 0
+
+    def start(self):
+        """Load saved baselines and start the saver thread"""
+        if self.thread is not None:
+            return
+        self.load()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._saver_loop, name="baseline-saver", daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the saver and write any changes"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout)
+        self.thread = None
+        self.save()
+
+    def get(self, patient_id: str) -> PatientBaseline:
+        """Get (or create) a patient's baseline"""
+        baseline = self.baselines.get(patient_id)
+        if baseline is None:
+            with self.lock:
+                baseline = self.baselines.get(patient_id)
+                if baseline is None:
+                    baseline = self.baselines[patient_id] = PatientBaseline(patient_id)
+        return baseline
+
+    def load(self):
+        """Restore baselines saved by an earlier run (missing or unreadable files start fresh)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load patient baselines from {self.path}: {e}")
+            return
+        for patient_id, baseline_data in data.get('patients', {}).items():
+            try:
+                self.get(patient_id).restore(baseline_data)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping saved baseline for patient {patient_id}: {e}")
+        logger.info(f"Loaded baselines for {len(data.get('patients', {}))} patients from {self.path}")
+
+    def save(self) -> bool:
+        """Write every baseline if any changed since the last save (temp file + rename)"""
+        with self.lock:
+            baselines = list(self.baselines.values())
+        if not any(baseline.dirty for baseline in baselines):
+            return False
+        serialized = {baseline.patient_id: baseline.to_dict() for baseline in baselines}
+        data = {
+            'saved_at': time.time(),
+            'patients': {patient_id: baseline_data for patient_id, (baseline_data, _) in serialized.items()},
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save patient baselines: {e}")
+            return False  # baselines stay dirty, so the next save retries
+        for baseline in baselines:
+            baseline.mark_saved(serialized[baseline.patient_id][1])
+        self.saves += 1
+        return True
+
+    def _saver_loop(self):
+        while not self.stop_event.wait(self.save_interval):
+            self.save()
+
+    def get_stats(self) -> Dict:
+        """Get patient count and save info"""
+        return {
+            'path': self.path,
+            'patients': len(self.baselines),
+            'saves': self.saves,
+        }
+
+
+# Shared store (one file for every patient's baseline)
+baseline_store = BaselineStore()
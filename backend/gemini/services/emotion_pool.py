@@ -0,0 +1,344 @@
+"""
+Emotion Pool Service
+Multi-camera emotion analysis with FER running in a pool of worker
+processes, so inference never competes with Flask and socket ingestion
+for the GIL
+
+Each camera has a capture thread in the main process that resizes the
+newest frame straight into the camera's shared-memory buffer; workers
+read the frame from shared memory (no pickling of pixels) and only the
+small per-face results come back. Face tracking and change gating (see
+face_tracking) also run in the capture thread, so a worker classifies only
+the tracked face box and unchanged frames are not sent at all.
+"""
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from emotion_history import EmotionHistory
+from emotion_mapping import build_emotion
+from face_tracking import ChangeGate, FaceTracker
+from utils.logger import setup_logger
+from utils.metrics import Counter, Histogram
+import config
+
+logger = setup_logger(__name__)
+
+POOL_INFERENCE_SECONDS = Histogram('fer_pool_inference_seconds', 'FER round trip per frame in the worker pool',
+                                   ['camera'], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+POOL_ERRORS = Counter('fer_pool_errors_total', 'FER worker tasks that failed', ['camera'])
+POOL_FACE_LOOKUPS = Counter('fer_pool_face_lookups_total', 'How the face box was found for a pooled frame',
+                            ['camera', 'mode'])
+POOL_FRAMES_SKIPPED = Counter('fer_pool_frames_skipped_total',
+                              'Frames not sent to the pool because the face region had not changed', ['camera'])
+
+
+# ===== WORKER PROCESS =====
+
+_detector = None
+_segments: Dict[str, SharedMemory] = {}
+
+
+def _init_worker(threads: int):
+    """Load one FER detector per worker process"""
+    global _detector
+    os.environ.setdefault('TF_NUM_INTRAOP_THREADS', str(threads))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1')
+    from fer.fer import FER
+    _detector = FER(mtcnn=False)
+
+
+def _attach(name: str) -> SharedMemory:
+    """Attach to a camera's frame buffer (cached; the main process owns and unlinks it)"""
+    segment = _segments.get(name)
+    if segment is None:
+        try:
+            segment = SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers attachments too; harmless, spawned workers share the parent's tracker
+            segment = SharedMemory(name=name)
+        _segments[name] = segment
+    return segment
+
+
+def _detect_frame(name: str, shape: Tuple[int, int, int], box: Optional[Tuple[int, int, int, int]] = None) -> List[Dict]:
+    """Run FER on the frame in shared memory (only on `box` when the face is tracked); returns [{"box", "emotions"}, ...]"""
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=_attach(name).buf)
+    if box is not None:
+        faces = _detector.detect_emotions(frame, face_rectangles=[box])
+    else:
+        faces = _detector.detect_emotions(frame)
+    return [{'box': [int(v) for v in face['box']], 'emotions': face['emotions']} for face in faces or []]
+
+
+# ===== MAIN PROCESS =====
+
+class _Camera:
+    """One camera: capture thread state, shared frame buffer and latest result"""
+
+    def __init__(self, camera_id: str, source: int, frame_size: Tuple[int, int]):
+        width, height = frame_size
+        self.camera_id = camera_id
+        self.source = source
+        self.shape = (height, width, 3)
+        self.shm = SharedMemory(create=True, size=height * width * 3)
+        self.frame = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.in_flight = False  # the buffer belongs to a worker until its result is back
+        self.next_at = 0.0
+        self.latest_emotion: Optional[Dict] = None
+        self.history = EmotionHistory()
+        self.tracker = FaceTracker(lost_counter=POOL_FACE_LOOKUPS.labels(camera_id, 'lost'))
+        self.gate = ChangeGate()
+        self.frames_captured = 0
+        self.frames_analyzed = 0
+        self.frames_skipped = 0
+        self.errors = 0
+        self.running = True
+        self.thread: Optional[threading.Thread] = None
+        self.inference_seconds = POOL_INFERENCE_SECONDS.labels(camera_id)
+        self.error_count = POOL_ERRORS.labels(camera_id)
+        self.detected = POOL_FACE_LOOKUPS.labels(camera_id, 'detect')
+        self.tracked = POOL_FACE_LOOKUPS.labels(camera_id, 'track')
+        self.skipped = POOL_FRAMES_SKIPPED.labels(camera_id)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class EmotionPool:
+    """
+    FER worker processes shared by any number of cameras
+
+    Each camera keeps at most one frame in flight: its capture thread only
+    decodes and copies a new frame once the previous result is back and
+    the camera's next analysis is due (1 / target_fps), so a slow pool
+    lowers the per-camera rate instead of queueing stale frames. The
+    tracker and change gate are only touched by the capture thread while
+    no frame is in flight, and by the result callback while one is.
+    """
+
+    def __init__(self, num_workers: int = config.FER_POOL_WORKERS,
+                 frame_size: Tuple[int, int] = config.FER_POOL_FRAME_SIZE,
+                 target_fps: float = config.FER_TARGET_FPS,
+                 worker_threads: int = config.FER_POOL_WORKER_THREADS):
+        """
+        Args:
+            num_workers: FER worker processes (one detector each)
+            frame_size: (width, height) frames are resized to before inference
+            target_fps: Most frames analyzed per second per camera
+            worker_threads: TensorFlow threads per worker
+        """
+        self.num_workers = max(1, num_workers)
+        self.frame_size = tuple(frame_size)
+        self.target_fps = target_fps
+        self.worker_threads = worker_threads
+        self.cameras: Dict[str, _Camera] = {}
+        self.lock = threading.Lock()
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.restarts = 0
+
+    def start(self):
+        """Start the worker processes (models load in the background)"""
+        with self.lock:
+            if self.executor is None:
+                self.executor = self._new_executor()
+                atexit.register(self.stop)
+                logger.info(f"EmotionPool started - {self.num_workers} FER workers, "
+                            f"frames {self.frame_size[0]}x{self.frame_size[1]}")
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: workers must not inherit the server's threads, sockets or a half-initialized TensorFlow
+        return ProcessPoolExecutor(max_workers=self.num_workers, mp_context=get_context('spawn'),
+                                   initializer=_init_worker, initargs=(self.worker_threads,))
+
+    def add_camera(self, camera_id: str, source: int) -> bool:
+        """
+        Start analyzing a camera
+
+        Args:
+            camera_id: Id results are reported under (usually the patient id)
+            source: OpenCV camera index
+
+        Returns:
+            False if the camera id is already in use
+        """
+        self.start()
+        with self.lock:
+            if camera_id in self.cameras:
+                return False
+            camera = self.cameras[camera_id] = _Camera(camera_id, source, self.frame_size)
+        camera.thread = threading.Thread(target=self._capture_loop, args=(camera,),
+                                         name=f"fer-capture-{camera_id}", daemon=True)
+        camera.thread.start()
+        logger.info(f"✓ Camera {source} added to emotion pool as '{camera_id}'")
+        return True
+
+    def remove_camera(self, camera_id: str, timeout: float = 2.0):
+        """Stop analyzing a camera and free its frame buffer"""
+        with self.lock:
+            camera = self.cameras.pop(camera_id, None)
+        if camera is None:
+            return
+        camera.running = False
+        if camera.thread:
+            camera.thread.join(timeout)
+        # A result may still be in flight; wait briefly so a worker never reads a freed buffer
+        deadline = time.monotonic() + timeout
+        while camera.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        camera.close()
+
+    def stop(self):
+        """Stop every camera and the worker processes"""
+        for camera_id in list(self.cameras):
+            self.remove_camera(camera_id)
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _capture_loop(self, camera: _Camera):
+        """Grab frames for one camera and hand the newest one to the pool when it is due"""
+        capture = cv2.VideoCapture(camera.source)
+        try:
+            if not capture.isOpened():
+                logger.error(f"✗ Failed to open camera {camera.source} ('{camera.camera_id}')")
+                return
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            width, height = self.frame_size
+            while camera.running:
+                if not capture.grab():
+                    logger.warning(f"Failed to read frame from camera '{camera.camera_id}'")
+                    time.sleep(0.1)
+                    continue
+                camera.frames_captured += 1
+                if camera.in_flight or time.monotonic() < camera.next_at:
+                    continue
+                ret, frame = capture.retrieve()
+                if not ret:
+                    continue
+                cv2.resize(frame, (width, height), dst=camera.frame)  # straight into shared memory
+                gray = cv2.cvtColor(camera.frame, cv2.COLOR_BGR2GRAY)
+                box = camera.tracker.track(gray)
+                if self._unchanged(camera, gray):
+                    continue
+                self._submit(camera, gray, box)
+        finally:
+            capture.release()
+
+    def _unchanged(self, camera: _Camera, gray: np.ndarray) -> bool:
+        """Static scene: keep the camera's previous result instead of sending a near-identical face to the pool"""
+        now = time.monotonic()
+        face_box = camera.tracker.box
+        if camera.gate.threshold <= 0 or not camera.gate.unchanged(camera.gate.signature(gray, face_box),
+                                                                    face_box is not None, now):
+            return False
+        camera.next_at = now + 1.0 / self.target_fps
+        camera.frames_skipped += 1
+        camera.skipped.inc()
+        if camera.latest_emotion:
+            camera.latest_emotion = dict(camera.latest_emotion, timestamp=time.time())
+        camera.history.append(camera.latest_emotion)
+        return True
+
+    def _submit(self, camera: _Camera, gray: np.ndarray, box: Optional[Tuple[int, int, int, int]]):
+        executor = self.executor
+        if executor is None:
+            return
+        started = time.monotonic()
+        camera.in_flight = True
+        camera.next_at = started + 1.0 / self.target_fps
+        try:
+            future = executor.submit(_detect_frame, camera.shm.name, camera.shape, box)
+        except (BrokenProcessPool, RuntimeError) as e:
+            camera.in_flight = False
+            self._restart_executor(executor, e)
+            return
+        future.add_done_callback(lambda done, ex=executor: self._on_result(camera, started, gray, box, done, ex))
+
+    def _on_result(self, camera: _Camera, started: float, gray: np.ndarray,
+                   box: Optional[Tuple[int, int, int, int]], future, executor: ProcessPoolExecutor):
+        """Store a worker's result (runs on the result thread of `executor`, the pool it was submitted to)"""
+        try:
+            faces = future.result()
+        except Exception as e:
+            camera.errors += 1
+            camera.error_count.inc()
+            camera.in_flight = False
+            logger.warning(f"Emotion detection failed for camera '{camera.camera_id}': {e}")
+            if isinstance(e, BrokenProcessPool):
+                self._restart_executor(executor, e)  # a late failure from an old pool leaves its replacement alone
+            return
+        camera.inference_seconds.observe(time.monotonic() - started)
+        camera.frames_analyzed += 1
+        if box is not None:
+            camera.tracked.inc()
+        else:
+            camera.tracker.reset(gray, faces[0]['box'] if faces else None)
+            camera.detected.inc()
+        face_box = camera.tracker.box
+        camera.gate.mark(camera.gate.signature(gray, face_box), face_box is not None, time.monotonic())
+        # Get the first (most prominent) face; None when no face was detected
+        camera.latest_emotion = build_emotion(faces[0]['emotions']) if faces else None
+        camera.history.append(camera.latest_emotion)
+        camera.in_flight = False
+
+    def _restart_executor(self, broken: Optional[ProcessPoolExecutor], error: Exception):
+        """Replace a pool whose worker died (e.g. out of memory in TensorFlow)"""
+        with self.lock:
+            if broken is None or self.executor is not broken:
+                return  # already replaced or stopped
+            logger.error(f"FER worker pool broken ({error}) - restarting {self.num_workers} workers")
+            self.executor = self._new_executor()
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def has_camera(self, camera_id: str) -> bool:
+        return camera_id in self.cameras
+
+    def get_emotion(self, camera_id: str) -> Optional[Dict]:
+        """Get a camera's smoothed emotion (None if no recent face or unknown camera)"""
+        camera = self.cameras.get(camera_id)
+        return camera.history.current() if camera else None
+
+    def get_history(self, camera_id: str, seconds: float) -> Optional[Dict]:
+        """Get a camera's emotion history snapshot (None for an unknown camera)"""
+        camera = self.cameras.get(camera_id)
+        return camera.history.snapshot(seconds) if camera else None
+
+    def get_stats(self) -> Dict:
+        """Get per-camera capture/analysis counts and latency"""
+        cameras = {}
+        for camera_id, camera in list(self.cameras.items()):
+            latency = camera.inference_seconds.snapshot()
+            cameras[camera_id] = {
+                'source': camera.source,
+                'frames_captured': camera.frames_captured,
+                'frames_analyzed': camera.frames_analyzed,
+                'frames_skipped': camera.frames_skipped,
+                'errors': camera.errors,
+                'dominant': (camera.latest_emotion or {}).get('dominant'),
+                'latency_ms': {
+                    'p50': round(latency['p50'] * 1000, 1),
+                    'p95': round(latency['p95'] * 1000, 1),
+                },
+                'tracking': camera.tracker.box is not None,
+            }
+        return {
+            'workers': self.num_workers,
+            'running': self.executor is not None,
+            'restarts': self.restarts,
+            'cameras': cameras,
+        }
+
+
+# Shared pool (started on the first add_camera)
+emotion_pool = EmotionPool()
@@ -0,0 +1,246 @@
+"""
+Ingestion Pipeline
+Decouples the socket receive loop from vitals evaluation with bounded
+per-worker queues and evaluation worker threads
+"""
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Dict, List, Optional
+from services.vitals_stream import vitals_broadcaster
+from utils.logger import setup_logger
+from utils.tracing import Trace
+import config
+
+logger = setup_logger(__name__)
+
+OVERFLOW_POLICIES = ('coalesce', 'drop_oldest')
+
+
+def process_batch(vitals_store, patient_id: str, samples: List[Dict], times: List[float],
+                  trace: Optional[Trace] = None) -> bool:
+    """
+    Store, check and publish a batch of validated samples for one patient
+
+    Args:
+        vitals_store: VitalsStore holding the patient's state
+        patient_id: Patient/stream id
+        samples: Vitals dictionaries, oldest first
+        times: Sample times in epoch seconds
+        trace: Trace to record the store/check stages on (None when not traced)
+
+    Returns:
+        True if the patient's vitals are abnormal after the batch
+    """
+    # Publish to the patient's state and history
+    state = vitals_store.update_batch(patient_id, samples, times)
+    if trace is not None:
+        trace.mark('store')
+
+    # Check with the patient's vitals monitor (one pass, one lock acquisition)
+    is_abnormal = state.monitor.check_batch(samples, times, trace=trace)
+    if trace is not None:
+        trace.finish()
+
+    # Push the newest sample to stream subscribers
+    if vitals_broadcaster.subscriber_count:
+        vitals_broadcaster.publish(patient_id, {
+            **state.vitals,
+            'is_abnormal': is_abnormal,
+            'abnormal_duration': state.monitor.get_status()['abnormal_duration'],
+            'alert_active': state.alert_manager.active_alert is not None
+        })
+    return is_abnormal
+
+
+class _Batch:
+    """One queued batch of samples for a patient"""
+
+    __slots__ = ('patient_id', 'samples', 'times', 'enqueued_at', 'trace')
+
+    def __init__(self, patient_id: str, samples: List[Dict], times: List[float],
+                 trace: Optional[Trace] = None):
+        self.patient_id = patient_id
+        self.samples = samples
+        self.times = times
+        self.enqueued_at = time.monotonic()
+        self.trace = trace
+
+
+class _WorkerQueue:
+    """Bounded batch queue feeding one evaluation worker"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = deque()
+        self.pending: Dict[str, _Batch] = {}  # patient -> its newest queued batch
+        self.condition = threading.Condition()
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+
+class IngestPipeline:
+    """
+    Bounded queue + worker stage between the socket server and VitalsMonitor
+
+    The receive loop only calls submit(), which never blocks. Each patient is
+    pinned to one worker so its samples are evaluated in order. When a
+    worker's queue is full the overflow policy applies:
+      - coalesce: merge the batch into the patient's pending batch (nothing
+        is lost, it is just evaluated as one larger batch) up to
+        max_coalesced samples, beyond which its oldest samples are dropped;
+        falls back to dropping the oldest batch if the patient has nothing
+        pending
+      - drop_oldest: discard the oldest queued batch
+    """
+
+    def __init__(self, vitals_store, num_workers: int = config.INGEST_WORKERS,
+                 queue_size: int = config.INGEST_QUEUE_SIZE,
+                 overflow_policy: str = config.INGEST_OVERFLOW_POLICY,
+                 max_coalesced: int = config.INGEST_MAX_COALESCED_SAMPLES):
+        """
+        Args:
+            vitals_store: VitalsStore holding per-patient state
+            num_workers: Number of evaluation worker threads
+            queue_size: Pending batches per worker before the overflow policy applies
+            overflow_policy: "coalesce" or "drop_oldest"
+            max_coalesced: Most samples a coalesced batch may grow to (newest are kept)
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.vitals_store = vitals_store
+        self.overflow_policy = overflow_policy
+        self.max_coalesced = max(1, max_coalesced)
+        self.queues = [_WorkerQueue(max(1, queue_size)) for _ in range(max(1, num_workers))]
+        self.threads: List[threading.Thread] = []
+        self.running = False
+
+        logger.info(f"IngestPipeline initialized - {len(self.queues)} workers, "
+                    f"{queue_size} batches/worker, overflow policy: {overflow_policy}")
+
+    def start(self):
+        """Start the evaluation workers"""
+        if self.running:
+            return
+        self.running = True
+        for index, worker_queue in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                args=(worker_queue,),
+                name=f"ingest-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Started {len(self.threads)} ingestion workers")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the workers after they finish the batch they are on"""
+        self.running = False
+        for worker_queue in self.queues:
+            with worker_queue.condition:
+                worker_queue.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def submit(self, patient_id: str, samples: List[Dict], times: List[float],
+               trace: Optional[Trace] = None) -> bool:
+        """
+        Queue a batch for evaluation (never blocks)
+
+        Args:
+            patient_id: Patient/stream id
+            samples: Validated vitals dictionaries, oldest first
+            times: Sample times in epoch seconds
+            trace: Trace of the batch (coalesced batches keep the pending batch's trace)
+
+        Returns:
+            False if samples had to be dropped to make room, True otherwise
+        """
+        worker_queue = self.queues[zlib.crc32(patient_id.encode('utf-8')) % len(self.queues)]
+        accepted = True
+        with worker_queue.condition:
+            if len(worker_queue.items) >= worker_queue.capacity:
+                pending = worker_queue.pending.get(patient_id)
+                if self.overflow_policy == 'coalesce' and pending is not None:
+                    pending.samples.extend(samples)
+                    pending.times.extend(times)
+                    worker_queue.enqueued += len(samples)
+                    worker_queue.coalesced += len(samples)
+                    # Bound the merged batch: keep the newest samples (check_batch cost grows with its size)
+                    excess = len(pending.samples) - self.max_coalesced
+                    if excess <= 0:
+                        return True
+                    del pending.samples[:excess]
+                    del pending.times[:excess]
+                    worker_queue.dropped += excess
+                    logger.warning(f"Ingest queue full - coalesced batch for {patient_id} capped, "
+                                   f"dropped {excess} oldest samples")
+                    return False
+                oldest = worker_queue.items.popleft()
+                if worker_queue.pending.get(oldest.patient_id) is oldest:
+                    del worker_queue.pending[oldest.patient_id]
+                worker_queue.dropped += len(oldest.samples)
+                accepted = False
+
+            batch = _Batch(patient_id, list(samples), list(times), trace)
+            worker_queue.items.append(batch)
+            worker_queue.pending[patient_id] = batch
+            worker_queue.enqueued += len(samples)
+            worker_queue.max_depth = max(worker_queue.max_depth, len(worker_queue.items))
+            worker_queue.condition.notify()
+
+        if not accepted:
+            logger.warning(f"Ingest queue full - dropped oldest batch (policy: {self.overflow_policy})")
+        return accepted
+
+    def _worker_loop(self, worker_queue: _WorkerQueue):
+        """Evaluate queued batches until stopped"""
+        while self.running:
+            with worker_queue.condition:
+                while not worker_queue.items and self.running:
+                    worker_queue.condition.wait()
+                if not self.running:
+                    return
+                batch = worker_queue.items.popleft()
+                if worker_queue.pending.get(batch.patient_id) is batch:
+                    del worker_queue.pending[batch.patient_id]
+
+            if batch.trace is not None:
+                batch.trace.mark('queue')
+            try:
+                process_batch(self.vitals_store, batch.patient_id, batch.samples, batch.times, batch.trace)
+            except Exception as e:
+                logger.error(f"Error evaluating batch for patient {batch.patient_id}: {e}", exc_info=True)
+
+            with worker_queue.condition:
+                worker_queue.processed += len(batch.samples)
+
+    def get_stats(self) -> Dict:
+        """Get queue depth and throughput/drop counters"""
+        workers = []
+        for worker_queue in self.queues:
+            with worker_queue.condition:
+                workers.append({
+                    'depth': len(worker_queue.items),
+                    'max_depth': worker_queue.max_depth,
+                    'enqueued': worker_queue.enqueued,
+                    'processed': worker_queue.processed,
+                    'dropped': worker_queue.dropped,
+                    'coalesced': worker_queue.coalesced,
+                })
+        return {
+            'overflow_policy': self.overflow_policy,
+            'capacity_per_worker': self.queues[0].capacity,
+            'depth': sum(w['depth'] for w in workers),
+            'enqueued': sum(w['enqueued'] for w in workers),
+            'processed': sum(w['processed'] for w in workers),
+            'dropped': sum(w['dropped'] for w in workers),
+            'coalesced': sum(w['coalesced'] for w in workers),
+            'workers': workers,
+        }
@@ -0,0 +1,203 @@
+"""
+Task Executor Service
+Bounded, keyed thread pool for alert callbacks and conversation dispatch
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+OVERFLOW_POLICIES = ('reject', 'drop_oldest')
+
+
+class _Task:
+    """One queued call"""
+
+    __slots__ = ('key', 'fn', 'args', 'kwargs', 'enqueued_at')
+
+    def __init__(self, key: str, fn: Callable, args: tuple, kwargs: dict):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+
+
+class KeyedExecutor:
+    """
+    Fixed pool of worker threads running tasks grouped by key
+
+    Tasks with the same key (a patient id) run one at a time in submission
+    order; tasks with different keys run in parallel on any free worker, so
+    one patient's slow conversation does not hold up another patient's
+    alert. Workers are started once, so submit() never creates a thread.
+
+    When `queue_size` tasks are already waiting the overflow policy applies:
+      - reject: the new task is refused (submit returns False)
+      - drop_oldest: the oldest waiting task for the same key is discarded
+        to make room; refused if that key has nothing waiting
+    """
+
+    def __init__(self, name: str, num_workers: int = config.ALERT_EXECUTOR_WORKERS,
+                 queue_size: int = config.ALERT_EXECUTOR_QUEUE_SIZE,
+                 overflow_policy: str = config.ALERT_EXECUTOR_OVERFLOW_POLICY):
+        """
+        Args:
+            name: Thread name prefix and log label
+            num_workers: Number of worker threads
+            queue_size: Waiting tasks (across all keys) before the overflow policy applies
+            overflow_policy: "reject" or "drop_oldest"
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.name = name
+        self.num_workers = max(1, num_workers)
+        self.queue_size = max(1, queue_size)
+        self.overflow_policy = overflow_policy
+
+        self.pending: Dict[str, Deque[_Task]] = {}  # key -> its waiting tasks
+        self.ready: Deque[str] = deque()  # keys with waiting tasks and nothing running
+        self.active_keys: Set[str] = set()  # keys with a task running
+        self.depth = 0
+        self.condition = threading.Condition()
+        self.threads: List[threading.Thread] = []
+        self.running = False
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    def start(self):
+        """Start the worker threads"""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        for index in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-{index}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Started {self.name} executor - {self.num_workers} workers, "
+                    f"{self.queue_size} queued tasks max, overflow policy: {self.overflow_policy}")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the workers after they finish the task they are on (queued tasks are discarded)"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> bool:
+        """
+        Queue fn(*args, **kwargs) to run after any earlier tasks for `key` (never blocks)
+
+        Args:
+            key: Serialization key (patient id)
+            fn: Callable to run on a worker
+
+        Returns:
+            True if the task was queued, False if it was refused by the overflow policy
+        """
+        if not self.running:
+            self.start()
+
+        task = _Task(key, fn, args, kwargs)
+        with self.condition:
+            waiting = self.pending.get(key)
+            if self.depth >= self.queue_size:
+                if self.overflow_policy == 'drop_oldest' and waiting:
+                    waiting.popleft()
+                    self.depth -= 1
+                    self.dropped += 1
+                    logger.warning(f"{self.name} queue full - dropped oldest task for {key}")
+                else:
+                    self.rejected += 1
+                    logger.warning(f"{self.name} queue full - rejected task for {key}")
+                    return False
+
+            if waiting is None:
+                waiting = self.pending[key] = deque()
+            waiting.append(task)
+            if len(waiting) == 1 and key not in self.active_keys:
+                self.ready.append(key)
+                self.condition.notify()
+
+            self.depth += 1
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.depth)
+        return True
+
+    def _worker_loop(self):
+        """Run ready tasks until stopped"""
+        while True:
+            with self.condition:
+                while not self.ready and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                key = self.ready.popleft()
+                task = self.pending[key].popleft()
+                self.active_keys.add(key)
+                self.depth -= 1
+                wait = time.monotonic() - task.enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            failed = False
+            try:
+                task.fn(*task.args, **task.kwargs)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error in {self.name} task for {key}: {e}", exc_info=True)
+
+            with self.condition:
+                self.active_keys.discard(key)
+                if self.pending[key]:
+                    self.ready.append(key)
+                    self.condition.notify()
+                else:
+                    del self.pending[key]
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+
+    def get_stats(self) -> Dict:
+        """Get queued/running task counts and throughput/backpressure counters"""
+        with self.condition:
+            started = self.completed + self.failed + len(self.active_keys)
+            return {
+                'workers': self.num_workers,
+                'overflow_policy': self.overflow_policy,
+                'capacity': self.queue_size,
+                'queued': self.depth,
+                'running': len(self.active_keys),
+                'max_queued': self.max_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'dropped': self.dropped,
+                'avg_wait_ms': round(self.total_wait / started * 1000, 3) if started else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+# Shared executor for alert callbacks and ElevenLabs conversation dispatch
+alert_executor = KeyedExecutor('alert-executor')
@@ -0,0 +1,172 @@
+"""
+Vitals History
+Fixed-size, array-backed ring buffer of vitals samples with windowed queries
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import config
+
+# Column name -> dtype for every stored sample
+HISTORY_COLUMNS = {
+    'timestamp': np.float64,
+    'pulse_rate': np.float64,
+    'breathing_rate': np.float64,
+    'pulse_confidence': np.float64,
+    'breathing_confidence': np.float64,
+    'talking': np.bool_,
+}
+
+# Columns summarised by stats()
+NUMERIC_COLUMNS = ('pulse_rate', 'breathing_rate', 'pulse_confidence', 'breathing_confidence')
+
+
+class VitalsHistory:
+    """
+    Ring buffer holding the most recent samples of one vitals stream
+
+    Each column is a preallocated NumPy array, so appends are O(1) and
+    memory never grows past `capacity` samples. Window queries return
+    chronologically ordered copies and are computed with vectorized ops.
+    """
+
+    def __init__(self, capacity: int = config.HISTORY_CAPACITY):
+        """
+        Args:
+            capacity: Maximum number of samples retained
+        """
+        self.capacity = max(1, capacity)
+        self._columns = {
+            name: np.zeros(self.capacity, dtype=dtype)
+            for name, dtype in HISTORY_COLUMNS.items()
+        }
+        self._head = 0  # next slot to write
+        self._size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, vitals: Dict, timestamp: Optional[float] = None):
+        """
+        Append one validated sample
+
+        Args:
+            vitals: Dictionary with pulse_rate, breathing_rate, confidences and talking
+            timestamp: Sample time in epoch seconds (defaults to now)
+        """
+        with self.lock:
+            i = self._head
+            columns = self._columns
+            timestamp = time.time() if timestamp is None else timestamp
+            if self._size:
+                # Keep timestamps non-decreasing (window() binary-searches them)
+                timestamp = max(timestamp, columns['timestamp'][i - 1])
+            columns['timestamp'][i] = timestamp
+            columns['pulse_rate'][i] = vitals.get('pulse_rate', 0)
+            columns['breathing_rate'][i] = vitals.get('breathing_rate', 0)
+            columns['pulse_confidence'][i] = vitals.get('pulse_confidence', 0.0)
+            columns['breathing_confidence'][i] = vitals.get('breathing_confidence', 0.0)
+            columns['talking'][i] = bool(vitals.get('talking', False))
+            self._head = (i + 1) % self.capacity
+            if self._size < self.capacity:
+                self._size += 1
+
+    def extend(self, samples: List[Dict], timestamps: Optional[Sequence[float]] = None):
+        """
+        Append a batch of samples with one vectorized write
+
+        Args:
+            samples: Vitals dictionaries, oldest first
+            timestamps: Sample times in epoch seconds (defaults to now for all; raised to the newest stored time if earlier)
+        """
+        count = len(samples)
+        if count == 0:
+            return
+        if timestamps is None:
+            timestamps = np.full(count, time.time())
+        values = {
+            'timestamp': np.asarray(timestamps, dtype=np.float64),
+            'pulse_rate': np.fromiter((s.get('pulse_rate', 0) for s in samples), np.float64, count),
+            'breathing_rate': np.fromiter((s.get('breathing_rate', 0) for s in samples), np.float64, count),
+            'pulse_confidence': np.fromiter((s.get('pulse_confidence', 0.0) for s in samples), np.float64, count),
+            'breathing_confidence': np.fromiter((s.get('breathing_confidence', 0.0) for s in samples), np.float64, count),
+            'talking': np.fromiter((bool(s.get('talking', False)) for s in samples), np.bool_, count),
+        }
+        # Only the newest `capacity` samples can survive
+        if count > self.capacity:
+            values = {name: column[-self.capacity:] for name, column in values.items()}
+            count = self.capacity
+
+        with self.lock:
+            # Keep timestamps non-decreasing: a back-dated batch never lands before samples already stored
+            floor = self._columns['timestamp'][self._head - 1] if self._size else -np.inf
+            values['timestamp'] = np.maximum.accumulate(np.maximum(values['timestamp'], floor))
+            slots = (np.arange(count) + self._head) % self.capacity
+            for name, column in values.items():
+                self._columns[name][slots] = column
+            self._head = (self._head + count) % self.capacity
+            self._size = min(self.capacity, self._size + count)
+
+    def _ordered_indices(self) -> np.ndarray:
+        """Indices of the stored samples, oldest first (call with lock held)"""
+        start = (self._head - self._size) % self.capacity
+        return (np.arange(self._size) + start) % self.capacity
+
+    def window(self, seconds: Optional[float] = None, limit: Optional[int] = None,
+               now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Get the samples from the last `seconds`, oldest first
+
+        Args:
+            seconds: Window length (None for everything retained)
+            limit: Keep at most this many of the newest samples
+            now: Window end in epoch seconds (defaults to now)
+
+        Returns:
+            Dict of column name -> array copy
+        """
+        with self.lock:
+            indices = self._ordered_indices()
+            if seconds is not None and len(indices):
+                cutoff = (time.time() if now is None else now) - seconds
+                timestamps = self._columns['timestamp'][indices]
+                indices = indices[np.searchsorted(timestamps, cutoff, side='left'):]
+            if limit is not None:
+                indices = indices[-limit:] if limit > 0 else indices[:0]
+            return {name: column[indices] for name, column in self._columns.items()}
+
+    def stats(self, seconds: Optional[float] = None,
+              percentiles: Sequence[float] = config.HISTORY_PERCENTILES) -> Dict:
+        """
+        Summarise the last `seconds` of samples
+
+        Args:
+            seconds: Window length (None for everything retained)
+            percentiles: Percentiles to report for each numeric column
+
+        Returns:
+            Dict with sample count, time span and per-column min/max/mean/percentiles
+        """
+        data = self.window(seconds)
+        count = len(data['timestamp'])
+        result = {
+            'count': count,
+            'start': float(data['timestamp'][0]) if count else None,
+            'end': float(data['timestamp'][-1]) if count else None,
+        }
+        if not count:
+            return result
+
+        for name in NUMERIC_COLUMNS:
+            values = data[name]
+            points = np.percentile(values, percentiles)
+            result[name] = {
+                'min': float(values.min()),
+                'max': float(values.max()),
+                'mean': float(values.mean()),
+                **{f"p{p:g}": float(v) for p, v in zip(percentiles, points)}
+            }
+        result['talking_ratio'] = float(data['talking'].mean())
+        return result
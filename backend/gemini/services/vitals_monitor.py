@@ -2,49 +2,92 @@
 Vitals Monitor Service
 Continuously monitors incoming vitals and detects abnormal patterns
 """
+import logging
 import time
 import threading
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Sequence
+import numpy as np
+from services.anomaly_rules import AnomalyEngine, anomaly_engine
+from services.baselines import PatientBaseline, baseline_store
+from services.task_executor import alert_executor
 from utils.logger import setup_logger
+from utils.metrics import Counter, Histogram
+from utils.tracing import Trace
 import config
 
 logger = setup_logger(__name__)
 
+CHECK_SECONDS = Histogram('vitals_check_seconds', 'VitalsMonitor check latency (incl. lock wait)', ['mode'],
+                          buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025,
+                                   0.0005, 0.001, 0.0025, 0.005, 0.01))
+CHECK_SECONDS_SINGLE = CHECK_SECONDS.labels('single')
+CHECK_SECONDS_BATCH = CHECK_SECONDS.labels('batch')
+TRANSITIONS = Counter('vitals_state_transitions_total', 'VitalsMonitor abnormal-state transitions', ['to'])
+TO_ABNORMAL = TRANSITIONS.labels('abnormal')
+TO_NORMAL = TRANSITIONS.labels('normal')
+TO_ALERT = TRANSITIONS.labels('alert')
+
 
 class VitalsMonitor:
     """
     Monitors vital signs and triggers alerts when abnormalities are detected
     """
     
-    def __init__(self, alert_callback=None):
+    def __init__(self, alert_callback=None, patient_id: str = config.DEFAULT_PATIENT_ID,
+                 engine: AnomalyEngine = anomaly_engine, baseline: Optional[PatientBaseline] = None):
         """
         Args:
             alert_callback: Function to call when alert should be triggered
                            Signature: callback(vitals_data: dict) -> None
+            patient_id: Patient/stream this monitor is watching
+            engine: Compiled anomaly rules (defaults to the rules in config.ANOMALY_RULES)
+            baseline: Patient's learned baseline (defaults to the shared baseline store's)
         """
         self.alert_callback = alert_callback
+        self.patient_id = patient_id
         self.abnormal_start_time: Optional[float] = None
         self.is_currently_abnormal = False
         self.last_vitals: Optional[Dict] = None
+        self.engine = engine
+        self.rule_state = engine.new_state()  # this patient's detector state (guarded by self.lock)
+        self.active_rules: List[str] = []
+        self.baseline = baseline if baseline is not None else baseline_store.get(patient_id)
+        self.engine.set_limits(self.rule_state, self.baseline.thresholds())  # warm start from a saved baseline
         self.lock = threading.Lock()
         
-        logger.info("VitalsMonitor initialized")
+        logger.info(f"VitalsMonitor initialized for patient {patient_id}")
         logger.info(f"Thresholds - Pulse: {config.PULSE_MIN}-{config.PULSE_MAX}, "
                    f"Breathing: {config.BREATHING_MIN}-{config.BREATHING_MAX}, "
                    f"Confidence: >{config.CONFIDENCE_THRESHOLD}")
     
-    def check_vitals(self, vitals: Dict) -> bool:
+    def check_vitals(self, vitals: Dict, now: Optional[float] = None, trace: Optional[Trace] = None) -> bool:
         """
         Check if vitals are abnormal and trigger alert if sustained
         
         Args:
             vitals: Dictionary with keys: pulse_rate, breathing_rate, 
                 pulse_confidence, breathing_confidence
+            now: Sample time in epoch seconds (defaults to now)
+            trace: Trace to record lock wait/check stages on (None when not traced)
         
         Returns:
             True if vitals are currently abnormal, False otherwise
         """
+        start = time.perf_counter()
+        is_abnormal = self._check_vitals(vitals, now, trace)
+        CHECK_SECONDS_SINGLE.observe(time.perf_counter() - start)
+        if trace is not None:
+            trace.mark('check')
+        return is_abnormal
+
+    def _check_vitals(self, vitals: Dict, now: Optional[float], trace: Optional[Trace]) -> bool:
+        """check_vitals without the latency measurement"""
+        if now is None:
+            now = time.time()
+
         with self.lock:
+            if trace is not None:
+                trace.mark('lock_wait')
             pulse = vitals.get('pulse_rate', 0)
             breathing = vitals.get('breathing_rate', 0)
             pulse_conf = vitals.get('pulse_confidence', 0.0)
@@ -55,41 +98,42 @@ class VitalsMonitor:
 
             # Ignore low confidence readings
             if pulse_conf < config.CONFIDENCE_THRESHOLD or breathing_conf < config.CONFIDENCE_THRESHOLD:
-                logger.debug(
-                    f"Low confidence - pulse_conf={pulse_conf:.2f}, "
-                    f"breathing_conf={breathing_conf:.2f} (needed >= {config.CONFIDENCE_THRESHOLD})"
-                )
+                logger.debug("Low confidence - pulse_conf=%.2f, breathing_conf=%.2f (needed >= %s)",
+                             pulse_conf, breathing_conf, config.CONFIDENCE_THRESHOLD)
+                if self.is_currently_abnormal:
+                    TO_NORMAL.inc()
+                self.active_rules = []
                 self._reset_abnormal_state()
                 return False
 
-            # Check abnormality
-            is_abnormal = self._is_abnormal(pulse, breathing)
+            # Check abnormality (updates the patient's rule state)
+            self.active_rules = self.engine.check(self.rule_state, vitals, now)
+            is_abnormal = bool(self.active_rules)
+            if self.baseline.due(now):
+                self._learn([vitals], [now])
 
             # Log exactly how close it is to abnormal thresholds
-            logger.debug(
-                f"Vital check → pulse={pulse}, breathing={breathing}, "
-                f"pulse_conf={pulse_conf:.2f}, breathing_conf={breathing_conf:.2f}"
-            )
+            logger.debug("Vital check → pulse=%s, breathing=%s, pulse_conf=%.2f, breathing_conf=%.2f",
+                         pulse, breathing, pulse_conf, breathing_conf)
 
             if is_abnormal:
                 # If newly abnormal
                 if not self.is_currently_abnormal:
+                    TO_ABNORMAL.inc()
                     self.is_currently_abnormal = True
-                    self.abnormal_start_time = time.time()
+                    self.abnormal_start_time = now
                     logger.warning(
-                        f"⚠️ Abnormal vitals detected — pulse={pulse}, breathing={breathing}. "
-                        f"Starting abnormal timer."
+                        f"⚠️ Abnormal vitals detected — pulse={pulse}, breathing={breathing} "
+                        f"({', '.join(self.active_rules)}). Starting abnormal timer."
                     )
                 else:
                     # Still abnormal — compute duration + progress toward alert
-                    duration = time.time() - self.abnormal_start_time
+                    duration = now - self.abnormal_start_time
                     remaining = max(0, config.ABNORMAL_DURATION_THRESHOLD - duration)
                     progress = min(1.0, duration / config.ABNORMAL_DURATION_THRESHOLD) * 100
 
-                    logger.debug(
-                        f"Abnormal for {duration:.1f}s "
-                        f"({progress:.0f}% toward alert, {remaining:.1f}s remaining)"
-                    )
+                    logger.debug("Abnormal for %.1fs (%.0f%% toward alert, %.1fs remaining)",
+                                 duration, progress, remaining)
 
                     if duration >= config.ABNORMAL_DURATION_THRESHOLD:
                         logger.error(
@@ -97,40 +141,206 @@ class VitalsMonitor:
                             f"(threshold = {config.ABNORMAL_DURATION_THRESHOLD}s)"
                         )
 
-                        if self.alert_callback:
-                            threading.Thread(
-                                target=self.alert_callback,
-                                args=(self.last_vitals.copy(),),
-                                daemon=True
-                            ).start()
-
+                        TO_ALERT.inc()
+                        self._dispatch_alert(self.last_vitals, trace)
                         self._reset_abnormal_state()
                         return True
             else:
                 # Vitals returned to normal
                 if self.is_currently_abnormal:
+                    TO_NORMAL.inc()
                     logger.info("✓ Vitals returned to normal before alert threshold was reached.")
                 self._reset_abnormal_state()
 
             return is_abnormal
     
-    def _is_abnormal(self, pulse: int, breathing: int) -> bool:
-        """Check if vitals are outside normal ranges"""
-        pulse_abnormal = pulse < config.PULSE_MIN or pulse > config.PULSE_MAX
-        breathing_abnormal = breathing < config.BREATHING_MIN or breathing > config.BREATHING_MAX
-        
-        return pulse_abnormal or breathing_abnormal
+    def check_batch(self, samples: List[Dict], times: Optional[Sequence[float]] = None,
+                    trace: Optional[Trace] = None) -> bool:
+        """
+        Check a batch of samples in one vectorized pass
+
+        Equivalent to calling check_vitals on each sample in order, but the
+        threshold checks and sustained-abnormal durations are computed with
+        NumPy and the lock is taken once for the whole batch.
+
+        Args:
+            samples: Vitals dictionaries, oldest first
+            times: Sample times in epoch seconds (defaults to now for all)
+            trace: Trace to record prepare/lock wait/check stages on (None when not traced)
+
+        Returns:
+            True if any sample in the batch triggered an alert (as check_vitals
+            returns True for the triggering sample) or vitals are still abnormal
+            after the last sample, False otherwise
+        """
+        count = len(samples)
+        if count == 0:
+            return self.is_currently_abnormal
+        if count == 1:
+            return self.check_vitals(samples[0], None if times is None else times[0], trace)
+
+        start = time.perf_counter()
+        is_abnormal = self._check_batch(samples, times, trace)
+        CHECK_SECONDS_BATCH.observe(time.perf_counter() - start)
+        if trace is not None:
+            trace.mark('check')
+        return is_abnormal
+
+    def _check_batch(self, samples: List[Dict], times: Optional[Sequence[float]],
+                     trace: Optional[Trace]) -> bool:
+        """check_batch for two or more samples, without the latency measurement"""
+        count = len(samples)
+
+        pulse = np.fromiter((s.get('pulse_rate', 0) for s in samples), np.float64, count)
+        breathing = np.fromiter((s.get('breathing_rate', 0) for s in samples), np.float64, count)
+        pulse_conf = np.fromiter((s.get('pulse_confidence', 0.0) for s in samples), np.float64, count)
+        breathing_conf = np.fromiter((s.get('breathing_confidence', 0.0) for s in samples), np.float64, count)
+        times = np.full(count, time.time()) if times is None else np.asarray(times, dtype=np.float64)
+
+        # Low confidence readings reset the abnormal timer (and skip the rules), like check_vitals
+        confident = (pulse_conf >= config.CONFIDENCE_THRESHOLD) & (breathing_conf >= config.CONFIDENCE_THRESHOLD)
+        indices = np.arange(count)
+        if trace is not None:
+            trace.mark('prepare')
+
+        with self.lock:
+            if trace is not None:
+                trace.mark('lock_wait')
+            abnormal = self._rules_mask(pulse, breathing, pulse_conf, breathing_conf, times, confident)
+            if self.baseline.due(times[-1]):
+                picked = np.flatnonzero(confident)
+                self._learn([samples[i] for i in picked], times[picked].tolist())
+            self.last_vitals = samples[-1].copy()
+            start = 0
+            alerted = False
+            while start < count:
+                segment = abnormal[start:]
+                segment_indices = indices[start:]
+
+                # First index of the abnormal run each sample belongs to
+                # (only meaningful where the sample itself is abnormal)
+                breaks = np.where(segment, -1, segment_indices)
+                run_first = np.minimum(np.maximum(np.maximum.accumulate(breaks) + 1, start), segment_indices)
+                carried = (run_first == start) & self.is_currently_abnormal
+                run_start_time = np.where(carried, self.abnormal_start_time or 0.0, times[run_first])
+                duration = times[start:] - run_start_time
+
+                # The first sample of a new run only starts the timer
+                starts_run = (run_first == segment_indices) & ~carried
+                trigger = segment & ~starts_run & (duration >= config.ABNORMAL_DURATION_THRESHOLD)
+
+                # Count state transitions up to (and including) the first trigger
+                end = int(np.argmax(trigger)) + 1 if trigger.any() else len(segment)
+                previous = np.empty(end, dtype=bool)
+                previous[0] = self.is_currently_abnormal
+                previous[1:] = segment[:end - 1]
+                entered = int((segment[:end] & ~previous).sum())
+                left = int((~segment[:end] & previous).sum())
+                if entered:
+                    TO_ABNORMAL.inc(entered)
+                if left:
+                    TO_NORMAL.inc(left)
+
+                if not trigger.any():
+                    if segment[-1]:
+                        if not self.is_currently_abnormal or not carried[-1]:
+                            logger.warning(
+                                f"⚠️ Abnormal vitals detected in batch — pulse={pulse[-1]:.0f}, "
+                                f"breathing={breathing[-1]:.0f}. Starting abnormal timer."
+                            )
+                        self.is_currently_abnormal = True
+                        self.abnormal_start_time = float(run_start_time[-1])
+                    else:
+                        if self.is_currently_abnormal and not alerted:
+                            logger.info("✓ Vitals returned to normal before alert threshold was reached.")
+                        self._reset_abnormal_state()
+                    break
+
+                hit = int(np.argmax(trigger))
+                index = start + hit
+                logger.error(
+                    f"🚨 ALERT TRIGGERED — Abnormal sustained for {duration[hit]:.1f}s "
+                    f"(threshold = {config.ABNORMAL_DURATION_THRESHOLD}s, batch of {count})"
+                )
+                TO_ALERT.inc()
+                self._dispatch_alert(samples[index], trace)
+                self._reset_abnormal_state()
+                alerted = True
+                start = index + 1
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Batch check → %d samples, %d abnormal, %d low confidence",
+                             count, int(abnormal.sum()), int(count - confident.sum()))
+            return alerted or self.is_currently_abnormal
+
+    def _dispatch_alert(self, vitals: Dict, trace: Optional[Trace] = None):
+        """Run the alert callback on the shared alert executor"""
+        if self.alert_callback:
+            if trace is None:
+                accepted = alert_executor.submit(self.patient_id, self.alert_callback, vitals.copy())
+            else:
+                alert_trace = trace.fork()
+                alert_trace.last = time.perf_counter()  # dispatch is measured from submission
+                accepted = alert_executor.submit(self.patient_id, self._traced_alert, vitals.copy(), alert_trace)
+            if not accepted:
+                logger.error(f"Alert callback for patient {self.patient_id} refused - alert executor is full")
+
+    def _traced_alert(self, vitals: Dict, trace: Trace):
+        """Run the alert callback, recording executor wait and AlertManager time on the trace"""
+        trace.mark('dispatch')
+        try:
+            self.alert_callback(vitals)
+        finally:
+            trace.mark('alert')
+            trace.finish('alert_total')
+
+    def _rules_mask(self, pulse: np.ndarray, breathing: np.ndarray, pulse_conf: np.ndarray,
+                    breathing_conf: np.ndarray, times: np.ndarray, confident: np.ndarray) -> np.ndarray:
+        """Run the anomaly rules over the confident samples of a batch (call with the lock held)"""
+        if not confident.all():
+            picked = np.flatnonzero(confident)
+            pulse, breathing, pulse_conf, breathing_conf, times = (
+                pulse[picked], breathing[picked], pulse_conf[picked], breathing_conf[picked], times[picked])
+        mask, active = self.engine.check_batch(
+            self.rule_state,
+            {'pulse_rate': pulse, 'breathing_rate': breathing},
+            times,
+            {'pulse_confidence': pulse_conf, 'breathing_confidence': breathing_conf}
+        )
+        self.active_rules = active if confident[-1] else []
+        if len(mask) == len(confident):
+            return mask
+        abnormal = np.zeros(len(confident), dtype=bool)
+        abnormal[confident] = mask
+        return abnormal
     
+    def _learn(self, samples: List[Dict], times: Sequence[float]):
+        """
+        Fold confident samples into the patient's baseline (at most one per update
+        interval) and refresh the adaptive thresholds; call with the lock held
+        """
+        updated = False
+        for vitals, t in zip(samples, times):
+            updated |= self.baseline.update(vitals, t)
+        if updated:
+            self.engine.set_limits(self.rule_state, self.baseline.thresholds())
+
     def _reset_abnormal_state(self):
         """Reset abnormal tracking"""
         self.is_currently_abnormal = False
         self.abnormal_start_time = None
     
     def get_status(self) -> Dict:
-        """Get current monitoring status"""
-        with self.lock:
-            return {
-                'is_abnormal': self.is_currently_abnormal,
-                'abnormal_duration': time.time() - self.abnormal_start_time if self.abnormal_start_time else 0,
-                'last_vitals': self.last_vitals
-            }
+        """
+        Get current monitoring status
+
+        Lock-free: each field is read once, so API readers never wait on
+        check_vitals running on the ingestion path.
+        """
+        abnormal_start_time = self.abnormal_start_time
+        return {
+            'is_abnormal': self.is_currently_abnormal,
+            'abnormal_duration': time.time() - abnormal_start_time if abnormal_start_time else 0,
+            'active_rules': self.active_rules,
+            'last_vitals': self.last_vitals
+        }
@@ -0,0 +1,173 @@
+"""
+Vitals State Store
+Keyed, sharded store holding latest vitals, monitor and alert state per patient
+"""
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+from services.alert_manager import AlertManager
+from services.vitals_history import VitalsHistory
+from services.vitals_monitor import VitalsMonitor
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+# Returned for patients that have not sent any data yet
+EMPTY_VITALS = {
+    "pulse_rate": 0,
+    "pulse_confidence": 0.0,
+    "breathing_rate": 0,
+    "breathing_confidence": 0.0,
+    "talking": False,
+    "timestamp": None,
+    "status": "waiting"
+}
+
+
+class PatientState:
+    """
+    Everything tracked for one monitored patient/stream
+
+    `vitals` is an immutable snapshot: writers publish a new dict instead of
+    mutating it, so readers can use it without taking any lock.
+    """
+
+    __slots__ = ('patient_id', 'vitals', 'monitor', 'alert_manager', 'history', 'updated_at')
+
+    def __init__(self, patient_id: str, monitor: VitalsMonitor, alert_manager: AlertManager):
+        self.patient_id = patient_id
+        self.vitals = dict(EMPTY_VITALS, patient_id=patient_id)
+        self.monitor = monitor
+        self.alert_manager = alert_manager
+        self.history = VitalsHistory()
+        self.updated_at: Optional[float] = None
+
+
+def _default_alert_manager_factory(patient_id: str) -> AlertManager:
+    return AlertManager(patient_id=patient_id)
+
+
+def _default_monitor_factory(patient_id: str, alert_manager: AlertManager) -> VitalsMonitor:
+    return VitalsMonitor(alert_callback=alert_manager.trigger_alert, patient_id=patient_id)
+
+
+class VitalsStore:
+    """
+    Per-patient state split across lock shards
+
+    Shard locks are only taken by writers (creating a patient, publishing a
+    new vitals snapshot). Readers look up the state and read its current
+    snapshot lock-free, so API reads never wait on the ingestion path.
+    """
+
+    def __init__(self, num_shards: int = config.STORE_SHARDS,
+                 alert_manager_factory: Callable[[str], AlertManager] = _default_alert_manager_factory,
+                 monitor_factory: Callable[[str, AlertManager], VitalsMonitor] = _default_monitor_factory):
+        """
+        Args:
+            num_shards: Number of independently locked shards
+            alert_manager_factory: Builds the AlertManager for a new patient
+            monitor_factory: Builds the VitalsMonitor for a new patient
+        """
+        self.num_shards = max(1, num_shards)
+        self._shards: List[Dict[str, PatientState]] = [{} for _ in range(self.num_shards)]
+        self._locks = [threading.Lock() for _ in range(self.num_shards)]
+        self.alert_manager_factory = alert_manager_factory
+        self.monitor_factory = monitor_factory
+
+        logger.info(f"VitalsStore initialized with {self.num_shards} shards")
+
+    def _shard_index(self, patient_id: str) -> int:
+        return zlib.crc32(patient_id.encode('utf-8')) % self.num_shards
+
+    def get(self, patient_id: str) -> Optional[PatientState]:
+        """Get a patient's state without locking (None if unknown)"""
+        return self._shards[self._shard_index(patient_id)].get(patient_id)
+
+    def get_or_create(self, patient_id: str) -> PatientState:
+        """Get a patient's state, creating its monitor and alert manager on first use"""
+        index = self._shard_index(patient_id)
+        state = self._shards[index].get(patient_id)
+        if state is not None:
+            return state
+
+        with self._locks[index]:
+            state = self._shards[index].get(patient_id)
+            if state is None:
+                alert_manager = self.alert_manager_factory(patient_id)
+                monitor = self.monitor_factory(patient_id, alert_manager)
+                state = PatientState(patient_id, monitor, alert_manager)
+                self._shards[index][patient_id] = state
+                logger.info(f"Now monitoring patient {patient_id}")
+            return state
+
+    def update_vitals(self, patient_id: str, vitals: Dict) -> PatientState:
+        """
+        Publish a new vitals snapshot for a patient and record it in history
+
+        Args:
+            patient_id: Patient/stream id
+            vitals: Validated vitals fields to merge into the snapshot
+
+        Returns:
+            The patient's state
+        """
+        state = self.get_or_create(patient_id)
+        with self._locks[self._shard_index(patient_id)]:
+            snapshot = {**state.vitals, **vitals}
+            snapshot['status'] = 'active'
+            state.vitals = snapshot
+            state.updated_at = time.time()
+        state.history.append(vitals, state.updated_at)
+        return state
+
+    def update_batch(self, patient_id: str, samples: List[Dict],
+                     timestamps: Optional[List[float]] = None) -> PatientState:
+        """
+        Publish a batch of samples for a patient
+
+        The newest sample becomes the snapshot and every sample is recorded
+        in history with one vectorized write.
+
+        Args:
+            patient_id: Patient/stream id
+            samples: Validated vitals dictionaries, oldest first
+            timestamps: Sample times in epoch seconds (defaults to now)
+
+        Returns:
+            The patient's state
+        """
+        state = self.get_or_create(patient_id)
+        with self._locks[self._shard_index(patient_id)]:
+            snapshot = {**state.vitals, **samples[-1]}
+            snapshot['status'] = 'active'
+            state.vitals = snapshot
+            state.updated_at = time.time()
+        state.history.extend(samples, timestamps)
+        return state
+
+    def get_latest_vitals(self, patient_id: str) -> Dict:
+        """Get a copy of a patient's latest vitals (lock-free)"""
+        state = self.get(patient_id)
+        if state is None:
+            return dict(EMPTY_VITALS, patient_id=patient_id)
+        return dict(state.vitals)
+
+    def patient_ids(self) -> List[str]:
+        """Get the ids of all known patients"""
+        ids = []
+        for shard in self._shards:
+            ids.extend(list(shard.keys()))
+        return ids
+
+    def states(self) -> List[PatientState]:
+        """Get the state of all known patients"""
+        result = []
+        for shard in self._shards:
+            result.extend(list(shard.values()))
+        return result
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
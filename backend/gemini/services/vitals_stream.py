@@ -0,0 +1,115 @@
+"""
+Vitals Stream Service
+Fans validated vitals samples out to push subscribers (Server-Sent Events)
+"""
+import json
+import queue
+import threading
+from typing import Dict, Optional
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger(__name__)
+
+# Subscribe with this patient id to receive every patient's samples
+ALL_PATIENTS = '*'
+
+
+class Subscription:
+    """
+    One push client's bounded event queue
+
+    When the client falls behind, the oldest queued event is dropped so a
+    stalled browser never blocks the publisher.
+    """
+
+    def __init__(self, patient_id: str, maxsize: int = config.STREAM_CLIENT_QUEUE_SIZE):
+        self.patient_id = patient_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: str):
+        """Queue an encoded event, dropping the oldest one if full"""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[str]:
+        """Wait for the next event (None on timeout)"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class VitalsBroadcaster:
+    """
+    Publishes each sample to every matching subscriber
+
+    Events are JSON-encoded once per sample and shared by all subscribers.
+    The subscriber list is copy-on-write, so publishing never takes a lock.
+    """
+
+    def __init__(self):
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, patient_id: str = ALL_PATIENTS) -> Subscription:
+        """Register a new subscriber for one patient (or ALL_PATIENTS)"""
+        subscription = Subscription(patient_id)
+        with self._lock:
+            self._subscribers = self._subscribers + (subscription,)
+        logger.info(f"Stream subscriber added for {patient_id} ({self.subscriber_count} total)")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a subscriber"""
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
+        logger.info(f"Stream subscriber for {subscription.patient_id} removed "
+                    f"({subscription.dropped} events dropped, {self.subscriber_count} remaining)")
+
+    def publish(self, patient_id: str, payload: Dict):
+        """
+        Send a sample to all subscribers of its patient
+
+        Args:
+            patient_id: Patient the sample belongs to
+            payload: JSON-serialisable sample
+        """
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+
+        event = None
+        for subscription in subscribers:
+            if subscription.patient_id != ALL_PATIENTS and subscription.patient_id != patient_id:
+                continue
+            if event is None:
+                event = format_event(payload)
+            subscription.offer(event)
+        self.published += 1
+
+
+def format_event(payload: Dict, event: Optional[str] = None) -> str:
+    """Encode a payload as a Server-Sent Events message"""
+    data = json.dumps(payload, separators=(',', ':'))
+    if event:
+        return f"event: {event}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
+
+# Shared broadcaster for the backend process
+vitals_broadcaster = VitalsBroadcaster()
@@ -0,0 +1,223 @@
+"""
+Voice Agent Client
+Pooled keep-alive HTTP client for the ElevenLabs voice agent server,
+with connect retries, a circuit breaker and latency tracking
+"""
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.logger import setup_logger
+from utils.metrics import Histogram
+import config
+
+logger = setup_logger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a service that keeps failing
+
+    closed    - calls go through; `failure_threshold` consecutive failures open it
+    open      - calls are refused immediately until `reset_timeout` has passed
+    half_open - one trial call goes through; success closes, failure re-opens
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether a call may go through now"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial_in_flight = False
+            if self.state == 'half_open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                logger.info("✓ Voice agent reachable again - circuit closed")
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.error(f"⚠ Voice agent failing ({self.failures} consecutive errors) - "
+                                 f"circuit open for {self.reset_timeout:.0f}s")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class VoiceAgentClient:
+    """
+    Shared client for the voice agent's HTTP API (scribe_realtime.py)
+
+    One requests.Session with a bounded connection pool is reused for every
+    call, so alerts after the first skip TCP setup. Connection errors are
+    retried with backoff (the request never reached the server, so a retried
+    POST cannot start a second session); read timeouts and HTTP errors are
+    not retried.
+    """
+
+    def __init__(self, base_url: str = config.VOICE_AGENT_URL,
+                 connect_timeout: float = config.VOICE_AGENT_CONNECT_TIMEOUT,
+                 read_timeout: float = config.VOICE_AGENT_READ_TIMEOUT,
+                 pool_size: int = config.VOICE_AGENT_POOL_SIZE,
+                 retries: int = config.VOICE_AGENT_RETRIES,
+                 backoff: float = config.VOICE_AGENT_BACKOFF,
+                 breaker_threshold: int = config.VOICE_AGENT_BREAKER_THRESHOLD,
+                 breaker_reset: float = config.VOICE_AGENT_BREAKER_RESET):
+        """
+        Args:
+            base_url: Voice agent server root, e.g. http://localhost:7000
+            connect_timeout: Seconds to wait for a TCP connection
+            read_timeout: Seconds to wait for a response once connected
+            pool_size: Keep-alive connections held open to the voice agent
+            retries: Connection attempts retried before giving up
+            backoff: Backoff factor between connection retries (seconds)
+            breaker_threshold: Consecutive failures before calls are short-circuited
+            breaker_reset: Seconds the circuit stays open before a trial call
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.latency = Histogram('voice_agent_request_seconds', 'Voice agent HTTP request latency')
+
+        retry = Retry(total=retries, connect=retries, read=0, status=0, other=0,
+                      backoff_factor=backoff, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.short_circuited = 0
+
+        logger.info(f"VoiceAgentClient initialized - {self.base_url}, pool {pool_size}, "
+                    f"timeout {connect_timeout}s/{read_timeout}s")
+
+    def trigger_alert(self, patient_id: str, vitals: Dict, alert_id: Optional[int] = None,
+                      callback_url: Optional[str] = None) -> Dict:
+        """
+        Ask the voice agent to start an emergency conversation
+
+        Args:
+            patient_id: Patient the alert is for
+            vitals: Vitals that triggered the alert
+            alert_id: Alert id the agent should echo back with the outcome
+            callback_url: URL the agent should POST the outcome to when the session ends
+
+        Returns:
+            The voice agent's JSON reply, or {"error": ...} on failure
+        """
+        payload = {
+            "patient_id": patient_id,
+            "vitals": {
+                "heart_rate": vitals.get("pulse_rate"),
+                "breathing_rate": vitals.get("breathing_rate"),
+                "pulse_confidence": vitals.get("pulse_confidence"),
+                "breathing_confidence": vitals.get("breathing_confidence")
+            }
+        }
+        if alert_id is not None:
+            payload["alert_id"] = alert_id
+        if callback_url:
+            payload["callback_url"] = callback_url
+        return self._request('POST', '/api/trigger-alert', json=payload)
+
+    def get_status(self) -> Dict:
+        """Get the voice agent's current session status"""
+        return self._request('GET', '/api/status')
+
+    def _request(self, method: str, path: str, **kwargs) -> Dict:
+        """Send one request through the breaker, recording latency and errors"""
+        if not self.breaker.allow():
+            with self.stats_lock:
+                self.short_circuited += 1
+            return {"error": "Voice agent unavailable (circuit open)"}
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except Exception as e:  # not only RequestException: the breaker must hear back or a half-open trial sticks
+            self.latency.observe(time.perf_counter() - start)
+            self.breaker.record_failure()
+            with self.stats_lock:
+                self.requests += 1
+                self.errors += 1
+            logger.error(f"Error contacting emergency conversation server: {e}")
+            return {"error": str(e)}
+        self.latency.observe(time.perf_counter() - start)
+
+        with self.stats_lock:
+            self.requests += 1
+            if not response.ok:
+                self.errors += 1
+
+        # 5xx means the agent is unhealthy; 4xx (e.g. 409 session in progress) means it answered
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if not response.ok:
+            message = body.get('message') if isinstance(body, dict) else None
+            logger.error(f"Voice agent returned {response.status_code} for {path}: {message or response.reason}")
+            return {"error": message or f"HTTP {response.status_code}", "status_code": response.status_code}
+        return body
+
+    def get_stats(self) -> Dict:
+        """Get request/error counts, breaker state and latency percentiles (ms)"""
+        latency = self.latency.snapshot()
+        with self.stats_lock:
+            stats = {
+                'base_url': self.base_url,
+                'requests': self.requests,
+                'errors': self.errors,
+                'short_circuited': self.short_circuited,
+            }
+        stats['circuit'] = self.breaker.state
+        stats['consecutive_failures'] = self.breaker.failures
+        stats['latency_ms'] = {
+            'count': latency['count'],
+            'mean': round(latency['mean'] * 1000, 3),
+            'p50': round(latency['p50'] * 1000, 3),
+            'p95': round(latency['p95'] * 1000, 3),
+            'p99': round(latency['p99'] * 1000, 3),
+            'max': round(latency['max'] * 1000, 3),
+        }
+        return stats
+
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+
+# Shared client (one connection pool for every patient's AlertManager)
+voice_agent_client = VoiceAgentClient()
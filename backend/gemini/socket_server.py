@@ -1,33 +1,39 @@
-import socket
-import json
+import asyncio
 import threading
+import time
+from typing import Dict, List, Optional
+from services.vitals_store import EMPTY_VITALS
+from services.ingest_pipeline import process_batch
+from vitals_protocol import (
+    BINARY_HANDSHAKE, BinaryFrameDecoder, LineDecoder, ValidationError, VitalsSample,
+    decode_line, sample_from_message, samples_from_batch
+)
 from utils.logger import setup_logger
+from utils.metrics import Counter
+from utils.tracing import Trace, tracer
 import config
 
 logger = setup_logger(__name__)
 
-# Store latest vitals data
-latest_vitals = {
-    "pulse_rate": 0,
-    "pulse_confidence": 0.0,
-    "breathing_rate": 0,
-    "breathing_confidence": 0.0,
-    "talking": False,
-    "timestamp": None,
-    "status": "waiting"
-}
-
-# Thread lock for vitals data
-vitals_lock = threading.Lock()
-
-# VitalsMonitor instance (set by main.py)
-vitals_monitor = None
-
-def set_vitals_monitor(monitor):
-    """Set the vitals monitor instance"""
-    global vitals_monitor
-    vitals_monitor = monitor
-    logger.info("VitalsMonitor connected to socket server")
+INGEST_SAMPLES = Counter('ingest_samples_total', 'Vitals samples received from producers')
+INGEST_PARSE_ERRORS = Counter('ingest_parse_errors_total', 'Protocol lines that were not valid JSON')
+INGEST_REJECTED = Counter('ingest_rejected_total', 'Messages or samples that failed validation')
+
+# Per-patient state store and evaluation pipeline (set by main.py)
+vitals_store = None
+ingest_pipeline = None
+
+def set_vitals_store(store):
+    """Set the per-patient vitals state store"""
+    global vitals_store
+    vitals_store = store
+    logger.info("VitalsStore connected to socket server")
+
+def set_ingest_pipeline(pipeline):
+    """Set the queue/worker stage that evaluates received samples"""
+    global ingest_pipeline
+    ingest_pipeline = pipeline
+    logger.info("IngestPipeline connected to socket server")
 
 def validate_vitals(vitals: dict) -> bool:
     """
@@ -39,96 +45,238 @@ def validate_vitals(vitals: dict) -> bool:
     Returns:
         True if valid, False otherwise
     """
-    required_fields = ['pulse_rate', 'breathing_rate', 'pulse_confidence', 'breathing_confidence']
-    
-    # Check required fields
-    for field in required_fields:
-        if field not in vitals:
-            logger.warning(f"Missing required field: {field}")
-            return False
-    
-    # Check data types and ranges
     try:
-        pulse = int(vitals['pulse_rate'])
-        breathing = int(vitals['breathing_rate'])
-        pulse_conf = float(vitals['pulse_confidence'])
-        breathing_conf = float(vitals['breathing_confidence'])
-        
-        # Sanity checks (very wide ranges to catch obvious errors)
-        if not (0 <= pulse <= 300):
-            logger.warning(f"Pulse out of range: {pulse}")
-            return False
-        
-        if not (0 <= breathing <= 100):
-            logger.warning(f"Breathing out of range: {breathing}")
-            return False
-        
+        sample_from_message(vitals)
         return True
-    
-    except (ValueError, TypeError) as e:
-        logger.warning(f"Invalid data types: {e}")
+    except ValidationError as e:
+        logger.warning(str(e))
         return False
 
 
-def socket_server():
-    """Background thread to receive vitals data from SmartSpectra (WSL)"""
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind((config.SOCKET_HOST, config.SOCKET_PORT))
-    server_socket.listen(1)
-    
+class ProducerConnection:
+    """
+    State for one connected SmartSpectra producer
+
+    Each connection keeps its own receive buffer so partial lines from one
+    producer never mix with another's, and carries the source/patient id
+    used to tag every sample it sends.
+    """
+
+    def __init__(self, peer):
+        self.source_id = f"{peer[0]}:{peer[1]}" if peer else "unknown"
+        self.patient_id = config.DEFAULT_PATIENT_ID
+        self.decoder = None  # chosen from the first byte received
+        self.wire_format = None
+        self.samples_received = 0
+        self.parse_errors = 0
+        self.rejected = 0
+        self.connected_at = time.time()
+
+    def feed(self, data: bytes):
+        """
+        Handle every complete message in a chunk of received bytes
+
+        Raises:
+            ValidationError: If a binary stream is malformed
+        """
+        if self.decoder is None:
+            if data[0] == BINARY_HANDSHAKE:
+                self.decoder = BinaryFrameDecoder()
+                self.wire_format = 'binary'
+            else:
+                self.decoder = LineDecoder()
+                self.wire_format = 'json'
+            logger.info(f"Producer {self.source_id} using {self.wire_format} wire format")
+
+        trace = tracer.begin(self.patient_id)
+        received_at = time.time()
+        if self.wire_format == 'json':
+            lines = self.decoder.feed(data)
+            if trace is not None:
+                trace.lap('recv')
+            samples = []
+            for line in lines:
+                samples.extend(self.parse_line(line, received_at, trace))
+                if trace is not None:
+                    trace.lap('validate')
+        else:
+            rejected = self.decoder.rejected
+            samples = self.decoder.feed(data, received_at)
+            if trace is not None:
+                trace.lap('parse')
+            self.rejected += self.decoder.rejected - rejected
+            INGEST_REJECTED.inc(self.decoder.rejected - rejected)
+            if self.decoder.patient_id and self.decoder.patient_id != self.patient_id:
+                self.patient_id = self.decoder.patient_id
+                logger.info(f"Producer {self.source_id} identified as patient {self.patient_id}")
+
+        if trace is not None:
+            trace.flush_laps()
+        if samples:
+            self.handle_samples(samples, trace)
+
+    def parse_line(self, line: bytes, received_at: float, trace: Optional[Trace] = None) -> List[VitalsSample]:
+        """Decode and validate one newline-terminated JSON message (sample, batch or hello)"""
+        try:
+            message = decode_line(line)
+        except ValidationError as e:
+            self.parse_errors += 1
+            INGEST_PARSE_ERRORS.inc()
+            logger.error(f"✗ Invalid JSON from {self.source_id}: {line[:200]!r} - {e}")
+            return []
+        if trace is not None:
+            trace.lap('parse')
+
+        # Batch: [sample, ...] or {"type": "batch", "samples": [...]}
+        if isinstance(message, list) or (isinstance(message, dict) and message.get('type') == 'batch'):
+            try:
+                samples, rejected = samples_from_batch(message, received_at)
+            except ValidationError as e:
+                self.rejected += 1
+                INGEST_REJECTED.inc()
+                logger.warning(f"Invalid batch from {self.source_id} - skipping: {e}")
+                return []
+            if rejected:
+                self.rejected += rejected
+                INGEST_REJECTED.inc(rejected)
+                logger.warning(f"Skipped {rejected} invalid samples in batch from {self.source_id}")
+            for sample in samples:
+                if sample.patient_id is None:
+                    sample.patient_id = self.patient_id
+            return samples
+
+        if not isinstance(message, dict):
+            self.rejected += 1
+            INGEST_REJECTED.inc()
+            logger.warning(f"Unexpected message from {self.source_id} - skipping")
+            return []
+
+        # Hello message: {"type": "hello", "patient_id": "..."}
+        if message.get('type') == 'hello':
+            self.patient_id = str(message.get('patient_id') or self.patient_id)
+            logger.info(f"Producer {self.source_id} identified as patient {self.patient_id}")
+            return []
+
+        try:
+            sample = sample_from_message(message)
+        except ValidationError as e:
+            self.rejected += 1
+            INGEST_REJECTED.inc()
+            logger.warning(f"Invalid vitals data from {self.source_id} - skipping: {e}")
+            return []
+
+        if sample.patient_id is None:
+            sample.patient_id = self.patient_id
+        sample.received_at = received_at
+        return [sample]
+
+    def handle_samples(self, samples: List[VitalsSample], trace: Optional[Trace] = None):
+        """Group decoded samples by patient (keeping order) and process each group as a batch"""
+        batches: Dict[str, List[VitalsSample]] = {}
+        for sample in samples:
+            batches.setdefault(sample.patient_id or self.patient_id, []).append(sample)
+        for patient_id, batch in batches.items():
+            self.handle_batch(patient_id, batch, None if trace is None else trace.fork(patient_id))
+
+    def handle_batch(self, patient_id: str, samples: List[VitalsSample], trace: Optional[Trace] = None):
+        """Queue a batch of validated samples for one patient for evaluation"""
+        self.samples_received += len(samples)
+        INGEST_SAMPLES.inc(len(samples))
+
+        if vitals_store is None:
+            logger.warning("No VitalsStore connected - dropping samples")
+            return
+
+        batch = []
+        for sample in samples:
+            vitals = sample.as_dict()
+            vitals['patient_id'] = patient_id
+            vitals['source_id'] = self.source_id
+            batch.append(vitals)
+        times = [sample.received_at for sample in samples]
+
+        last = samples[-1]
+        logger.debug("Vitals [%s] x%d - Pulse: %s BPM (conf: %.2f), Breathing: %s BPM (conf: %.2f), Talking: %s",
+                     patient_id, len(samples), last.pulse_rate, last.pulse_confidence,
+                     last.breathing_rate, last.breathing_confidence, last.talking)
+
+        # Hand off to the evaluation workers (or evaluate inline without a pipeline)
+        if ingest_pipeline is not None:
+            ingest_pipeline.submit(patient_id, batch, times, trace)
+        else:
+            process_batch(vitals_store, patient_id, batch, times, trace)
+
+
+# Connected producers, keyed by source id (only touched on the event loop)
+connections = {}
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve one producer connection until it disconnects"""
+    conn = ProducerConnection(writer.get_extra_info('peername'))
+    connections[conn.source_id] = conn
+    logger.info(f"Connection from {conn.source_id} ({len(connections)} active)")
+
+    try:
+        while True:
+            data = await reader.read(config.SOCKET_READ_SIZE)
+            if not data:
+                break
+
+            conn.feed(data)
+
+    except (ConnectionResetError, asyncio.IncompleteReadError) as e:
+        logger.warning(f"Connection {conn.source_id} dropped: {e}")
+    except ValidationError as e:
+        logger.error(f"✗ Malformed {conn.wire_format} stream from {conn.source_id} - closing: {e}")
+    except Exception as e:
+        logger.error(f"Socket error on {conn.source_id}: {e}", exc_info=True)
+    finally:
+        connections.pop(conn.source_id, None)
+        writer.close()
+        logger.info(f"Connection {conn.source_id} closed after {conn.samples_received} samples "
+                    f"({conn.parse_errors} parse errors, {conn.rejected} rejected)")
+
+
+async def _serve():
+    """Accept SmartSpectra producers concurrently on one event loop"""
+    server = await asyncio.start_server(
+        _handle_connection,
+        config.SOCKET_HOST,
+        config.SOCKET_PORT,
+        backlog=config.SOCKET_BACKLOG,
+        reuse_address=True
+    )
+
     logger.info(f"Socket server listening on {config.SOCKET_HOST}:{config.SOCKET_PORT}")
     logger.info(f"SmartSpectra should connect to: 172.26.64.1:{config.SOCKET_PORT}")
-    
-    while True:
-        try:
-            conn, addr = server_socket.accept()
-            logger.info(f"Connection from {addr}")
-            
-            buffer = ""
-            while True:
-                data = conn.recv(1024).decode('utf-8')
-                if not data:
-                    break
-                
-                logger.debug(f"Raw data received: {data}")
-                
-                buffer += data
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    logger.debug(f"Processing line: {line}")
-                    
-                    try:
-                        vitals = json.loads(line)
-                        
-                        # Validate vitals data
-                        if not validate_vitals(vitals):
-                            logger.warning("Invalid vitals data - skipping")
-                            continue
-                        
-                        # Update stored vitals (thread-safe)
-                        with vitals_lock:
-                            latest_vitals.update(vitals)
-                            latest_vitals['status'] = 'active'
-                        
-                        logger.info(f"✓ Vitals - Pulse: {vitals.get('pulse_rate')} BPM "
-                                   f"(conf: {vitals.get('pulse_confidence'):.2f}), "
-                                   f"Breathing: {vitals.get('breathing_rate')} BPM "
-                                   f"(conf: {vitals.get('breathing_confidence'):.2f}), "
-                                   f"Talking: {vitals.get('talking')}")
-                        
-                        # Check with vitals monitor
-                        if vitals_monitor:                            
-                            vitals_monitor.check_vitals(vitals)
-                    
-                    except json.JSONDecodeError as e:
-                        logger.error(f"✗ Invalid JSON: {line} - Error: {e}")
-            
-            conn.close()
-            logger.info("Connection closed")
-        
-        except Exception as e:
-            logger.error(f"Socket error: {e}", exc_info=True)
+
+    async with server:
+        await server.serve_forever()
+
+
+def socket_server():
+    """Background thread running the ingestion event loop for SmartSpectra (WSL) producers"""
+    try:
+        asyncio.run(_serve())
+    except Exception as e:
+        logger.error(f"Socket server stopped: {e}", exc_info=True)
+
+
+def get_connections() -> list:
+    """Get a summary of the currently connected producers"""
+    return [
+        {
+            'source_id': conn.source_id,
+            'patient_id': conn.patient_id,
+            'wire_format': conn.wire_format,
+            'samples_received': conn.samples_received,
+            'parse_errors': conn.parse_errors,
+            'rejected': conn.rejected,
+            'connected_at': conn.connected_at
+        }
+        for conn in list(connections.values())
+    ]
 
 
 def start_socket_server():
@@ -139,7 +287,8 @@ def start_socket_server():
     return socket_thread
 
 
-def get_latest_vitals():
-    """Get the latest vitals data (thread-safe)"""
-    with vitals_lock:
-        return latest_vitals.copy()
+def get_latest_vitals(patient_id: str = config.DEFAULT_PATIENT_ID):
+    """Get the latest vitals data for a patient (lock-free read)"""
+    if vitals_store is None:
+        return dict(EMPTY_VITALS, patient_id=patient_id)
+    return vitals_store.get_latest_vitals(patient_id)
@@ -0,0 +1,328 @@
+"""
+Vitals replay / load generator
+Drives socket_server with synthetic or recorded SmartSpectra streams over
+the real wire protocol, from many simulated patients at once. No camera or
+SmartSpectra build needed.
+
+By default the backend ingestion stack (socket server, IngestPipeline,
+VitalsStore, VitalsMonitor) runs in-process on a free port, with alerts
+recorded instead of starting voice conversations, so end-to-end latency
+from send to VitalsMonitor decision and alert-trigger latency can be
+measured. With --target the load is sent to an external server and only
+send-side figures are reported.
+
+Each sample's `timestamp` field carries its send time (epoch microseconds).
+VitalsMonitor times sustained abnormal vitals by arrival time, so in-process
+the ABNORMAL_DURATION_THRESHOLD is divided by the replay rate; at --rate max
+it is left unscaled and alerts are generally not reached.
+
+Trace files are JSON Lines, one sample object per line. An optional `t`
+field gives the sample's offset in seconds; otherwise samples are spaced
+--interval apart.
+
+Usage (from backend/gemini):
+    python tools/replay_vitals.py --connections 50 --duration 60 --rate 100
+    python tools/replay_vitals.py --trace recording.jsonl --rate 1
+    python tools/replay_vitals.py --connections 200 --duration 30 --rate max --wire binary --batch 30
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import config
+from vitals_protocol import VitalsSample, encode_binary_frame, encode_binary_handshake, MAX_FRAME_RECORDS
+
+
+# ===== TRACES =====
+
+def synthetic_trace(duration: float, interval: float, seed: int,
+                    abnormal_every: float, abnormal_length: float) -> List[Dict]:
+    """
+    Build a synthetic trace: a random walk around normal vitals, with an
+    abnormal episode (high pulse, fast breathing) every `abnormal_every` seconds
+    """
+    rng = random.Random(seed)
+    pulse, breathing = 72.0, 15.0
+    trace = []
+    t = 0.0
+    while t < duration:
+        pulse = min(110.0, max(55.0, pulse + rng.uniform(-2, 2)))
+        breathing = min(22.0, max(11.0, breathing + rng.uniform(-0.5, 0.5)))
+        in_episode = abnormal_every > 0 and (t % abnormal_every) >= abnormal_every - abnormal_length
+        trace.append({
+            't': t,
+            'pulse_rate': int(pulse + (50 if in_episode else 0)),
+            'pulse_confidence': round(rng.uniform(0.5, 0.95), 3),
+            'breathing_rate': int(breathing + (12 if in_episode else 0)),
+            'breathing_confidence': round(rng.uniform(0.5, 0.95), 3),
+            'talking': rng.random() < 0.05,
+        })
+        t += interval
+    return trace
+
+
+def load_trace(path: str, interval: float) -> List[Dict]:
+    """Load a JSON Lines trace, filling in `t` offsets where missing"""
+    trace = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            sample = json.loads(line)
+            sample.setdefault('t', len(trace) * interval)
+            trace.append(sample)
+    return trace
+
+
+# ===== MEASUREMENT =====
+
+class Recorder:
+    """Collects latencies from the in-process monitors (thread-safe)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.decision_latencies: List[float] = []
+        self.alert_latencies: List[float] = []
+        self.decisions = 0
+
+    def record_decisions(self, samples: List[Dict]):
+        now = time.time()
+        latencies = [now - s['timestamp'] / 1e6 for s in samples if s.get('timestamp')]
+        with self.lock:
+            self.decision_latencies.extend(latencies)
+            self.decisions += len(samples)
+
+    def record_alert(self, vitals: Dict):
+        if vitals.get('timestamp'):
+            latency = time.time() - vitals['timestamp'] / 1e6
+            with self.lock:
+                self.alert_latencies.append(latency)
+
+
+def percentiles(values: List[float]) -> Optional[Dict]:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'p50_ms': pick(50),
+        'p95_ms': pick(95),
+        'p99_ms': pick(99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def start_local_backend(recorder: Recorder, time_scale: float):
+    """Run the ingestion stack in-process on a free port; returns (port, store, pipeline)"""
+    import socket_server
+    from services.alert_manager import AlertManager
+    from services.ingest_pipeline import IngestPipeline
+    from services.vitals_monitor import VitalsMonitor
+    from services.vitals_store import VitalsStore
+
+    class RecordingMonitor(VitalsMonitor):
+        def check_batch(self, samples, times=None, trace=None):
+            result = super().check_batch(samples, times, trace)
+            recorder.record_decisions(samples)
+            return result
+
+    # Sustained-abnormal timing runs on arrival time, so shrink it with the replay speed
+    config.ABNORMAL_DURATION_THRESHOLD /= time_scale
+
+    store = VitalsStore(
+        alert_manager_factory=lambda patient_id: AlertManager(patient_id=patient_id),
+        monitor_factory=lambda patient_id, alert_manager: RecordingMonitor(
+            alert_callback=recorder.record_alert, patient_id=patient_id
+        )
+    )
+    pipeline = IngestPipeline(store)
+    pipeline.start()
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    config.SOCKET_HOST = '127.0.0.1'
+    config.SOCKET_PORT = port
+    socket_server.set_vitals_store(store)
+    socket_server.set_ingest_pipeline(pipeline)
+    socket_server.start_socket_server()
+
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return port, store, pipeline
+
+
+# ===== PRODUCERS =====
+
+def encode_batch(samples: List[Dict], wire: str) -> bytes:
+    if wire == 'binary':
+        records = [VitalsSample(s['pulse_rate'], s['breathing_rate'], s['pulse_confidence'],
+                                s['breathing_confidence'], s.get('talking', False), s['timestamp'])
+                   for s in samples]
+        return b''.join(encode_binary_frame(*records[i:i + MAX_FRAME_RECORDS])
+                        for i in range(0, len(records), MAX_FRAME_RECORDS))
+    if len(samples) == 1:
+        return json.dumps(samples[0]).encode('utf-8') + b'\n'
+    return json.dumps({'type': 'batch', 'samples': samples}).encode('utf-8') + b'\n'
+
+
+async def run_producer(host: str, port: int, patient_id: str, trace: List[Dict],
+                       rate: Optional[float], batch: int, wire: str, stats: Dict):
+    """Replay one trace over one connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    if wire == 'binary':
+        writer.write(encode_binary_handshake(patient_id))
+    else:
+        writer.write(json.dumps({'type': 'hello', 'patient_id': patient_id}).encode('utf-8') + b'\n')
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for start in range(0, len(trace), batch):
+        chunk = trace[start:start + batch]
+        if rate is not None:
+            # Send a batch once its newest sample is due
+            delay = started + chunk[-1]['t'] / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sent_at = time.time_ns() // 1000
+        samples = []
+        for sample in chunk:
+            sample = {k: v for k, v in sample.items() if k != 't'}
+            sample['timestamp'] = sent_at
+            samples.append(sample)
+        writer.write(encode_batch(samples, wire))
+        await writer.drain()
+        stats['sent'] += len(samples)
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_load(host: str, port: int, traces: List[List[Dict]], args, stats: Dict):
+    await asyncio.gather(*(
+        run_producer(host, port, f"{args.patient_prefix}{i}", trace,
+                     args.rate_value, args.batch, args.wire, stats)
+        for i, trace in enumerate(traces)
+    ))
+
+
+# ===== MAIN =====
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay or generate vitals streams against socket_server')
+    parser.add_argument('--connections', type=int, default=10, help='Simulated patients/connections')
+    parser.add_argument('--duration', type=float, default=60.0, help='Synthetic trace length in seconds')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between samples')
+    parser.add_argument('--rate', default='1', help="Replay speed: a multiple of real time (1, 100, ...) or 'max'")
+    parser.add_argument('--batch', type=int, default=1, help='Samples per message')
+    parser.add_argument('--wire', choices=('json', 'binary'), default='json', help='Wire format')
+    parser.add_argument('--trace', help='JSON Lines trace to replay on every connection')
+    parser.add_argument('--abnormal-every', type=float, default=30.0,
+                        help='Synthetic abnormal episode period in seconds (0 = never)')
+    parser.add_argument('--abnormal-length', type=float, default=8.0, help='Synthetic abnormal episode length')
+    parser.add_argument('--target', help='host:port of an external socket server (default: in-process)')
+    parser.add_argument('--patient-prefix', default='sim-', help='Patient id prefix')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep backend logging enabled')
+    args = parser.parse_args()
+
+    args.rate_value = None if args.rate == 'max' else float(args.rate)
+    args.batch = max(1, args.batch)
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    if args.trace:
+        base = load_trace(args.trace, args.interval)
+        traces = [base] * args.connections
+    else:
+        traces = [synthetic_trace(args.duration, args.interval, seed, args.abnormal_every, args.abnormal_length)
+                  for seed in range(args.connections)]
+    expected = sum(len(trace) for trace in traces)
+
+    recorder = Recorder()
+    pipeline = None
+    if args.target:
+        host, port = args.target.rsplit(':', 1)
+        port = int(port)
+    else:
+        host = '127.0.0.1'
+        port, _, pipeline = start_local_backend(recorder, args.rate_value or 1.0)
+
+    stats = {'sent': 0}
+    started = time.perf_counter()
+    asyncio.run(run_load(host, port, traces, args, stats))
+    send_seconds = time.perf_counter() - started
+
+    # Wait for the workers to drain
+    if pipeline is not None:
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            ingest = pipeline.get_stats()
+            if ingest['processed'] + ingest['dropped'] >= expected:
+                break
+            time.sleep(0.05)
+    total_seconds = time.perf_counter() - started
+
+    report = {
+        'connections': args.connections,
+        'rate': args.rate,
+        'wire': args.wire,
+        'batch': args.batch,
+        'samples_sent': stats['sent'],
+        'send_seconds': send_seconds,
+        'send_samples_per_sec': stats['sent'] / send_seconds if send_seconds else None,
+    }
+    if pipeline is not None:
+        report.update({
+            'samples_decided': recorder.decisions,
+            'decided_samples_per_sec': recorder.decisions / total_seconds if total_seconds else None,
+            'ingest': {k: v for k, v in pipeline.get_stats().items() if k != 'workers'},
+            'decision_latency': percentiles(recorder.decision_latencies),
+            'alerts_triggered': len(recorder.alert_latencies),
+            'alert_latency': percentiles(recorder.alert_latencies),
+            'abnormal_duration_threshold_s': config.ABNORMAL_DURATION_THRESHOLD,
+        })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Connections:        {report['connections']} ({args.wire}, batch {args.batch}, rate {args.rate})")
+    print(f"Samples sent:       {report['samples_sent']} in {send_seconds:.2f}s "
+          f"({report['send_samples_per_sec']:,.0f}/s)")
+    if pipeline is not None:
+        ingest = report['ingest']
+        print(f"Samples decided:    {report['samples_decided']} ({report['decided_samples_per_sec']:,.0f}/s), "
+              f"dropped {ingest['dropped']}, coalesced {ingest['coalesced']}")
+        for name in ('decision_latency', 'alert_latency'):
+            summary = report[name]
+            if summary:
+                print(f"{name.replace('_', ' ').capitalize():<20}p50 {summary['p50_ms']:.2f}ms  "
+                      f"p95 {summary['p95_ms']:.2f}ms  p99 {summary['p99_ms']:.2f}ms  "
+                      f"max {summary['max_ms']:.2f}ms  (n={summary['count']})")
+        print(f"Alerts triggered:   {report['alerts_triggered']} "
+              f"(sustained threshold scaled to {config.ABNORMAL_DURATION_THRESHOLD:.3f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,183 @@
 """
 Structured logging system for PulseAI
 Replaces print statements with proper logging
+
+With config.LOG_ASYNC (the default) loggers only enqueue records; a single
+QueueListener thread formats them and writes to the console/files, so log
+I/O never runs on the ingestion or evaluation threads.
 """
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
 from datetime import datetime
+import config
+
+# Format: [2024-01-20 15:30:45] INFO [module_name] Message
+TEXT_FORMAT = '[%(asctime)s] %(levelname)s [%(name)s] %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record (ts, level, logger, msg, thread, exc)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket for a logger's DEBUG records
+
+    Lets through at most `rate` DEBUG records per second (bursts up to
+    `rate`); the rest are dropped before they are queued or formatted. The
+    next record let through carries the dropped count as `suppressed`.
+    INFO and above always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                self.suppressed += 1
+                return False
+            self.tokens -= 1.0
+            record.suppressed, self.suppressed = self.suppressed, 0
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the listener thread"""
+
+    dropped = 0
+
+    def __init__(self, log_queue: queue.SimpleQueue, maxsize: int):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same-process queue: pass the record through unformatted
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        # SimpleQueue.put is a single C call (no Condition); bound it with a size check
+        if self.queue.qsize() >= self.maxsize:
+            _DroppingQueueHandler.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+_queue_handler = None
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _make_formatter() -> logging.Formatter:
+    if config.LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
 
-def setup_logger(name: str, log_file: str = None, level=logging.DEBUG):
+def _shared_queue_handler() -> logging.Handler:
+    """Get the process-wide QueueHandler, starting its listener on first use"""
+    global _queue_handler, _listener
+    with _listener_lock:
+        if _queue_handler is None:
+            log_queue = queue.SimpleQueue()
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(_make_formatter())
+            _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
+            _queue_handler = _DroppingQueueHandler(log_queue, config.LOG_QUEUE_SIZE)
+        return _queue_handler
+
+
+def _add_listener_handler(handler: logging.Handler):
+    """Add a handler (e.g. a logger's file) to the shared listener"""
+    with _listener_lock:
+        _listener.handlers = _listener.handlers + (handler,)
+
+
+def get_dropped_count() -> int:
+    """Records dropped because the async log queue was full"""
+    return _DroppingQueueHandler.dropped
+
+
+def setup_logger(name: str, log_file: str = None, level=None):
     """
     Create a logger with console and optional file output
-    
+
     Args:
         name: Logger name (usually __name__)
         log_file: Optional file path for logging
-        level: Logging level (DEBUG, INFO, WARNING, ERROR)
+        level: Logging level (DEBUG, INFO, WARNING, ERROR); defaults to config.LOG_LEVEL
     """
     logger = logging.getLogger(name)
+    if level is None:
+        level = logging.getLevelName(config.LOG_LEVEL)
     logger.setLevel(level)
-    
+
     # Prevent duplicate handlers
     if logger.handlers:
         return logger
-    
-    # Console handler with colors
+
+    # Hot loggers only let a few DEBUG records per second through
+    rate = config.LOG_RATE_LIMITS.get(name)
+    if rate is not None:
+        logger.addFilter(RateLimitFilter(rate))
+
+    formatter = _make_formatter()
+    file_handler = None
+    if log_file:
+        file_handler = logging.FileHandler(log_file)
+        file_handler.setLevel(level)
+        file_handler.setFormatter(formatter)
+
+    if config.LOG_ASYNC:
+        # Enqueue only; the listener thread formats and writes
+        logger.addHandler(_shared_queue_handler())
+        if file_handler:
+            file_handler.addFilter(logging.Filter(name))
+            _add_listener_handler(file_handler)
+        return logger
+
+    # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(level)
-    
-    # Format: [2024-01-20 15:30:45] INFO [module_name] Message
-    formatter = logging.Formatter(
-        '[%(asctime)s] %(levelname)s [%(name)s] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
-    
+
     # File handler (optional)
-    if log_file:
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(level)
-        file_handler.setFormatter(formatter)
+    if file_handler:
         logger.addHandler(file_handler)
-    
+
     return logger
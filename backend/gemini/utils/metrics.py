@@ -0,0 +1,340 @@
+"""
+Lightweight metrics primitives for PulseAI
+Counters, gauges and fixed-bucket histograms (no external metrics library),
+rendered in Prometheus text format for /metrics
+
+Counters and histograms are lock-light: every thread updates its own cell
+and only scrapes add the cells together, so instrumented hot paths never
+contend on a shared lock.
+"""
+from bisect import bisect_left
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from sub-millisecond local calls up to network timeouts
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ThreadCells:
+    """
+    Per-thread value slots: each thread writes only its own list, readers sum them
+
+    The cell of a thread that has exited is folded into `retired` (when
+    the next thread registers or a reader takes a snapshot), so short-lived
+    threads do not grow the list forever.
+    """
+
+    def __init__(self, size: int, max_slots: Sequence[int] = ()):
+        """
+        Args:
+            size: Slots per cell
+            max_slots: Slots that merge by maximum instead of sum
+        """
+        self.size = size
+        self.max_slots = {index % size for index in max_slots}
+        self.local = threading.local()
+        self.cells: List[Tuple[threading.Thread, list]] = []
+        self.retired = [0] * size
+        self.lock = threading.Lock()
+
+    def mine(self) -> list:
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = self.local.cell = [0] * self.size
+            with self.lock:
+                self._retire_dead()
+                self.cells.append((threading.current_thread(), cell))
+            return cell
+
+    def _retire_dead(self):
+        """Fold the cells of exited threads into `retired` (call with the lock held)"""
+        alive = []
+        for thread, cell in self.cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+                continue
+            for index, value in enumerate(cell):
+                if index in self.max_slots:
+                    self.retired[index] = max(self.retired[index], value)
+                else:
+                    self.retired[index] += value
+        self.cells = alive
+
+    def snapshot(self) -> List[list]:
+        with self.lock:
+            self._retire_dead()
+            return [list(self.retired)] + [list(cell) for _, cell in self.cells]
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, '_Metric'] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: '_Metric'):
+        """Add a metric (replaces an earlier metric with the same name)"""
+        with self.lock:
+            self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format (0.0.4)"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+# Shared registry behind /metrics
+registry = MetricsRegistry()
+
+
+class _Metric:
+    """Base for metrics with optional labels (children are created on first use)"""
+
+    type = 'untyped'
+
+    def __init__(self, name: Optional[str] = None, help: str = '', labelnames: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = registry):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[tuple, '_Metric'] = {}
+        self.children_lock = threading.Lock()
+        if name and registry is not None:
+            registry.register(self)
+
+    def labels(self, *values) -> '_Metric':
+        """Get the child metric for these label values (look it up once and keep it on hot paths)"""
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.children_lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.children[values] = self._new_child()
+        return child
+
+    def _new_child(self) -> '_Metric':
+        raise NotImplementedError
+
+    def _child_samples(self) -> Iterator[Tuple[str, list, float]]:
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[Tuple[str, list, float]]:
+        """Yield (sample name, [(label, value), ...], value) for rendering"""
+        if not self.labelnames:
+            yield from self._child_samples()
+            return
+        with self.children_lock:
+            children = list(self.children.items())
+        for values, child in children:
+            labels = list(zip(self.labelnames, values))
+            for name, extra, value in child._child_samples():
+                yield name, labels + extra, value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (per-thread cells, summed on read)"""
+
+    type = 'counter'
+
+    def __init__(self, name: Optional[str] = None, help: str = '', labelnames: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = registry):
+        super().__init__(name, help, labelnames, registry)
+        self.cells = _ThreadCells(1)
+
+    def _new_child(self) -> 'Counter':
+        child = Counter(registry=None)
+        child.name = self.name
+        return child
+
+    def inc(self, amount: float = 1):
+        """Add to the count"""
+        self.cells.mine()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return sum(cell[0] for cell in self.cells.snapshot())
+
+    def _child_samples(self):
+        yield self.name, [], self.value
+
+
+class Gauge(_Metric):
+    """Current value: set() directly, or read from a callback at scrape time"""
+
+    type = 'gauge'
+
+    def __init__(self, name: Optional[str] = None, help: str = '', labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], float]] = None,
+                 registry: Optional[MetricsRegistry] = registry):
+        super().__init__(name, help, labelnames, registry)
+        self.fn = fn
+        self._value = 0.0
+
+    def _new_child(self) -> 'Gauge':
+        child = Gauge(registry=None)
+        child.name = self.name
+        return child
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, fn: Callable[[], float]):
+        """Read the value from fn() at scrape time"""
+        self.fn = fn
+
+    @property
+    def value(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float('nan')
+        return self._value
+
+    def _child_samples(self):
+        yield self.name, [], self.value
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram of observed values (latencies in seconds)
+
+    Memory is constant regardless of how many values are observed;
+    percentiles are estimated by interpolating inside the bucket.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: Optional[str] = None, help: str = '', labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 registry: Optional[MetricsRegistry] = registry):
+        """
+        Args:
+            name: Metric name (unnamed histograms are not exported)
+            help: Help text for /metrics
+            labelnames: Label names (use labels() to get a child)
+            buckets: Increasing bucket upper bounds (an overflow bucket is added)
+        """
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Cell layout: one count per bucket (+ overflow), then sum, then max
+        self.cells = _ThreadCells(len(self.buckets) + 3, max_slots=(-1,))
+
+    def _new_child(self) -> 'Histogram':
+        child = Histogram(buckets=self.buckets, registry=None)
+        child.name = self.name
+        return child
+
+    def observe(self, value: float):
+        """Record one value"""
+        cell = self.cells.mine()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        if value > cell[-1]:
+            cell[-1] = value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _totals(self) -> Tuple[List[int], float, float]:
+        """Merged (bucket counts, sum, max) across threads"""
+        cells = self.cells.snapshot()
+        width = len(self.buckets) + 1
+        counts = [sum(cell[i] for cell in cells) for i in range(width)]
+        total = sum(cell[-2] for cell in cells)
+        maximum = max((cell[-1] for cell in cells), default=0.0)
+        return counts, total, maximum
+
+    @property
+    def count(self) -> int:
+        return sum(self._totals()[0])
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0-100) of observed values"""
+        counts, _, maximum = self._totals()
+        return self._percentile(counts, maximum, q)
+
+    def _percentile(self, counts: List[int], maximum: float, q: float) -> float:
+        count = sum(counts)
+        if not count:
+            return 0.0
+        rank = q / 100.0 * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                upper = min(upper, maximum)
+                return lower + (upper - lower) * max(0.0, rank - seen) / bucket_count
+            seen += bucket_count
+        return maximum
+
+    def snapshot(self) -> Dict:
+        """Get count/sum/max, p50/p95/p99 and cumulative bucket counts (seconds)"""
+        counts, total, maximum = self._totals()
+        count = sum(counts)
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative['+Inf'] = count
+        return {
+            'count': count,
+            'sum': total,
+            'max': maximum,
+            'mean': total / count if count else 0.0,
+            'p50': self._percentile(counts, maximum, 50),
+            'p95': self._percentile(counts, maximum, 95),
+            'p99': self._percentile(counts, maximum, 99),
+            'buckets': cumulative,
+        }
+
+    def _child_samples(self):
+        counts, total, _ = self._totals()
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            yield f"{self.name}_bucket", [('le', _format_value(float(bound)))], running
+        yield f"{self.name}_bucket", [('le', '+Inf')], sum(counts)
+        yield f"{self.name}_sum", [], total
+        yield f"{self.name}_count", [], sum(counts)
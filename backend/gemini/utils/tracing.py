@@ -0,0 +1,199 @@
+"""
+Per-stage latency tracing for PulseAI
+Follows a vitals sample from the socket to the alert decision and records
+how long each stage took
+
+Tracing is off by default (config.TRACE_ENABLED). While it is off,
+tracer.begin() returns None and every instrumented stage is skipped with
+a single `if trace is not None` check. While it is on, each finished stage
+is observed into a per-stage histogram (exported on /metrics) and kept in
+a bounded buffer that can be dumped as Chrome trace-event JSON
+(chrome://tracing or https://ui.perfetto.dev).
+"""
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from utils.metrics import Histogram
+import config
+
+# Stages in the order a sample passes through them
+STAGES = (
+    'recv',       # framing the received chunk into messages
+    'parse',      # JSON decoding (binary frames: decoding and validation)
+    'validate',   # schema/range validation into VitalsSample
+    'queue',      # waiting in the ingest pipeline queue
+    'store',      # VitalsStore update (state + history)
+    'prepare',    # vectorized threshold checks before taking the monitor lock
+    'lock_wait',  # waiting for VitalsMonitor's lock
+    'check',      # abnormal-state evaluation under the lock
+    'total',      # recv → alert decision
+    'dispatch',   # waiting on the alert executor
+    'alert',      # AlertManager.trigger_alert
+    'alert_total',  # recv → AlertManager finished
+)
+
+STAGE_SECONDS = Histogram('vitals_stage_seconds', 'Vitals pipeline stage latency (traced samples)', ['stage'],
+                          buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                                   0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+
+class Trace:
+    """
+    Stage timestamps for one traced batch of samples
+
+    mark() closes the stage that started at the previous mark; lap() adds to
+    a stage that is interleaved with others (e.g. parse/validate per line)
+    and is emitted as one span by flush_laps().
+    """
+
+    __slots__ = ('tracer', 'id', 'patient_id', 'started', 'last', 'laps')
+
+    def __init__(self, tracer: 'Tracer', trace_id: int, patient_id: Optional[str], started: float):
+        self.tracer = tracer
+        self.id = trace_id
+        self.patient_id = patient_id
+        self.started = started
+        self.last = started
+        self.laps: Dict[str, float] = {}
+
+    def mark(self, stage: str):
+        """Record `stage` as running from the previous mark until now"""
+        now = time.perf_counter()
+        self.tracer.record(self, stage, self.last, now)
+        self.last = now
+
+    def lap(self, stage: str):
+        """Add the time since the previous mark/lap to `stage`"""
+        now = time.perf_counter()
+        self.laps[stage] = self.laps.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def flush_laps(self):
+        """Record accumulated laps as consecutive spans (in STAGES order) ending at the last lap"""
+        start = self.last - sum(self.laps.values())
+        for stage in STAGES:
+            seconds = self.laps.pop(stage, None)
+            if seconds is not None:
+                self.tracer.record(self, stage, start, start + seconds)
+                start += seconds
+
+    def fork(self, patient_id: Optional[str] = None) -> 'Trace':
+        """Continue this trace on another path (e.g. one patient's batch, or an alert)"""
+        child = Trace(self.tracer, self.id, patient_id or self.patient_id, self.started)
+        child.last = self.last
+        return child
+
+    def finish(self, stage: str = 'total'):
+        """Record `stage` as running from the start of the trace until now"""
+        self.tracer.record(self, stage, self.started, time.perf_counter())
+
+
+class Tracer:
+    """Starts sampled traces and collects their stage spans"""
+
+    def __init__(self, enabled: bool = config.TRACE_ENABLED,
+                 sample_every: int = config.TRACE_SAMPLE_EVERY,
+                 buffer_size: int = config.TRACE_BUFFER_SIZE):
+        """
+        Args:
+            enabled: Start tracing immediately
+            sample_every: Trace one in this many received chunks
+            buffer_size: Most recent spans kept for export
+        """
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self.spans = deque(maxlen=max(1, buffer_size))
+        self.counter = itertools.count(1)
+        self.epoch = time.perf_counter()
+        self.stage_seconds = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+
+    def configure(self, enabled: Optional[bool] = None, sample_every: Optional[int] = None):
+        """Turn tracing on/off or change the sampling rate at runtime"""
+        if sample_every is not None:
+            self.sample_every = max(1, int(sample_every))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+
+    def begin(self, patient_id: Optional[str] = None) -> Optional[Trace]:
+        """
+        Start a trace at the current time if tracing is on and this one is sampled
+
+        Returns:
+            A Trace, or None when this sample is not traced
+        """
+        if not self.enabled:
+            return None
+        trace_id = next(self.counter)
+        if trace_id % self.sample_every:
+            return None
+        return Trace(self, trace_id, patient_id, time.perf_counter())
+
+    def record(self, trace: Trace, stage: str, start: float, end: float):
+        """Observe one finished stage and keep it for export"""
+        histogram = self.stage_seconds.get(stage)
+        if histogram is None:
+            histogram = self.stage_seconds[stage] = STAGE_SECONDS.labels(stage)
+        histogram.observe(end - start)
+        self.spans.append((stage, trace.id, trace.patient_id, start, end, threading.get_ident()))
+
+    def clear(self):
+        """Drop buffered spans (stage histograms keep their counts)"""
+        self.spans.clear()
+
+    def get_stats(self) -> Dict:
+        """Get tracing settings and per-stage latency percentiles (ms)"""
+        stages = {}
+        for stage, histogram in self.stage_seconds.items():
+            snapshot = histogram.snapshot()
+            if not snapshot['count']:
+                continue
+            stages[stage] = {
+                'count': snapshot['count'],
+                'mean': round(snapshot['mean'] * 1000, 3),
+                'p50': round(snapshot['p50'] * 1000, 3),
+                'p95': round(snapshot['p95'] * 1000, 3),
+                'p99': round(snapshot['p99'] * 1000, 3),
+                'max': round(snapshot['max'] * 1000, 3),
+            }
+        return {
+            'enabled': self.enabled,
+            'sample_every': self.sample_every,
+            'buffered_spans': len(self.spans),
+            'stages_ms': stages,
+        }
+
+    def export_chrome(self) -> Dict:
+        """
+        Get buffered spans in Chrome trace-event format
+
+        Returns:
+            {"traceEvents": [...], "displayTimeUnit": "ms"} - one complete ("X")
+            event per span on the thread that ran it, timestamps in microseconds
+        """
+        pid = os.getpid()
+        spans = list(self.spans)
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+             'args': {'name': thread_names.get(tid, f'thread-{tid}')}}
+            for tid in sorted({span[5] for span in spans})
+        ]
+        for stage, trace_id, patient_id, start, end, tid in spans:
+            events.append({
+                'name': stage,
+                'cat': 'vitals',
+                'ph': 'X',
+                'ts': round((start - self.epoch) * 1e6, 3),
+                'dur': round((end - start) * 1e6, 3),
+                'pid': pid,
+                'tid': tid,
+                'args': {'trace': trace_id, 'patient_id': patient_id},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+# Shared tracer for the ingestion and alert paths
+tracer = Tracer()
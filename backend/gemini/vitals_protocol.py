@@ -0,0 +1,343 @@
+"""
+SmartSpectra vitals protocol decoding
+Splits the newline-delimited JSON byte stream into lines and validates each
+sample against a precompiled schema into a compact VitalsSample record.
+
+Producers may instead open the connection with BINARY_HANDSHAKE and send
+length-prefixed fixed-layout records (see BinaryFrameDecoder); JSON stays
+the default when the first byte is anything else.
+
+Both formats can carry batches: a JSON line may be a list of samples or a
+{"type": "batch", "samples": [...]} envelope, and a binary frame may hold
+any number of records.
+"""
+import json
+import math
+import struct
+from typing import Dict, List, Optional
+import config
+
+
+class ValidationError(ValueError):
+    """Raised when a message is not a valid vitals sample"""
+
+
+# (field, type, min, max) - ranges are very wide, to catch obvious errors only
+VITALS_SCHEMA = (
+    ('pulse_rate', int, 0, 300),
+    ('breathing_rate', int, 0, 100),
+    ('pulse_confidence', float, None, None),
+    ('breathing_confidence', float, None, None),
+)
+
+
+def _compile_field(name, field_type, minimum, maximum):
+    """Build a validator for one schema field (done once at import)"""
+    def check(message: Dict):
+        try:
+            value = message[name]
+        except KeyError:
+            raise ValidationError(f"Missing required field: {name}")
+        if type(value) is not field_type:
+            if isinstance(value, bool):
+                raise ValidationError(f"Invalid type for {name}: {value!r}")
+            try:
+                value = field_type(value)
+            except (ValueError, TypeError, OverflowError):
+                raise ValidationError(f"Invalid type for {name}: {value!r}")
+        if field_type is float and not math.isfinite(value):
+            raise ValidationError(f"{name} must be finite: {value}")  # NaN would pass the range check
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise ValidationError(f"{name} out of range: {value}")
+        return value
+    return check
+
+
+_CHECK_PULSE, _CHECK_BREATHING, _CHECK_PULSE_CONF, _CHECK_BREATHING_CONF = (
+    _compile_field(*field) for field in VITALS_SCHEMA
+)
+
+
+class VitalsSample:
+    """One validated vitals sample"""
+
+    __slots__ = ('pulse_rate', 'breathing_rate', 'pulse_confidence', 'breathing_confidence',
+                 'talking', 'timestamp', 'patient_id', 'received_at')
+
+    def __init__(self, pulse_rate: int, breathing_rate: int, pulse_confidence: float,
+                 breathing_confidence: float, talking: bool = False,
+                 timestamp: Optional[int] = None, patient_id: Optional[str] = None,
+                 received_at: Optional[float] = None):
+        self.pulse_rate = pulse_rate
+        self.breathing_rate = breathing_rate
+        self.pulse_confidence = pulse_confidence
+        self.breathing_confidence = breathing_confidence
+        self.talking = talking
+        self.timestamp = timestamp
+        self.patient_id = patient_id
+        self.received_at = received_at  # epoch seconds, used as the sample time
+
+    def as_dict(self) -> Dict:
+        """Convert to the vitals dict used by the store and monitor"""
+        return {
+            'pulse_rate': self.pulse_rate,
+            'pulse_confidence': self.pulse_confidence,
+            'breathing_rate': self.breathing_rate,
+            'breathing_confidence': self.breathing_confidence,
+            'talking': self.talking,
+            'timestamp': self.timestamp,
+        }
+
+
+def sample_from_message(message: Dict) -> VitalsSample:
+    """
+    Validate a decoded JSON message into a VitalsSample
+
+    Args:
+        message: Decoded JSON object
+
+    Returns:
+        The validated sample
+
+    Raises:
+        ValidationError: If a required field is missing, mistyped or out of range
+    """
+    patient_id = message.get('patient_id')
+    return VitalsSample(
+        _CHECK_PULSE(message),
+        _CHECK_BREATHING(message),
+        _CHECK_PULSE_CONF(message),
+        _CHECK_BREATHING_CONF(message),
+        bool(message.get('talking', False)),
+        message.get('timestamp'),
+        str(patient_id) if patient_id else None
+    )
+
+
+def samples_from_batch(message, received_at: float):
+    """
+    Validate a JSON batch into samples
+
+    Accepts a list of sample objects, or an envelope
+    {"type": "batch", "patient_id": ..., "sample_interval": seconds, "samples": [...]}.
+    With sample_interval the samples are spaced that far apart, ending at
+    `received_at`; otherwise they all share `received_at`.
+
+    Args:
+        message: Decoded JSON list or batch envelope
+        received_at: Arrival time in epoch seconds
+
+    Returns:
+        (valid samples oldest first, number of rejected entries)
+    """
+    if isinstance(message, list):
+        entries, patient_id, interval = message, None, 0.0
+    else:
+        entries = message.get('samples')
+        if not isinstance(entries, list):
+            raise ValidationError("Batch envelope without a samples list")
+        patient_id = message.get('patient_id')
+        try:
+            interval = float(message.get('sample_interval') or 0.0)
+        except (ValueError, TypeError):
+            raise ValidationError(f"Invalid sample_interval: {message.get('sample_interval')!r}")
+        if not math.isfinite(interval) or interval < 0:
+            raise ValidationError(f"Invalid sample_interval: {message.get('sample_interval')!r}")
+
+    samples = []
+    rejected = 0
+    last = len(entries) - 1
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            rejected += 1
+            continue
+        try:
+            sample = sample_from_message(entry)
+        except ValidationError:
+            rejected += 1
+            continue
+        if sample.patient_id is None and patient_id:
+            sample.patient_id = str(patient_id)
+        sample.received_at = received_at - (last - i) * interval
+        samples.append(sample)
+    return samples, rejected
+
+
+def decode_line(line: bytes):
+    """
+    Decode one protocol line
+
+    Returns:
+        The decoded JSON value
+
+    Raises:
+        ValidationError: If the line is not valid JSON
+    """
+    try:
+        return json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValidationError(f"Invalid JSON: {e}")
+
+
+class LineDecoder:
+    """
+    Incremental newline splitter over a reusable bytearray
+
+    Received chunks are appended to one buffer, and complete lines are
+    sliced out through a memoryview. No per-chunk str decoding or
+    concatenation happens.
+    """
+
+    def __init__(self, max_line_bytes: int = config.MAX_LINE_BYTES):
+        self.buffer = bytearray()
+        self.max_line_bytes = max_line_bytes
+        self.overflows = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """
+        Add received bytes and return the complete lines they finish
+
+        Args:
+            data: Bytes read from the socket
+
+        Returns:
+            Complete, non-empty lines (without the newline)
+        """
+        buffer = self.buffer
+        buffer += data
+        lines = []
+        start = 0
+        newline = buffer.find(b'\n')
+        if newline >= 0:
+            with memoryview(buffer) as view:
+                while newline >= 0:
+                    if newline > start:
+                        lines.append(view[start:newline].tobytes())
+                    start = newline + 1
+                    newline = buffer.find(b'\n', start)
+            del buffer[:start]
+
+        # Drop a runaway partial line from a misbehaving producer
+        if len(buffer) > self.max_line_bytes:
+            self.overflows += 1
+            buffer.clear()
+        return lines
+
+
+# ===== BINARY WIRE FORMAT =====
+#
+# Handshake (once, first bytes on the connection):
+#     0xB1 | id_len:uint8 | patient_id:utf-8[id_len]     (id_len 0 = unnamed)
+# Frames (length is a multiple of the record size; several records = a batch):
+#     length:uint16 | record[length / record size]
+# Record (little-endian, packed, matches FlaskClient::sendDetailedVitals):
+#     pulse_rate:int32 | breathing_rate:int32 | pulse_confidence:float32 |
+#     breathing_confidence:float32 | talking:uint8 | timestamp:int64
+
+BINARY_HANDSHAKE = 0xB1
+FRAME_HEADER = struct.Struct('<H')
+VITALS_RECORD = struct.Struct('<iiffBq')
+
+_PULSE_MIN, _PULSE_MAX = VITALS_SCHEMA[0][2], VITALS_SCHEMA[0][3]
+_BREATHING_MIN, _BREATHING_MAX = VITALS_SCHEMA[1][2], VITALS_SCHEMA[1][3]
+
+
+def encode_binary_handshake(patient_id: Optional[str] = None) -> bytes:
+    """Build the binary-mode handshake a producer sends on connect"""
+    name = (patient_id or '').encode('utf-8')
+    if len(name) > 255:
+        raise ValueError("patient_id must encode to at most 255 bytes")
+    return bytes((BINARY_HANDSHAKE, len(name))) + name
+
+
+# Most records one frame can carry
+MAX_FRAME_RECORDS = 0xFFFF // VITALS_RECORD.size
+
+
+def encode_binary_frame(*samples: VitalsSample) -> bytes:
+    """Build one length-prefixed binary frame holding one or more samples"""
+    if not 0 < len(samples) <= MAX_FRAME_RECORDS:
+        raise ValueError(f"A frame holds 1 to {MAX_FRAME_RECORDS} samples")
+    return FRAME_HEADER.pack(VITALS_RECORD.size * len(samples)) + b''.join(
+        VITALS_RECORD.pack(
+            sample.pulse_rate, sample.breathing_rate, sample.pulse_confidence,
+            sample.breathing_confidence, 1 if sample.talking else 0, sample.timestamp or 0
+        )
+        for sample in samples
+    )
+
+
+class BinaryFrameDecoder:
+    """
+    Incremental decoder for the binary wire format
+
+    Frames are decoded in place with struct.unpack_from over one reusable
+    bytearray, which is compacted once per feed() call.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.handshake_done = False
+        self.patient_id: Optional[str] = None
+        self.rejected = 0
+
+    def _read_handshake(self) -> int:
+        """Consume the handshake; returns bytes used (0 if incomplete)"""
+        buffer = self.buffer
+        if len(buffer) < 2:
+            return 0
+        if buffer[0] != BINARY_HANDSHAKE:
+            raise ValidationError(f"Bad binary handshake byte: {buffer[0]:#x}")
+        end = 2 + buffer[1]
+        if len(buffer) < end:
+            return 0
+        if end > 2:
+            self.patient_id = buffer[2:end].decode('utf-8', errors='replace')
+        self.handshake_done = True
+        return end
+
+    def feed(self, data: bytes, received_at: Optional[float] = None) -> List[VitalsSample]:
+        """
+        Add received bytes and return the samples they complete
+
+        Args:
+            data: Bytes read from the socket
+            received_at: Arrival time stamped on the decoded samples
+
+        Raises:
+            ValidationError: If the stream is malformed (the connection should be closed)
+        """
+        buffer = self.buffer
+        buffer += data
+        offset = 0
+        if not self.handshake_done:
+            offset = self._read_handshake()
+            if not self.handshake_done:
+                return []
+
+        samples = []
+        available = len(buffer)
+        header_size = FRAME_HEADER.size
+        record_size = VITALS_RECORD.size
+        unpack_from = VITALS_RECORD.unpack_from
+        patient_id = self.patient_id
+        while available - offset >= header_size:
+            (length,) = FRAME_HEADER.unpack_from(buffer, offset)
+            if length == 0 or length % record_size:
+                raise ValidationError(f"Bad binary frame length: {length}")
+            if available - offset - header_size < length:
+                break
+            record = offset + header_size
+            offset = record + length
+            while record < offset:
+                pulse, breathing, pulse_conf, breathing_conf, talking, timestamp = unpack_from(buffer, record)
+                record += record_size
+                if not (_PULSE_MIN <= pulse <= _PULSE_MAX and _BREATHING_MIN <= breathing <= _BREATHING_MAX):
+                    self.rejected += 1
+                    continue
+                samples.append(VitalsSample(pulse, breathing, pulse_conf, breathing_conf,
+                                            bool(talking), timestamp, patient_id, received_at))
+
+        if offset:
+            del buffer[:offset]
+        return samples
@@ -11,6 +11,11 @@ public:
     static constexpr const char* FLASK_HOST = "172.26.64.1";
     static constexpr int FLASK_PORT = 5555;
     
+    // Vitals wire format: false = newline JSON, true = compact binary frames
+    static constexpr bool USE_BINARY_WIRE = false;
+    // Patient/stream id sent in the connection handshake ("" = backend default)
+    static constexpr const char* PATIENT_ID = "";
+    
     // Video stream config
     static constexpr const char* VIDEO_STREAM_URL = "tcp://0.0.0.0:8081?listen=1";
     static constexpr int VIDEO_WIDTH = 1280;
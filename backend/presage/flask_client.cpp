@@ -4,11 +4,58 @@
 #include <arpa/inet.h>
 #include <unistd.h>
 #include <iostream>
+#include <algorithm>
+#include <cstring>
 
 using json = nlohmann::json;
 
-FlaskClient::FlaskClient(const std::string& host, int port) 
-    : host_(host), port_(port), socket_fd_(-1) {
+namespace {
+
+// Binary wire format constants (must match vitals_protocol.py)
+constexpr uint8_t kBinaryHandshake = 0xB1;
+constexpr size_t kRecordSize = 4 + 4 + 4 + 4 + 1 + 8;  // '<iiffBq'
+constexpr size_t kMaxFrameRecords = 0xFFFF / kRecordSize;
+
+void putLE16(uint8_t* out, uint16_t value) {
+    out[0] = static_cast<uint8_t>(value);
+    out[1] = static_cast<uint8_t>(value >> 8);
+}
+
+void putLE32(uint8_t* out, uint32_t value) {
+    for (int i = 0; i < 4; ++i) {
+        out[i] = static_cast<uint8_t>(value >> (8 * i));
+    }
+}
+
+void putLE64(uint8_t* out, uint64_t value) {
+    for (int i = 0; i < 8; ++i) {
+        out[i] = static_cast<uint8_t>(value >> (8 * i));
+    }
+}
+
+void putFloatLE(uint8_t* out, float value) {
+    uint32_t bits;
+    std::memcpy(&bits, &value, sizeof(bits));
+    putLE32(out, bits);
+}
+
+json vitalsToJson(const DetailedVitals& vitals) {
+    return {
+        {"pulse_rate", vitals.pulse_rate},
+        {"pulse_confidence", vitals.pulse_confidence},
+        {"breathing_rate", vitals.breathing_rate},
+        {"breathing_confidence", vitals.breathing_confidence},
+        {"talking", vitals.talking},
+        {"timestamp", vitals.timestamp}
+    };
+}
+
+}  // namespace
+
+FlaskClient::FlaskClient(const std::string& host, int port,
+                         WireFormat format, const std::string& patient_id)
+    : host_(host), port_(port), socket_fd_(-1),
+      format_(format), patient_id_(patient_id) {
 }
 
 FlaskClient::~FlaskClient() {
@@ -35,6 +82,69 @@ bool FlaskClient::connect() {
     }
     
     std::cout << "Connected to Flask backend at " << host_ << ":" << port_ << "!\n";
+    
+    if (!sendHandshake()) {
+        std::cerr << "Failed to send handshake to Flask backend\n";
+        disconnect();
+        return false;
+    }
+    return true;
+}
+
+bool FlaskClient::sendAll(const char* data, size_t length) {
+    while (length > 0) {
+        ssize_t sent = send(socket_fd_, data, length, 0);
+        if (sent < 0) {
+            return false;
+        }
+        data += sent;
+        length -= static_cast<size_t>(sent);
+    }
+    return true;
+}
+
+bool FlaskClient::sendHandshake() {
+    if (format_ == WireFormat::Binary) {
+        // 0xB1 | id length | id bytes
+        size_t id_length = patient_id_.size() > 255 ? 255 : patient_id_.size();
+        std::string handshake;
+        handshake.push_back(static_cast<char>(kBinaryHandshake));
+        handshake.push_back(static_cast<char>(id_length));
+        handshake.append(patient_id_, 0, id_length);
+        return sendAll(handshake.data(), handshake.size());
+    }
+    
+    if (!patient_id_.empty()) {
+        json hello = {
+            {"type", "hello"},
+            {"patient_id", patient_id_}
+        };
+        std::string message = hello.dump() + "\n";
+        return sendAll(message.c_str(), message.length());
+    }
+    return true;
+}
+
+bool FlaskClient::sendBinaryVitals(const DetailedVitals* vitals, size_t count) {
+    // Frame: length:uint16 | records
+    // Record: pulse:int32 | breathing:int32 | pulse_conf:float32 |
+    //         breathing_conf:float32 | talking:uint8 | timestamp:int64
+    std::vector<uint8_t> frame(2 + kRecordSize * count);
+    putLE16(frame.data(), static_cast<uint16_t>(kRecordSize * count));
+    uint8_t* record = frame.data() + 2;
+    for (size_t i = 0; i < count; ++i, record += kRecordSize) {
+        putLE32(record, static_cast<uint32_t>(vitals[i].pulse_rate));
+        putLE32(record + 4, static_cast<uint32_t>(vitals[i].breathing_rate));
+        putFloatLE(record + 8, vitals[i].pulse_confidence);
+        putFloatLE(record + 12, vitals[i].breathing_confidence);
+        record[16] = vitals[i].talking ? 1 : 0;
+        putLE64(record + 17, static_cast<uint64_t>(vitals[i].timestamp));
+    }
+    
+    if (!sendAll(reinterpret_cast<const char*>(frame.data()), frame.size())) {
+        std::cerr << "Failed to send detailed vitals to Flask\n";
+        return false;
+    }
     return true;
 }
 
@@ -80,14 +190,11 @@ bool FlaskClient::sendDetailedVitals(const DetailedVitals& vitals) {
         return false;
     }
     
-    json data = {
-        {"pulse_rate", vitals.pulse_rate},
-        {"pulse_confidence", vitals.pulse_confidence},
-        {"breathing_rate", vitals.breathing_rate},
-        {"breathing_confidence", vitals.breathing_confidence},
-        {"talking", vitals.talking},
-        {"timestamp", vitals.timestamp}
-    };
+    if (format_ == WireFormat::Binary) {
+        return sendBinaryVitals(&vitals, 1);
+    }
+    
+    json data = vitalsToJson(vitals);
     
     std::string message = data.dump() + "\n";
     std::cout << "Sending detailed vitals to Flask\n";
@@ -102,3 +209,40 @@ bool FlaskClient::sendDetailedVitals(const DetailedVitals& vitals) {
     return true;
 }
 
+bool FlaskClient::sendDetailedVitalsBatch(const std::vector<DetailedVitals>& batch) {
+    if (!isConnected()) {
+        std::cerr << "Not connected to Flask, skipping send\n";
+        return false;
+    }
+    if (batch.empty()) {
+        return true;
+    }
+    
+    if (format_ == WireFormat::Binary) {
+        for (size_t start = 0; start < batch.size(); start += kMaxFrameRecords) {
+            size_t count = std::min(kMaxFrameRecords, batch.size() - start);
+            if (!sendBinaryVitals(batch.data() + start, count)) {
+                return false;
+            }
+        }
+        return true;
+    }
+    
+    json samples = json::array();
+    for (const auto& vitals : batch) {
+        samples.push_back(vitalsToJson(vitals));
+    }
+    json envelope = {
+        {"type", "batch"},
+        {"samples", samples}
+    };
+    
+    std::string message = envelope.dump() + "\n";
+    std::cout << "Sending " << batch.size() << " buffered vitals to Flask\n";
+    
+    if (!sendAll(message.c_str(), message.length())) {
+        std::cerr << "Failed to send vitals batch to Flask\n";
+        return false;
+    }
+    return true;
+}
@@ -1,6 +1,7 @@
 #ifndef FLASK_CLIENT_HPP
 #define FLASK_CLIENT_HPP
 
+#include <cstdint>
 #include <string>
 #include <vector>
 
@@ -22,9 +23,20 @@ struct DetailedVitals {
     int64_t timestamp;
 };
 
+// Wire format used for vitals messages.
+// Json:   one JSON object per line (default, human readable)
+// Binary: handshake byte 0xB1 + patient id, then length-prefixed packed
+//         little-endian records (see backend/gemini/vitals_protocol.py)
+enum class WireFormat {
+    Json,
+    Binary
+};
+
 class FlaskClient {
 public:
-    FlaskClient(const std::string& host, int port);
+    FlaskClient(const std::string& host, int port,
+                WireFormat format = WireFormat::Json,
+                const std::string& patient_id = "");
     ~FlaskClient();
     
     bool connect();
@@ -32,11 +44,20 @@ public:
     bool isConnected() const;
     bool sendVitals(int pulse, int breathing, int64_t timestamp);
     bool sendDetailedVitals(const DetailedVitals& vitals);
+    // Send buffered readings in one message (JSON batch envelope or one
+    // binary frame per up to 2621 records)
+    bool sendDetailedVitalsBatch(const std::vector<DetailedVitals>& batch);
     
 private:
+    bool sendAll(const char* data, size_t length);
+    bool sendHandshake();
+    bool sendBinaryVitals(const DetailedVitals* vitals, size_t count);
+
     std::string host_;
     int port_;
     int socket_fd_;
+    WireFormat format_;
+    std::string patient_id_;
 };
 
 #endif // FLASK_CLIENT_HPP
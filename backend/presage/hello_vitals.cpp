@@ -30,7 +30,11 @@ int main(int argc, char** argv) {
     std::cout << "Starting SmartSpectra Hello Vitals...\n";
     
     // Connect to Flask backend
-    FlaskClient flask_client(Config::FLASK_HOST, Config::FLASK_PORT);
+    FlaskClient flask_client(
+        Config::FLASK_HOST, Config::FLASK_PORT,
+        Config::USE_BINARY_WIRE ? WireFormat::Binary : WireFormat::Json,
+        Config::PATIENT_ID
+    );
     flask_client.connect();
 
     try {
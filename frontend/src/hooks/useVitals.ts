@@ -5,13 +5,21 @@ interface UseVitalsResult {
     vitals: VitalsResponse | null;
     loading: boolean;
     error: string | null;
+    streaming: boolean;
     refetch: () => Promise<void>;
 }
 
-export const useVitals = (refreshInterval: number = 2000): UseVitalsResult => {
+// Vitals are pushed over Server-Sent Events; the full snapshot (emotion,
+// alert details) is refreshed every `snapshotInterval`. While the stream is
+// down (not yet open, or the browser is reconnecting) the hook polls every
+// `refreshInterval`; if the browser gives up on the stream for good it
+// stays on polling.
+export const useVitals = (refreshInterval: number = 2000, snapshotInterval: number = 10000): UseVitalsResult => {
     const [vitals, setVitals] = useState<VitalsResponse | null>(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
+    const [streamEnabled, setStreamEnabled] = useState(typeof EventSource !== 'undefined');
+    const [streaming, setStreaming] = useState(false);
 
     const fetchVitals = useCallback(async () => {
         try {
@@ -26,20 +34,43 @@ export const useVitals = (refreshInterval: number = 2000): UseVitalsResult => {
     }, []);
 
     useEffect(() => {
-        // Initial fetch
-        fetchVitals();
+        if (!streamEnabled) return;
 
-        // Set up auto-refresh
-        const interval = setInterval(fetchVitals, refreshInterval);
+        const source = new EventSource(api.getVitalsStreamUrl());
+        source.onopen = () => setStreaming(true);
+        source.onmessage = (event) => {
+            const sample = JSON.parse(event.data) as Partial<VitalsResponse>;
+            setVitals((prev) => (prev ? { ...prev, ...sample } : (sample as VitalsResponse)));
+            setError(null);
+            setLoading(false);
+        };
+        source.onerror = () => {
+            // The browser reconnects on its own unless the stream is CLOSED (e.g. a non-200 response)
+            setStreaming(false);
+            if (source.readyState === EventSource.CLOSED) {
+                setStreamEnabled(false);
+            }
+        };
 
         // Cleanup
+        return () => {
+            source.close();
+            setStreaming(false);
+        };
+    }, [streamEnabled]);
+
+    useEffect(() => {
+        // Fetch now, then poll fast while the stream is down and slowly for the snapshot while it is up
+        fetchVitals();
+        const interval = setInterval(fetchVitals, streaming ? snapshotInterval : refreshInterval);
         return () => clearInterval(interval);
-    }, [fetchVitals, refreshInterval]);
+    }, [fetchVitals, refreshInterval, snapshotInterval, streaming]);
 
     return {
         vitals,
         loading,
         error,
+        streaming,
         refetch: fetchVitals,
     };
 };
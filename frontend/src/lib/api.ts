@@ -19,6 +19,39 @@ export interface VitalsResponse {
     abnormal_duration: number;
 }
 
+export interface VitalsHistoryResponse {
+    patient_id: string;
+    count: number;
+    samples: {
+        timestamp: number[];
+        pulse_rate: number[];
+        breathing_rate: number[];
+        pulse_confidence: number[];
+        breathing_confidence: number[];
+        talking: boolean[];
+    };
+}
+
+export interface VitalStatsSummary {
+    min: number;
+    max: number;
+    mean: number;
+    [percentile: string]: number;
+}
+
+export interface VitalsStatsResponse {
+    patient_id: string;
+    window_seconds: number;
+    count: number;
+    start: number | null;
+    end: number | null;
+    pulse_rate?: VitalStatsSummary;
+    breathing_rate?: VitalStatsSummary;
+    pulse_confidence?: VitalStatsSummary;
+    breathing_confidence?: VitalStatsSummary;
+    talking_ratio?: number;
+}
+
 export interface AlertResponse {
     alert_active: boolean;
     message?: string;
@@ -70,6 +103,29 @@ class ApiService {
         return response.json();
     }
 
+    // URL of the Server-Sent Events vitals stream
+    getVitalsStreamUrl(): string {
+        return `${this.baseUrl}/api/vitals/stream`;
+    }
+
+    // Get vitals history for the last `seconds`
+    async getVitalsHistory(seconds: number = 300): Promise<VitalsHistoryResponse> {
+        const response = await fetch(`${this.baseUrl}/api/vitals/history?seconds=${seconds}`);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch vitals history: ${response.statusText}`);
+        }
+        return response.json();
+    }
+
+    // Get vitals statistics for the last `seconds`
+    async getVitalsStats(seconds: number = 300): Promise<VitalsStatsResponse> {
+        const response = await fetch(`${this.baseUrl}/api/vitals/stats?seconds=${seconds}`);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch vitals stats: ${response.statusText}`);
+        }
+        return response.json();
+    }
+
     // Check if alert is active
     async getAlertStatus(): Promise<AlertResponse> {
         const response = await fetch(`${this.baseUrl}/api/alerts/active`);